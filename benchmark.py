@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmarks for the Derby Betting System.
+
+Builds synthetic events of increasing size and times the operations that
+dominate a race night:
+
+- load_state_from_database (every full app rerun)
+- calculate_scoreboard
+- submit_race_results (through the wrapper, including the state reload)
+- bulk bet import (paste validation plus the batched draft write)
+- queued bet writes (every bet of a race as its own write from
+  PRODUCER_THREADS threads, group-committed by the bet write queue)
+- exports (JSON data export and scoreboard CSV)
+
+Results are written as JSON so runs can be compared:
+
+    python benchmark.py --sizes 100 1000 --output before.json
+    python benchmark.py --sizes 100 1000 --compare before.json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from bet_import import parse_paste_bets, validate_bets, accepted_bets
+from database import DerbyDatabase, PERFORMANCE_PROFILES, DEFAULT_PERFORMANCE_PROFILE
+from packed_bets import BET_STORAGE_MODES, DEFAULT_BET_STORAGE
+from db_wrapper import StreamlitDatabaseWrapper
+from synthetic_event import BET_DISTRIBUTIONS, generate_event, generate_race_bets
+from write_queue import BetWriteQueue
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+PRODUCER_THREADS = 8
+
+# The wrapper runs in bare mode here, with no script run or session, which
+# Streamlit warns about on every st.* call
+for logger_name in ("streamlit.runtime.scriptrunner_utils.script_run_context",
+                    "streamlit.runtime.state.session_state_proxy"):
+    logging.getLogger(logger_name).setLevel(logging.ERROR)
+
+def time_call(func: Callable, repeat: int, setup: Optional[Callable] = None) -> List[float]:
+    """Time `func` `repeat` times, running the untimed `setup` before each call."""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def benchmark_size(bettors: int, args, workdir: str) -> List[Dict]:
+    """Run every benchmark against one generated event."""
+    template_path = os.path.join(workdir, f"event_{bettors}.db")
+    work_path = os.path.join(workdir, f"work_{bettors}.db")
+
+    start = time.perf_counter()
+    template = DerbyDatabase(template_path, profile=args.profile)
+    event = generate_event(template, horses=args.horses, bettors=bettors,
+                           races=args.races, distribution=args.distribution, seed=args.seed)
+    template.set_bet_storage(args.bet_storage)
+    generate_seconds = time.perf_counter() - start
+    with template.get_connection() as conn:
+        # Fold any WAL content into the main file so copying it is enough
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+    print(f"  generated in {generate_seconds:.2f}s ({os.path.getsize(template_path) / 1024 / 1024:.1f} MB)")
+
+    wrapper = None
+    
+    def fresh_copy():
+        """Restore the untouched event before a write benchmark."""
+        # sqlite3 connections sit in reference cycles; close them before swapping WAL files
+        if wrapper is not None:
+            wrapper.precompute.close()
+        gc.collect()
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+        shutil.copyfile(template_path, work_path)
+
+    fresh_copy()
+    db = DerbyDatabase(work_path, profile=args.profile)
+    wrapper = StreamlitDatabaseWrapper(db)
+    wrapper.load_state_from_database()
+
+    race_number = event['completed_races'] + 1
+    race_bets = generate_race_bets(bettors, args.horses, args.distribution, seed=args.seed + race_number)
+    paste_text = '\n'.join(f"{name}:{horse}" for name, horse in race_bets.items())
+    horse_numbers = db.get_all_horses()
+    names = [b['name'] for b in db.get_all_bettors()]
+
+    def bulk_import():
+        report = validate_bets(parse_paste_bets(paste_text), names, horse_numbers)
+        db.save_draft_bets(race_number, accepted_bets(report))
+
+    def queued_bet_writes():
+        writes = BetWriteQueue(db)
+        items = list(race_bets.items())
+        futures = [[] for _ in range(PRODUCER_THREADS)]
+        
+        def produce(producer):
+            for name, horse in items[producer::PRODUCER_THREADS]:
+                futures[producer].append(writes.submit(race_number, name, horse))
+        
+        producers = [threading.Thread(target=produce, args=(i,)) for i in range(PRODUCER_THREADS)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        for future in [future for share in futures for future in share]:
+            future.result()
+        writes.close()
+    
+    def export():
+        json.dumps(wrapper.export_data())
+        pd.DataFrame(db.calculate_scoreboard()).to_csv(index=False)
+
+    def reload_wrapper():
+        fresh_copy()
+        wrapper.load_state_from_database()
+
+    benchmarks = [
+        ("load_state_from_database", wrapper.load_state_from_database, None),
+        ("calculate_scoreboard", db.calculate_scoreboard, None),
+        ("bulk_import", bulk_import, fresh_copy),
+        ("queued_bet_writes", queued_bet_writes, fresh_copy),
+        ("submit_race_results",
+         lambda: wrapper.submit_race_results(race_number, "1", "2", "3", race_bets), reload_wrapper),
+        ("export", export, None),
+    ]
+
+    # Loading the whole event is only timed once: it is the slowest step
+    results = [{
+        'bettors': bettors,
+        'operation': "generate_event",
+        'median_seconds': generate_seconds,
+        'min_seconds': generate_seconds,
+        'timings': [generate_seconds]
+    }]
+    for name, func, setup in benchmarks:
+        if args.only and name not in args.only:
+            continue
+        timings = time_call(func, args.repeat, setup)
+        result = {
+            'bettors': bettors,
+            'operation': name,
+            'median_seconds': statistics.median(timings),
+            'min_seconds': min(timings),
+            'timings': timings
+        }
+        results.append(result)
+        print(f"  {name:<26} {result['median_seconds'] * 1000:10.1f} ms")
+    return results
+
+def compare_results(current: List[Dict], baseline_file: str, threshold: float) -> List[str]:
+    """List operations that got slower than `threshold` times the baseline."""
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+
+    baseline_times = {(r['bettors'], r['operation']): r['median_seconds'] for r in baseline['results']}
+    regressions = []
+    for result in current:
+        before = baseline_times.get((result['bettors'], result['operation']))
+        if before is None:
+            continue
+        ratio = result['median_seconds'] / before if before > 0 else float('inf')
+        marker = "⚠️ " if ratio > threshold else "  "
+        print(f"{marker}{result['operation']:<26} {result['bettors']:>7} bettors: "
+              f"{before * 1000:9.1f} ms -> {result['median_seconds'] * 1000:9.1f} ms ({ratio:.2f}x)")
+        if ratio > threshold:
+            regressions.append(f"{result['operation']} @ {result['bettors']} bettors: {ratio:.2f}x slower")
+    return regressions
+
+def main():
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description="Derby Betting System scaling benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Bettor counts to test")
+    parser.add_argument("--horses", type=int, default=12)
+    parser.add_argument("--races", type=int, default=10)
+    parser.add_argument("--distribution", choices=BET_DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--profile", choices=list(PERFORMANCE_PROFILES), default=DEFAULT_PERFORMANCE_PROFILE,
+                        help="SQLite performance profile")
+    parser.add_argument("--bet-storage", choices=BET_STORAGE_MODES, default=DEFAULT_BET_STORAGE,
+                        help="Store bets as rows or as packed per-race blobs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per operation")
+    parser.add_argument("--only", nargs="+", help="Only run these operations")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slowdown ratio that counts as a regression when comparing")
+    args = parser.parse_args()
+
+    print("🏇 Derby Betting System - Benchmarks")
+    print("=" * 50)
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="derby_bench_")
+    try:
+        for size in args.sizes:
+            print(f"\n{size} bettors, {args.horses} horses, {args.races} races "
+                  f"({args.distribution}, {args.profile}, {args.bet_storage} bets)")
+            results.extend(benchmark_size(size, args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        'timestamp': datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'pandas': pd.__version__,
+            'platform': platform.platform()
+        },
+        'parameters': {
+            'sizes': args.sizes,
+            'horses': args.horses,
+            'races': args.races,
+            'distribution': args.distribution,
+            'profile': args.profile,
+            'bet_storage': args.bet_storage,
+            'seed': args.seed,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.compare:
+        print(f"\nComparing against {args.compare} (threshold {args.threshold:.2f}x):")
+        regressions = compare_results(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s):")
+            for regression in regressions:
+                print(f"   • {regression}")
+            return False
+        print("\n✅ No regressions")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Local HTTP API for entering bets from phones and tablets.
+
+A small asyncio HTTP/1.1 server, standard library only, that takes bets for
+the current race:
+
+    GET  /race   {"race": 4, "completed": false, "horses": ["1", "2", ...]}
+    POST /bets   {"bettor": "Jane Doe", "horse": "3"}
+                 or {"bets": [{"bettor": "Jane Doe", "horse": "3"}, ...]}
+
+A POST may name its "race". Bets for any race but the current one are
+refused, so a device that missed a race change cannot write into the wrong
+race. Bets are checked against a cached index of bettor names and horse
+numbers. The index is refreshed every INDEX_REFRESH_SECONDS. It is also
+refreshed when an unknown bettor turns up, at most every
+INDEX_MISS_REFRESH_SECONDS, so a bettor added mid-race is found. Accepted
+bets go through the group-commit BetWriteQueue (see write_queue.py), so
+concurrent requests share transactions. By default they go to draft_bets,
+where organizers see them in the entry grid before submitting; they can
+also go straight to bets. The response is sent once the bets have
+committed, listing any rejected ones.
+
+Retries are safe. A POST with an Idempotency-Key header is answered with the
+first response for that key, and the last IDEMPOTENCY_KEYS keys are kept. A
+retry that arrives while the first request is still writing waits for it,
+and a key reused with a different body gets 422. Bets are upserts, so even a
+retry without a key leaves the same bet in place.
+
+Set DERBY_API_PORT to start the API with the app, or run it on its own:
+
+    python bet_api.py --port 8765 --target draft
+
+It listens on DERBY_API_HOST (default 127.0.0.1); use 0.0.0.0 so phones on
+the local network can reach it. With DERBY_API_TOKEN set, every request
+needs "Authorization: Bearer <token>".
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from database import DerbyDatabase
+from write_queue import BetWriteQueue
+
+API_TARGETS = ("draft", "bets")
+DEFAULT_API_TARGET = "draft"
+API_OPERATOR = "api"
+INDEX_REFRESH_SECONDS = 2.0
+INDEX_MISS_REFRESH_SECONDS = 0.5
+IDEMPOTENCY_KEYS = 10000
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_BETS = 5000
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+               422: "Unprocessable Entity", 503: "Service Unavailable"}
+
+class ApiError(Exception):
+    """An error answered with an HTTP status and a JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class BetIndex:
+    """What bets are checked against: bettor names, horse numbers and the open race."""
+
+    def __init__(self, bettors: Set[str], horses: List[str], current_race: int, completed: Set[int]):
+        self.bettors = bettors
+        self.horses = horses
+        self.horse_set = set(horses)
+        self.current_race = current_race
+        self.completed = completed
+        self.loaded_at = time.monotonic()
+
+def load_bet_index(db: DerbyDatabase) -> BetIndex:
+    """Read the bet index from the database."""
+    return BetIndex({bettor['name'] for bettor in db.get_all_bettors()}, db.get_all_horses(),
+                    int(db.get_setting('current_race', '1')),
+                    {race['race_number'] for race in db.get_all_races() if race['is_completed']})
+
+class BetApi:
+    """Request handling, independent of the HTTP transport."""
+
+    def __init__(self, db: DerbyDatabase, writes: BetWriteQueue, token: Optional[str] = None):
+        self.db = db
+        self.writes = writes
+        self.token = token
+        self._index: Optional[BetIndex] = None
+        self._index_lock = asyncio.Lock()
+        # Idempotency key -> (body digest, future of (status, response))
+        self._responses: "OrderedDict[str, Tuple[str, asyncio.Future]]" = OrderedDict()
+
+    async def index(self, max_age: float = INDEX_REFRESH_SECONDS) -> BetIndex:
+        """The bet index, reloaded off the event loop when older than max_age."""
+        async with self._index_lock:
+            if self._index is None or time.monotonic() - self._index.loaded_at > max_age:
+                self._index = await asyncio.to_thread(load_bet_index, self.db)
+            return self._index
+
+    async def handle(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+        """Answer one request with a status and a JSON-able body."""
+        return await self._answer(self._route(method, path, headers, body))
+
+    async def _answer(self, request) -> Tuple[int, Dict]:
+        """Await a request handler, turning any error into an error response."""
+        try:
+            return await request
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            # A failed database read or bet write; nothing was saved, so the client can retry
+            return 503, {"error": f"Request failed: {e}"}
+
+    async def _route(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+        if self.token and headers.get('authorization') != f"Bearer {self.token}":
+            raise ApiError(401, "Missing or wrong API token")
+        path = path.split('?')[0]
+        if path == "/race":
+            if method != "GET":
+                raise ApiError(405, "Use GET")
+            index = await self.index()
+            return 200, {"race": index.current_race, "completed": index.current_race in index.completed,
+                         "horses": index.horses}
+        if path == "/bets":
+            if method != "POST":
+                raise ApiError(405, "Use POST")
+            key = headers.get('idempotency-key')
+            if key:
+                return await self._idempotent(key, body)
+            return await self._post_bets(body)
+        raise ApiError(404, f"No such endpoint: {path}")
+
+    async def _idempotent(self, key: str, body: bytes) -> Tuple[int, Dict]:
+        """Answer a keyed request once, and every retry of it with the same response."""
+        digest = hashlib.sha256(body).hexdigest()
+        if key in self._responses:
+            first_digest, response = self._responses[key]
+            self._responses.move_to_end(key)
+            if first_digest != digest:
+                raise ApiError(422, "Idempotency-Key was already used with a different body")
+            return await asyncio.shield(response)
+
+        response = asyncio.get_running_loop().create_future()
+        self._responses[key] = (digest, response)
+        if len(self._responses) > IDEMPOTENCY_KEYS:
+            self._responses.popitem(last=False)
+        result = await self._answer(self._post_bets(body))
+        if result[0] >= 500:
+            # Nothing was saved, so a retry should try again
+            self._responses.pop(key, None)
+        response.set_result(result)
+        return result
+
+    async def _post_bets(self, body: bytes) -> Tuple[int, Dict]:
+        """Validate a single or batched bet submission and write it through the queue."""
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise ApiError(400, "Body must be JSON")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        items = payload["bets"] if "bets" in payload else [payload]
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, "bets must be a non-empty list")
+        if len(items) > MAX_BATCH_BETS:
+            raise ApiError(413, f"At most {MAX_BATCH_BETS} bets per request")
+
+        index = await self.index()
+        try:
+            race = int(payload.get("race", index.current_race))
+        except (TypeError, ValueError):
+            raise ApiError(400, "race must be a race number")
+        if race != index.current_race:
+            raise ApiError(409, f"Race {race} is not open; the current race is {index.current_race}")
+        if race in index.completed:
+            raise ApiError(409, f"Race {race} already has results")
+
+        bets, rejected = self._check_bets(items, index)
+        if any(error.startswith("Unknown bettor") for _, _, error in rejected):
+            # A bettor may have been added since the index was loaded
+            fresh = await self.index(max_age=INDEX_MISS_REFRESH_SECONDS)
+            if fresh is not index:
+                recheck = [(i, items[i]) for i, _, error in rejected if error.startswith("Unknown bettor")]
+                rejected = [entry for entry in rejected if not entry[2].startswith("Unknown bettor")]
+                found, still_rejected = self._check_bets([item for _, item in recheck], fresh)
+                bets.extend((recheck[i][0], bettor, horse) for i, bettor, horse in found)
+                rejected.extend((recheck[i][0], bettor, error) for i, bettor, error in still_rejected)
+
+        futures = [asyncio.wrap_future(self.writes.submit(race, bettor, horse)) for _, bettor, horse in bets]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for (i, bettor, _), result in zip(bets, results):
+            if isinstance(result, ValueError):
+                rejected.append((i, bettor, str(result)))
+            elif isinstance(result, Exception):
+                raise result
+
+        rejected.sort()
+        return 200, {
+            "race": race,
+            "accepted": len(bets) - sum(isinstance(result, ValueError) for result in results),
+            "rejected": [{"index": i, "bettor": bettor, "error": error} for i, bettor, error in rejected]
+        }
+
+    def _check_bets(self, items: List, index: BetIndex) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, str, str]]]:
+        """Split bet items into (position, bettor, horse) bets and (position, bettor, error) rejections."""
+        bets, rejected = [], []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                rejected.append((i, "", "Each bet must be an object with bettor and horse"))
+                continue
+            bettor = str(item.get("bettor", "")).strip()
+            horse = item.get("horse")
+            horse = "" if horse is None else str(horse).strip()
+            if bettor not in index.bettors:
+                rejected.append((i, bettor, f"Unknown bettor: {bettor}"))
+            elif horse and horse not in index.horse_set:
+                rejected.append((i, bettor, f"Unknown horse: {horse}"))
+            else:
+                bets.append((i, bettor, horse))
+        return bets, rejected
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """Read one HTTP/1.1 request, or None once the client has closed the connection."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise ApiError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', '0') or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise ApiError(400, "Malformed Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise ApiError(413, f"Bodies are limited to {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return parts[0].upper(), parts[1], headers, body
+
+def _encode_response(status: int, payload: Dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+async def serve(api: BetApi, host: str, port: int) -> asyncio.AbstractServer:
+    """Start serving the API; connections are kept alive between requests."""
+    async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except ApiError as e:
+                    writer.write(_encode_response(e.status, {"error": str(e)}, False))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await api.handle(method, path, headers, body)
+                keep_alive = headers.get('connection', '').lower() != "close"
+                writer.write(_encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(connection, host, port)
+
+def start_in_thread(db: DerbyDatabase, writes: BetWriteQueue, host: str, port: int,
+                    token: Optional[str] = None) -> str:
+    """Serve the API from a daemon thread with its own event loop; returns its address."""
+    loop = asyncio.new_event_loop()
+    try:
+        server = loop.run_until_complete(serve(BetApi(db, writes, token), host, port))
+    except Exception:
+        loop.close()
+        raise
+    threading.Thread(target=loop.run_forever, name="derby-bet-api", daemon=True).start()
+    # Port 0 picks a free port
+    return f"http://{host}:{server.sockets[0].getsockname()[1]}"
+
+def start_api(wrapper) -> Optional[str]:
+    """Start the API with the app if DERBY_API_PORT is set; returns its address.
+
+    Bets share the app's group-commit queue, which wakes the precompute worker.
+    """
+    port = os.environ.get("DERBY_API_PORT")
+    if not port:
+        return None
+    target = os.environ.get("DERBY_API_TARGET", DEFAULT_API_TARGET)
+    if target not in API_TARGETS:
+        print(f"Unknown DERBY_API_TARGET {target}; using {DEFAULT_API_TARGET}")
+        target = DEFAULT_API_TARGET
+    draft = target == "draft"
+    writes = wrapper.bet_write_queue(draft=draft, operator=API_OPERATOR if draft else None)
+    try:
+        return start_in_thread(wrapper.db, writes, os.environ.get("DERBY_API_HOST", "127.0.0.1"),
+                               int(port), os.environ.get("DERBY_API_TOKEN"))
+    except OSError as e:
+        print(f"Error starting bet API: {e}")
+        return None
+
+def main():
+    """Run the bet API on its own."""
+    parser = argparse.ArgumentParser(description="Derby Betting System bet submission API")
+    parser.add_argument("--db", help="Database path (default: $DERBY_DB_PATH or derby_betting.db)")
+    parser.add_argument("--host", default=os.environ.get("DERBY_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("DERBY_API_PORT", "8765")))
+    parser.add_argument("--target", choices=API_TARGETS, default=DEFAULT_API_TARGET,
+                        help="Write to draft bets (reviewed before submitting) or straight to bets")
+    parser.add_argument("--token", default=os.environ.get("DERBY_API_TOKEN"), help="Bearer token devices must send")
+    args = parser.parse_args()
+
+    db = DerbyDatabase(args.db)
+    writes = BetWriteQueue(db, draft=args.target == "draft", operator=API_OPERATOR if args.target == "draft" else None)
+
+    async def run():
+        server = await serve(BetApi(db, writes, args.token), args.host, args.port)
+        print(f"🏇 Bet API at http://{args.host}:{args.port} writing to {args.target}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writes.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Vectorized bet import for the Race Management paste and CSV tabs.
+
+Imports are parsed into a DataFrame, names and horse numbers are normalized,
+and every row is matched against bettor and horse index tables in a single
+pass. The result is a report splitting the rows into accepted bets and the
+reasons the others were rejected.
+"""
+
+from typing import Dict, List
+import pandas as pd
+
+REPORT_CATEGORIES = ["accepted", "malformed", "unknown_bettor", "unknown_horse", "duplicate"]
+
+def parse_paste_bets(text: str) -> pd.DataFrame:
+    """Parse 'Name:Horse' lines into line, raw, name and horse columns."""
+    lines = pd.Series(text.splitlines(), dtype=object)
+    lines = lines[lines.str.strip() != '']
+    parts = lines.str.partition(':')
+
+    df = pd.DataFrame({
+        'line': lines.index + 1,
+        'raw': lines.values,
+        'name': parts[0].values,
+        'horse': parts[2].values
+    })
+    # Lines without a separator cannot be read as a bet
+    df.loc[(parts[1] != ':').values, ['name', 'horse']] = None
+    return df.reset_index(drop=True)
+
+def parse_csv_bets(csv_df: pd.DataFrame) -> pd.DataFrame:
+    """Pick the name and horse columns of an uploaded CSV."""
+    name_col = next((col for col in csv_df.columns if 'name' in col.lower()), csv_df.columns[0])
+    horse_col = next((col for col in csv_df.columns if 'horse' in col.lower()),
+                     csv_df.columns[1] if len(csv_df.columns) > 1 else csv_df.columns[0])
+
+    names = csv_df[name_col].astype(object)
+    horses = csv_df[horse_col].astype(object)
+    return pd.DataFrame({
+        'line': range(2, len(csv_df) + 2),  # Line 1 is the header
+        'raw': names.astype(str) + ',' + horses.astype(str),
+        'name': names.where(names.notna(), None).values,
+        'horse': horses.where(horses.notna(), None).values
+    })
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """Case- and whitespace-insensitive matching key for bettor names."""
+    return names.astype(str).str.strip().str.replace(r'\s+', ' ', regex=True).str.casefold()
+
+def normalize_horses(horses: pd.Series) -> pd.Series:
+    """Canonical horse number text: '#3', ' 3 ' and 3.0 all become '3'."""
+    horses = horses.astype(str).str.strip().str.lstrip('#').str.strip()
+    return horses.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+
+def validate_bets(bets: pd.DataFrame, bettor_names: List[str], horse_numbers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Match parsed bets against the bettor and horse indexes.
+
+    Returns a dict of DataFrames keyed by REPORT_CATEGORIES. Rows are checked in
+    that order, so a row is only reported once. When a bettor appears more than
+    once, the last valid row wins and the earlier ones are reported as duplicates.
+    """
+    df = bets.copy()
+    malformed = df['name'].isna() | df['horse'].isna()
+
+    # Bettor index: exact names first, then the normalized key where it is unambiguous
+    bettor_index = pd.Index(bettor_names)
+    bettor_pos = bettor_index.get_indexer(df['name'].astype(str).str.strip())
+
+    bettor_keys = normalize_names(pd.Series(bettor_names, dtype=object))
+    unique_keys = ~bettor_keys.duplicated(keep=False)
+    key_index = pd.Index(bettor_keys[unique_keys])
+    key_pos = key_index.get_indexer(normalize_names(df['name']))
+    key_to_bettor = bettor_keys[unique_keys].index.to_numpy()
+    fallback = (bettor_pos < 0) & (key_pos >= 0)
+    bettor_pos[fallback] = key_to_bettor[key_pos[fallback]]
+
+    # Horse index
+    df['horse'] = normalize_horses(df['horse'])
+    horse_pos = pd.Index(horse_numbers).get_indexer(df['horse'])
+
+    unknown_bettor = ~malformed & (bettor_pos < 0)
+    unknown_horse = ~malformed & ~unknown_bettor & (horse_pos < 0)
+    valid = ~(malformed | unknown_bettor | unknown_horse)
+
+    df['name'] = pd.Series(bettor_names, dtype=object).reindex(bettor_pos).values
+    duplicate = valid & df['name'].where(valid).duplicated(keep='last')
+    accepted = valid & ~duplicate
+
+    columns = ['line', 'raw', 'name', 'horse']
+    return {
+        'accepted': df.loc[accepted, columns].reset_index(drop=True),
+        'malformed': df.loc[malformed, ['line', 'raw']].reset_index(drop=True),
+        'unknown_bettor': df.loc[unknown_bettor, ['line', 'raw']].reset_index(drop=True),
+        'unknown_horse': df.loc[unknown_horse, columns].reset_index(drop=True),
+        'duplicate': df.loc[duplicate, columns].reset_index(drop=True)
+    }
+
+def accepted_bets(report: Dict[str, pd.DataFrame]) -> Dict[str, str]:
+    """Accepted bets from a report as a bettor name to horse number dict."""
+    accepted = report['accepted']
+    return dict(zip(accepted['name'], accepted['horse']))
@@ -0,0 +1,286 @@
+"""
+Integer-keyed bet matrix for scoring.
+
+Bettors, horses and races are addressed by position: bettors in name order,
+horses in display order and races by number from 1. picks[b, r] is the index
+of the horse bettor b picked in race r (or NO_BET), and podium[r] holds the
+first, second and third place horse indexes of each completed race. Scores
+come from array lookups; names and horse numbers are only attached when a
+table is built for display. Points come from the event's compiled scoring
+rules (see scoring_rules.py).
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from packed_bets import unpack
+from scoring_rules import NO_BET, PLACE_FIELDS, compile_rules, normalize_rules, parse_rules
+
+class BetMatrix:
+    """Every bet and result of the event as integer arrays."""
+
+    def __init__(self, bettor_ids: np.ndarray, bettor_names: List[str], horse_ids: np.ndarray,
+                 horse_numbers: List[str], picks: np.ndarray, podium: np.ndarray, total_races: int = 0,
+                 rules: Optional[Dict] = None):
+        self.bettor_ids = bettor_ids
+        self.bettor_names = bettor_names
+        self.horse_ids = horse_ids
+        self.horse_numbers = horse_numbers
+        self.picks = picks
+        self.podium = podium
+        self.total_races = total_races
+        self.race_numbers = np.arange(1, podium.shape[0] + 1)
+        self.completed = podium[:, 0] != NO_BET
+        self.rules = normalize_rules(rules)
+        self.scoring = compile_rules(self.rules, podium.shape[0])
+        self._points = None
+        self._derived: Dict[str, Any] = {}
+
+    def race_index(self, race_number: int) -> Optional[int]:
+        """Column of a race in picks, or None if it is outside the event."""
+        if 1 <= race_number <= len(self.race_numbers):
+            return race_number - 1
+        return None
+
+    def points_table(self) -> np.ndarray:
+        """Points for picking each horse in each race; the last column is for NO_BET."""
+        return self.scoring.points_table(self.podium, len(self.horse_numbers))
+
+    def points(self) -> np.ndarray:
+        """Points per bettor (rows) and race (columns); races not run score 0."""
+        if self._points is None:
+            self._points = self.scoring.score(self.picks, self.podium, len(self.horse_numbers))
+        return self._points
+
+    def totals(self) -> np.ndarray:
+        """Total points per bettor."""
+        return self.points().sum(axis=1)
+
+    def ranking(self) -> np.ndarray:
+        """Bettor indexes by total points, highest first, ties by name."""
+        # Bettors are already in name order, so a stable sort keeps ties by name
+        return np.argsort(-self.totals(), kind='stable')
+
+    def cached(self, key: str, compute: Callable[["BetMatrix"], Any]) -> Any:
+        """A value derived from this matrix, computed on first use.
+
+        The matrix is rebuilt whenever bettors, horses, bets, results or rules
+        change, so it is the data version for everything derived from it.
+        """
+        if key not in self._derived:
+            self._derived[key] = compute(self)
+        return self._derived[key]
+    
+    def same_data(self, other: "BetMatrix") -> bool:
+        """Whether another matrix holds the same bettors, horses, bets, results and rules."""
+        return (self.bettor_names == other.bettor_names and self.horse_numbers == other.horse_numbers
+                and self.total_races == other.total_races and self.scoring.key == other.scoring.key
+                and np.array_equal(self.bettor_ids, other.bettor_ids)
+                and np.array_equal(self.horse_ids, other.horse_ids)
+                and np.array_equal(self.podium, other.podium)
+                and np.array_equal(self.picks, other.picks))
+    
+    def race_bets(self, race_index: int) -> Dict[str, str]:
+        """Bettor name to horse number for everyone who bet on a race."""
+        picks = self.picks[:, race_index]
+        bettors = np.flatnonzero(picks != NO_BET)
+        return {self.bettor_names[b]: self.horse_numbers[h]
+                for b, h in zip(bettors.tolist(), picks[bettors].tolist())}
+
+    def with_race(self, race_index: int, podium: np.ndarray, picks: np.ndarray) -> "BetMatrix":
+        """A copy with one race's podium and picks replaced.
+
+        Only the points of that race, and of any race where a combo through
+        it pays out, are rescored; every other column is copied.
+        """
+        new_picks = self.picks.copy()
+        new_picks[:, race_index] = picks
+        new_podium = self.podium.copy()
+        new_podium[race_index] = podium
+        matrix = BetMatrix(self.bettor_ids, self.bettor_names, self.horse_ids, self.horse_numbers,
+                           new_picks, new_podium, self.total_races, self.rules)
+        if self._points is not None:
+            races = matrix.scoring.affected_races(race_index)
+            points = self._points.copy()
+            points[:, races] = matrix.scoring.score(new_picks, new_podium, len(self.horse_numbers), races)
+            matrix._points = points
+        return matrix
+
+    def with_race_changes(self, race_index: int, placings: Dict[str, str], bets: Dict[str, str]) -> "BetMatrix":
+        """with_race by horse number and bettor name, over the race's current podium and picks.
+
+        placings maps 'first', 'second' and 'third' to horse numbers and bets
+        maps bettor names to horse numbers; an empty number means no horse.
+        """
+        horse_index = {number: i for i, number in enumerate(self.horse_numbers)}
+        bettor_index = self.cached("bettor_index", lambda matrix: {name: i for i, name in enumerate(matrix.bettor_names)})
+        podium = self.podium[race_index].copy()
+        for place, field in enumerate(PLACE_FIELDS):
+            if field in placings:
+                podium[place] = horse_index.get(placings[field], NO_BET)
+        picks = self.picks[:, race_index].copy()
+        changed = [(bettor_index[name], horse_index.get(horse, NO_BET))
+                   for name, horse in bets.items() if name in bettor_index]
+        if changed:
+            bettors, horses = zip(*changed)
+            picks[list(bettors)] = horses
+        return self.with_race(race_index, podium, picks)
+
+class Standings:
+    """Cumulative points and rank of every bettor after each completed race.
+
+    Column c of cumulative and ranks is the standings after race_numbers[c],
+    so any earlier race is a column lookup.
+    """
+
+    def __init__(self, bettor_ids: np.ndarray, race_numbers: np.ndarray,
+                 cumulative: np.ndarray, ranks: np.ndarray):
+        self.bettor_ids = bettor_ids
+        self.race_numbers = race_numbers
+        self.cumulative = cumulative
+        self.ranks = ranks
+
+    def column(self, race_number: Optional[int] = None) -> Optional[int]:
+        """Column for the standings as of a race (default the latest), or None before any results."""
+        if race_number is None:
+            column = len(self.race_numbers) - 1
+        else:
+            column = int(np.searchsorted(self.race_numbers, race_number, side='right')) - 1
+        return column if column >= 0 else None
+
+    def totals_as_of(self, race_number: Optional[int] = None) -> np.ndarray:
+        """Total points per bettor after a race."""
+        column = self.column(race_number)
+        if column is None:
+            return np.zeros(len(self.bettor_ids), dtype=np.int32)
+        return self.cumulative[:, column]
+
+    def ranks_as_of(self, race_number: Optional[int] = None) -> np.ndarray:
+        """1-based rank per bettor after a race; before any results, name order."""
+        column = self.column(race_number)
+        if column is None:
+            return np.arange(1, len(self.bettor_ids) + 1, dtype=np.int32)
+        return self.ranks[:, column]
+
+    def movement(self, race_number: Optional[int] = None) -> np.ndarray:
+        """Places gained in a race's standings since the previous completed race."""
+        column = self.column(race_number)
+        if not column:
+            return np.zeros(len(self.bettor_ids), dtype=np.int32)
+        return self.ranks[:, column - 1] - self.ranks[:, column]
+
+class StandingsHistory:
+    """Standings extended race by race instead of recomputed.
+
+    update() keeps every column whose race, results and bets are unchanged,
+    and computes only races completed since: one prefix-sum column and one
+    sort each. A change of scoring rules recomputes every column at once.
+    """
+
+    def __init__(self):
+        self.standings: Optional[Standings] = None
+        self.computed_races = 0
+        self._podium = None
+        self._picks = None
+        self._rules_key = None
+        self._lock = threading.Lock()
+
+    def _reusable_columns(self, matrix: BetMatrix, completed: np.ndarray) -> int:
+        """How many leading columns of the current standings still hold."""
+        standings = self.standings
+        if (standings is None or self._rules_key != matrix.scoring.key
+                or not np.array_equal(standings.bettor_ids, matrix.bettor_ids)):
+            return 0
+        same = 0
+        for column in range(min(len(standings.race_numbers), len(completed))):
+            race = completed[column]
+            if (standings.race_numbers[column] != matrix.race_numbers[race]
+                    or not np.array_equal(self._podium[column], matrix.podium[race])
+                    or not np.array_equal(self._picks[:, column], matrix.picks[:, race])):
+                break
+            same += 1
+        return same
+
+    def _extend(self, matrix: BetMatrix, completed: np.ndarray, reused: int) -> Standings:
+        """Standings for a matrix from the first `reused` current columns plus newly computed ones."""
+        bettors = len(matrix.bettor_ids)
+        cumulative = np.empty((bettors, len(completed)), dtype=np.int32)
+        ranks = np.empty((bettors, len(completed)), dtype=np.int32)
+        if reused:
+            cumulative[:, :reused] = self.standings.cumulative[:, :reused]
+            ranks[:, :reused] = self.standings.ranks[:, :reused]
+        running = cumulative[:, reused - 1].copy() if reused else np.zeros(bettors, dtype=np.int32)
+
+        points = matrix.points()
+        positions = np.arange(1, bettors + 1, dtype=np.int32)
+        for column in range(reused, len(completed)):
+            running += points[:, completed[column]]
+            cumulative[:, column] = running
+            # Bettors are in name order, so a stable sort ranks ties by name
+            ranks[np.argsort(-running, kind='stable'), column] = positions
+        return Standings(matrix.bettor_ids, matrix.race_numbers[completed], cumulative, ranks)
+
+    def update(self, matrix: BetMatrix) -> Standings:
+        """Bring the standings up to date with a bet matrix and return them."""
+        with self._lock:
+            completed = np.flatnonzero(matrix.completed)
+            reused = self._reusable_columns(matrix, completed)
+            if reused == len(completed) and self.standings is not None and reused == len(self.standings.race_numbers):
+                self.computed_races = 0
+                return self.standings
+
+            self.standings = self._extend(matrix, completed, reused)
+            self._podium = matrix.podium[completed]
+            self._picks = matrix.picks[:, completed]
+            self._rules_key = matrix.scoring.key
+            self.computed_races = len(completed) - reused
+            return self.standings
+
+    def preview(self, matrix: BetMatrix) -> Standings:
+        """Standings for a what-if matrix, extended like update() but not kept."""
+        with self._lock:
+            completed = np.flatnonzero(matrix.completed)
+            return self._extend(matrix, completed, self._reusable_columns(matrix, completed))
+
+def _index_of(ids: np.ndarray) -> np.ndarray:
+    """Lookup array from database id to position (NO_BET for unknown ids)."""
+    index = np.full(int(ids.max()) + 1 if len(ids) else 1, NO_BET, dtype=np.int32)
+    index[ids] = np.arange(len(ids), dtype=np.int32)
+    return index
+
+def build_bet_matrix(data: Dict) -> BetMatrix:
+    """Build the matrix from DerbyDatabase.get_scoring_data()."""
+    bettor_ids = np.array([row[0] for row in data['bettors']], dtype=np.int64)
+    horse_ids = np.array([row[0] for row in data['horses']], dtype=np.int64)
+    bettor_index = _index_of(bettor_ids)
+    horse_index = np.append(_index_of(horse_ids), NO_BET)  # id -1 marks a missing placing
+
+    packed_bets = data.get('packed_bets', [])
+    race_count = max([data.get('total_races', 0)] + [row[0] for row in data['races']]
+                     + [row[1] for row in data['bets']] + [row[0] for row in packed_bets])
+
+    podium = np.full((race_count, 3), NO_BET, dtype=np.int16)
+    if data['races']:
+        races = np.array(data['races'], dtype=np.int64)
+        podium[races[:, 0] - 1] = horse_index[races[:, 1:]]
+
+    picks = np.full((len(bettor_ids), race_count), NO_BET, dtype=np.int16)
+    if data['bets']:
+        bets = np.array(data['bets'], dtype=np.int64)
+        picks[bettor_index[bets[:, 0]], bets[:, 1] - 1] = horse_index[bets[:, 2]]
+
+    # Packed races are read in place; bettors past the end of a blob have no bet
+    for race_number, blob in packed_bets:
+        horses = unpack(blob)
+        has_slot = bettor_ids < len(horses)
+        picks[has_slot, race_number - 1] = horse_index[horses[bettor_ids[has_slot]]]
+
+    return BetMatrix(bettor_ids, [row[1] for row in data['bettors']],
+                     horse_ids, [row[1] for row in data['horses']], picks, podium,
+                     data.get('total_races', 0), parse_rules(data.get('scoring_rules', '')))
+
+def load_bet_matrix(db) -> BetMatrix:
+    """Load the whole event from a DerbyDatabase."""
+    return build_bet_matrix(db.get_scoring_data())
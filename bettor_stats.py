@@ -0,0 +1,105 @@
+"""
+Bettor performance statistics for every bettor at once.
+
+Everything is computed from the bet matrix in one pass of array operations,
+with no per-bettor loops. All but the favorite horse count completed races
+only:
+
+    bets      completed races the bettor bet on
+    scored    races they scored in; hit rate is scored / bets
+    wins, places, shows
+              how often their horse finished 1st, 2nd and 3rd
+    streak    longest run of consecutive completed races with points
+    favorite  the horse they picked most often in any race (ties go to the
+              horse listed first)
+
+Points versus the field compare each total with the average total.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from bet_matrix import BetMatrix
+from scoring_rules import NO_BET, PLACES
+
+STAT_COLUMNS = ("bets", "scored", "wins", "places", "shows", "streak")
+
+class BettorStats:
+    """Stats per bettor in name order.
+
+    counts has one column per STAT_COLUMNS entry; favorites holds horse
+    indexes (NO_BET for bettors with no bets).
+    """
+
+    def __init__(self, bettor_names: List[str], horse_numbers: List[str], counts: np.ndarray,
+                 favorites: np.ndarray, totals: np.ndarray, completed_races: int):
+        self.bettor_names = bettor_names
+        self.horse_numbers = horse_numbers
+        self.counts = counts
+        self.favorites = favorites
+        self.totals = totals
+        self.completed_races = completed_races
+        self.field_average = float(totals.mean()) if len(totals) else 0.0
+
+    def row(self, bettor: int) -> Dict:
+        """One bettor's stats for display."""
+        bets, scored, wins, places, shows, streak = self.counts[bettor].tolist()
+        favorite = int(self.favorites[bettor])
+        total = int(self.totals[bettor])
+        return {
+            "Bettor": self.bettor_names[bettor],
+            "Bets": bets,
+            "Hit Rate %": round(100 * scored / bets, 1) if bets else 0.0,
+            "Wins": wins,
+            "Places": places,
+            "Shows": shows,
+            "Best Streak": streak,
+            "Favorite Horse": self.horse_numbers[favorite] if favorite != NO_BET else "",
+            "Avg per Race": round(total / self.completed_races, 2) if self.completed_races else 0.0,
+            "vs Field": round(total - self.field_average, 1)
+        }
+
+    def rows(self, bettors: Optional[List[int]] = None) -> List[Dict]:
+        """Stats rows for the given bettors, or everyone."""
+        return [self.row(bettor) for bettor in (range(len(self.bettor_names)) if bettors is None else bettors)]
+
+def longest_runs(hits: np.ndarray) -> np.ndarray:
+    """Longest run of True in each row."""
+    if not hits.shape[1]:
+        return np.zeros(hits.shape[0], dtype=np.int32)
+    running = np.cumsum(hits, axis=1, dtype=np.int32)
+    # The running count at the last miss, carried forward, is where the current run started
+    starts = np.maximum.accumulate(np.where(hits, 0, running), axis=1)
+    return (running - starts).max(axis=1)
+
+def favorite_horses(picks: np.ndarray, horses: int) -> np.ndarray:
+    """Most picked horse index per bettor, NO_BET for bettors with no bets."""
+    bettors = picks.shape[0]
+    columns = np.where(picks == NO_BET, horses, picks).astype(np.int64)
+    counts = np.bincount((columns + np.arange(bettors)[:, None] * (horses + 1)).ravel(),
+                         minlength=bettors * (horses + 1)).reshape(bettors, horses + 1)[:, :horses]
+    if not horses:
+        return np.full(bettors, NO_BET, dtype=np.int32)
+    return np.where(counts.max(axis=1) > 0, counts.argmax(axis=1), NO_BET).astype(np.int32)
+
+def compute_bettor_stats(matrix: BetMatrix) -> BettorStats:
+    """Stats for every bettor from the completed races of a bet matrix."""
+    completed = np.flatnonzero(matrix.completed)
+    picks = matrix.picks[:, completed]
+    podium = matrix.podium[completed]
+    scored = matrix.points()[:, completed] > 0
+
+    counts = np.empty((len(matrix.bettor_names), len(STAT_COLUMNS)), dtype=np.int32)
+    counts[:, 0] = (picks != NO_BET).sum(axis=1)
+    counts[:, 1] = scored.sum(axis=1)
+    for place in range(PLACES):
+        counts[:, 2 + place] = ((picks == podium[:, place]) & (picks != NO_BET)).sum(axis=1)
+    counts[:, 5] = longest_runs(scored)
+
+    return BettorStats(matrix.bettor_names, matrix.horse_numbers, counts,
+                       favorite_horses(matrix.picks, len(matrix.horse_numbers)), matrix.totals(), len(completed))
+
+def bettor_stats(matrix: BetMatrix) -> BettorStats:
+    """Bettor stats for a bet matrix, computed once per matrix."""
+    return matrix.cached("bettor_stats", compute_bettor_stats)
@@ -0,0 +1,89 @@
+"""
+Clinch and elimination analysis for the races still to run.
+
+A bettor's maximum total is their current total plus the most the remaining
+races can still pay them: the top place points of every race not yet run,
+and the bonus of every unfinished combo whose completed races they have all
+won. Each bettor's best case is taken on its own, so the flags are safe:
+nobody flagged eliminated can still finish first and nobody who has clinched
+can be caught, though a bettor can be out before the flag shows it.
+
+Ties are broken by name, as on the scoreboard, so each bettor's standing is
+one integer key: points * bettors + places ahead of the last name.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+class Outlook:
+    """Who can still finish first, for bettors in name order.
+
+    magic_numbers are the points each bettor still needs to clinch first
+    place even if every rival reaches their maximum: 0 once clinched, -1
+    once eliminated.
+    """
+
+    def __init__(self, totals: np.ndarray, max_totals: np.ndarray, clinched: np.ndarray,
+                 eliminated: np.ndarray, magic_numbers: np.ndarray):
+        self.totals = totals
+        self.max_totals = max_totals
+        self.clinched = clinched
+        self.eliminated = eliminated
+        self.magic_numbers = magic_numbers
+
+    @property
+    def contenders(self) -> int:
+        """How many bettors can still finish first."""
+        return int((~self.eliminated).sum())
+
+    def winner(self) -> Optional[int]:
+        """The bettor who has clinched first place, if anyone has."""
+        clinched = np.flatnonzero(self.clinched)
+        return int(clinched[0]) if len(clinched) else None
+
+def remaining_races(matrix) -> np.ndarray:
+    """Race columns of the event that have no results yet."""
+    race_count = min(matrix.total_races or len(matrix.race_numbers), len(matrix.race_numbers))
+    return np.flatnonzero(~matrix.completed[:race_count])
+
+def max_totals(matrix) -> np.ndarray:
+    """The highest total each bettor can still reach."""
+    remaining = remaining_races(matrix)
+    best = matrix.totals().astype(np.int64) + int(matrix.scoring.place_points[remaining].max(axis=1, initial=0).sum())
+    for races, bonus in matrix.scoring.combos:
+        done = races[matrix.completed[races]]
+        if len(done) < len(races) and np.isin(races[~matrix.completed[races]], remaining).all():
+            # Still open to whoever has picked the winner of every race run so far
+            best += bonus * (matrix.picks[:, done] == matrix.podium[done, 0]).all(axis=1)
+    return best
+
+def build_outlook(totals: np.ndarray, max_totals: np.ndarray) -> Outlook:
+    """Clinch, elimination and magic numbers from current and maximum totals in name order."""
+    bettors = len(totals)
+    totals = np.asarray(totals, dtype=np.int64)
+    max_totals = np.asarray(max_totals, dtype=np.int64)
+    if not bettors:
+        empty = np.zeros(0, dtype=np.int64)
+        return Outlook(totals, max_totals, empty.astype(bool), empty.astype(bool), empty)
+
+    tie_break = np.arange(bettors - 1, -1, -1, dtype=np.int64)
+    current_keys = totals * bettors + tie_break
+    max_keys = max_totals * bettors + tie_break
+
+    # The best maximum among each bettor's rivals is the top one, or the runner-up for the top bettor
+    top = int(np.argmax(max_keys))
+    runner_up = np.delete(max_keys, top).max(initial=-1)
+    rival_keys = np.full(bettors, max_keys[top])
+    rival_keys[top] = runner_up
+
+    clinched = current_keys > rival_keys
+    eliminated = max_keys < current_keys.max()
+    # Smallest gain that lifts the bettor's key above every rival's maximum
+    magic_numbers = np.maximum((rival_keys - tie_break) // bettors - totals + 1, 0)
+    magic_numbers[eliminated] = -1
+    return Outlook(totals, max_totals, clinched, eliminated, magic_numbers)
+
+def matrix_outlook(matrix) -> Outlook:
+    """The outlook for a bet matrix's current standings, computed once per matrix."""
+    return matrix.cached("outlook", lambda matrix: build_outlook(matrix.totals(), max_totals(matrix)))
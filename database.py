@@ -2,31 +2,130 @@ import sqlite3
 import json
 import os
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
+import numpy as np
+from bet_matrix import build_bet_matrix
+from packed_bets import BET_STORAGE_MODES, DEFAULT_BET_STORAGE, NO_HORSE, bet_pairs, pack, unpack
+from profiling import profile_methods
+from scoring_rules import PLACE_FIELDS, parse_rules, rules_to_json
+import metrics
+import query_trace
 
+# SQLite settings applied to every connection. journal_mode is stored in the
+# database file itself, so it is only set when a profile is chosen.
+PERFORMANCE_PROFILES = {
+    "durable": {
+        'description': "Safest: rollback journal and a full sync on every commit",
+        'journal_mode': "DELETE",
+        'synchronous': "FULL",
+        'cache_size': -8000,           # KiB
+        'mmap_size': 0,
+        'temp_store': "DEFAULT",
+        'busy_timeout_ms': 5000
+    },
+    "event-night": {
+        'description': "WAL so viewers never block organizers; syncs at checkpoints",
+        'journal_mode': "WAL",
+        'synchronous': "NORMAL",
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': "MEMORY",
+        'busy_timeout_ms': 10000
+    },
+    "bulk-import": {
+        'description': "Fastest loading; a power loss can lose the latest commits",
+        'journal_mode': "WAL",
+        'synchronous': "OFF",
+        'cache_size': -256000,
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': "MEMORY",
+        'busy_timeout_ms': 30000
+    }
+}
+DEFAULT_PERFORMANCE_PROFILE = "durable"
+
+def _fan_out(callbacks: List[Callable[[str], None]]) -> Callable[[str], None]:
+    """One trace callback that passes each statement to every callback."""
+    def trace(statement: str):
+        for callback in callbacks:
+            callback(statement)
+    return trace
+
+# get_connection is left out: it runs inside every other method
+@profile_methods("db", exclude=("get_connection",))
+@query_trace.track_methods(exclude=("get_connection",))
+@metrics.instrument_methods(exclude=("get_connection",))
 class DerbyDatabase:
-    def __init__(self, db_path: str = "derby_betting.db"):
-        """Initialize the database connection and create tables if they don't exist."""
-        self.db_path = db_path
+    # Callables run on every new connection
+    connection_hooks: List[Callable[[sqlite3.Connection], None]] = []
+    # Called with every statement SQLite runs, alongside the tracing and metrics counters
+    statement_listeners: List[Callable[[str], None]] = []
+    
+    def __init__(self, db_path: Optional[str] = None, profile: Optional[str] = None):
+        """Initialize the database connection and create tables if they don't exist.
+        
+        The path defaults to $DERBY_DB_PATH, or derby_betting.db in the working directory.
+        The performance profile is `profile`, else $DERBY_SQLITE_PROFILE, else the
+        sqlite_profile setting, else "durable". Bets are stored as the bet_storage
+        setting says (see packed_bets.py).
+        """
+        self.db_path = db_path or os.environ.get("DERBY_DB_PATH", "derby_betting.db")
+        self._use_profile(DEFAULT_PERFORMANCE_PROFILE)
         self.init_database()
+        
+        self.bet_storage = self.get_setting('bet_storage', DEFAULT_BET_STORAGE)
+        if self.bet_storage not in BET_STORAGE_MODES:
+            self.bet_storage = DEFAULT_BET_STORAGE
+        
+        profile = profile or os.environ.get("DERBY_SQLITE_PROFILE") or self.get_setting('sqlite_profile')
+        if profile and not self.set_performance_profile(profile):
+            self.set_performance_profile(DEFAULT_PERFORMANCE_PROFILE)
+    
+    def _use_profile(self, name: str):
+        """Remember the profile and prebuild its per-connection PRAGMAs."""
+        settings = PERFORMANCE_PROFILES[name]
+        self.performance_profile = name
+        self._busy_timeout = settings['busy_timeout_ms'] / 1000
+        self._connection_pragmas = (
+            "PRAGMA foreign_keys = ON;"
+            f"PRAGMA synchronous = {settings['synchronous']};"
+            f"PRAGMA cache_size = {settings['cache_size']};"
+            f"PRAGMA mmap_size = {settings['mmap_size']};"
+            f"PRAGMA temp_store = {settings['temp_store']};"
+        )
     
     def get_connection(self):
-        """Get a database connection with foreign key support enabled."""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA foreign_keys = ON")
+        """Get a database connection with foreign keys on and the performance profile applied."""
+        conn = sqlite3.connect(self.db_path, timeout=self._busy_timeout, factory=query_trace.connection_factory())
+        # SQLite keeps one trace callback per connection, so every statement counter shares it
+        counters = list(DerbyDatabase.statement_listeners)
+        if isinstance(conn, query_trace.TracedConnection):
+            counters.append(query_trace.count_sqlite_statement)  # Counts for the metrics too
+        elif metrics.is_enabled():
+            counters.append(metrics.count_query)
+        if counters:
+            conn.set_trace_callback(counters[0] if len(counters) == 1 else _fan_out(counters))
+        conn.executescript(self._connection_pragmas)
+        for hook in DerbyDatabase.connection_hooks:
+            hook(conn)
         return conn
     
     def init_database(self):
-        """Create all necessary tables."""
+        """Create all necessary tables, migrating older databases to integer horse keys."""
         with self.get_connection() as conn:
-            # Horses table
+            migrating = self._begin_integer_key_migration(conn)
+            
+            # Horses table - bets and results refer to horses by id; the number is for display
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS horses (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     number TEXT UNIQUE NOT NULL,
+                    sort_key INTEGER NOT NULL DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            self._add_missing_columns(conn, "horses", {"sort_key": "INTEGER NOT NULL DEFAULT 0"})
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_horses_sort_key ON horses (sort_key, number)")
             
             # Bettors table
             conn.execute("""
@@ -42,14 +141,14 @@ class DerbyDatabase:
                 CREATE TABLE IF NOT EXISTS races (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     race_number INTEGER UNIQUE NOT NULL,
-                    first_place_horse TEXT,
-                    second_place_horse TEXT,
-                    third_place_horse TEXT,
+                    first_horse_id INTEGER,
+                    second_horse_id INTEGER,
+                    third_horse_id INTEGER,
                     completed_at TIMESTAMP,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (first_place_horse) REFERENCES horses(number),
-                    FOREIGN KEY (second_place_horse) REFERENCES horses(number),
-                    FOREIGN KEY (third_place_horse) REFERENCES horses(number)
+                    FOREIGN KEY (first_horse_id) REFERENCES horses(id),
+                    FOREIGN KEY (second_horse_id) REFERENCES horses(id),
+                    FOREIGN KEY (third_horse_id) REFERENCES horses(id)
                 )
             """)
             
@@ -59,15 +158,79 @@ class DerbyDatabase:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     bettor_id INTEGER NOT NULL,
                     race_id INTEGER NOT NULL,
-                    horse_number TEXT NOT NULL,
+                    horse_id INTEGER NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (bettor_id) REFERENCES bettors(id) ON DELETE CASCADE,
                     FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE,
-                    FOREIGN KEY (horse_number) REFERENCES horses(number),
+                    FOREIGN KEY (horse_id) REFERENCES horses(id),
                     UNIQUE(bettor_id, race_id)
                 )
             """)
             
+            # Packed bets table - one blob of horse ids per race, in packed storage mode
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS packed_bets (
+                    race_id INTEGER PRIMARY KEY,
+                    horse_ids BLOB NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Draft bets table - bets typed for a race that has not been submitted yet
+            # (a NULL horse is a cleared bet)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS draft_bets (
+                    race_number INTEGER NOT NULL,
+                    bettor_id INTEGER NOT NULL,
+                    horse_id INTEGER,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    operator TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (race_number, bettor_id),
+                    FOREIGN KEY (bettor_id) REFERENCES bettors(id) ON DELETE CASCADE,
+                    FOREIGN KEY (horse_id) REFERENCES horses(id)
+                )
+            """)
+            
+            # Explicit bettor-to-partition assignments for multi-operator entry
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bettor_partitions (
+                    bettor_id INTEGER PRIMARY KEY,
+                    partition TEXT NOT NULL,
+                    FOREIGN KEY (bettor_id) REFERENCES bettors(id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Per-race partition claims and completion for multi-operator entry
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS race_partitions (
+                    race_number INTEGER NOT NULL,
+                    partition TEXT NOT NULL,
+                    operator TEXT,
+                    completed_at TIMESTAMP,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (race_number, partition)
+                )
+            """)
+            
+            # Audit trail of corrections to completed races; horses are stored by number
+            # so the record reads the same after horses are renamed or removed
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_corrections (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    race_number INTEGER NOT NULL,
+                    field TEXT NOT NULL,
+                    bettor_name TEXT,
+                    old_value TEXT,
+                    new_value TEXT,
+                    operator TEXT,
+                    reason TEXT,
+                    corrected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             # System settings table
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS settings (
@@ -77,16 +240,96 @@ class DerbyDatabase:
                 )
             """)
             
+            if migrating:
+                self._finish_integer_key_migration(conn)
             conn.commit()
     
+    def _begin_integer_key_migration(self, conn) -> bool:
+        """Set aside tables that still key horses by their TEXT number.
+        
+        Returns True if a migration was started; the new tables are then created
+        and _finish_integer_key_migration copies the data across in the same
+        transaction.
+        """
+        bet_columns = {row[1] for row in conn.execute("PRAGMA table_info(bets)")}
+        if 'horse_number' not in bet_columns:
+            return False
+        
+        # Tables are rebuilt, so foreign keys are checked once at the end instead
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("BEGIN")
+        conn.execute("ALTER TABLE races RENAME TO races_text_keys")
+        conn.execute("ALTER TABLE bets RENAME TO bets_text_keys")
+        draft_columns = {row[1] for row in conn.execute("PRAGMA table_info(draft_bets)")}
+        if draft_columns:
+            self._add_missing_columns(conn, "draft_bets", {
+                "version": "INTEGER NOT NULL DEFAULT 1",
+                "operator": "TEXT"
+            })
+            conn.execute("ALTER TABLE draft_bets RENAME TO draft_bets_text_keys")
+        return True
+    
+    def _finish_integer_key_migration(self, conn):
+        """Copy the set-aside tables into the integer-keyed ones and drop them."""
+        conn.execute("UPDATE horses SET sort_key = CAST(number AS INTEGER)")
+        conn.execute("""
+            INSERT INTO races (id, race_number, first_horse_id, second_horse_id, third_horse_id,
+                               completed_at, created_at)
+            SELECT r.id, r.race_number, h1.id, h2.id, h3.id, r.completed_at, r.created_at
+            FROM races_text_keys r
+            LEFT JOIN horses h1 ON h1.number = r.first_place_horse
+            LEFT JOIN horses h2 ON h2.number = r.second_place_horse
+            LEFT JOIN horses h3 ON h3.number = r.third_place_horse
+        """)
+        conn.execute("""
+            INSERT INTO bets (id, bettor_id, race_id, horse_id, created_at)
+            SELECT b.id, b.bettor_id, b.race_id, h.id, b.created_at
+            FROM bets_text_keys b
+            JOIN horses h ON h.number = b.horse_number
+        """)
+        conn.execute("DROP TABLE bets_text_keys")
+        conn.execute("DROP TABLE races_text_keys")
+        
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'draft_bets_text_keys'").fetchone():
+            conn.execute("""
+                INSERT INTO draft_bets (race_number, bettor_id, horse_id, version, operator, updated_at)
+                SELECT d.race_number, d.bettor_id, h.id, d.version, d.operator, d.updated_at
+                FROM draft_bets_text_keys d
+                LEFT JOIN horses h ON h.number = d.horse_number
+            """)
+            conn.execute("DROP TABLE draft_bets_text_keys")
+        
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            raise sqlite3.IntegrityError(f"Integer key migration left {len(violations)} broken references")
+    
+    def _horse_ids(self, conn) -> Dict[str, int]:
+        """Horse number to horse id."""
+        return dict(conn.execute("SELECT number, id FROM horses").fetchall())
+    
+    def _horse_id(self, horse_ids: Dict[str, int], horse_number: Optional[str]) -> Optional[int]:
+        """Look up a horse id; an empty number means no horse."""
+        if not horse_number:
+            return None
+        if horse_number not in horse_ids:
+            raise ValueError(f"Unknown horse: {horse_number}")
+        return horse_ids[horse_number]
+    
+    def _add_missing_columns(self, conn, table: str, columns: Dict[str, str]):
+        """Add columns introduced after a table was first created."""
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, definition in columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
     # HORSE OPERATIONS
     def add_horses_bulk(self, horse_numbers: List[str]) -> bool:
         """Add multiple horses at once."""
         try:
             with self.get_connection() as conn:
                 conn.executemany(
-                    "INSERT OR IGNORE INTO horses (number) VALUES (?)",
-                    [(num,) for num in horse_numbers]
+                    "INSERT OR IGNORE INTO horses (number, sort_key) VALUES (?, CAST(? AS INTEGER))",
+                    [(num, num) for num in horse_numbers]
                 )
                 conn.commit()
                 return True
@@ -98,7 +341,8 @@ class DerbyDatabase:
         """Add a single horse."""
         try:
             with self.get_connection() as conn:
-                conn.execute("INSERT INTO horses (number) VALUES (?)", (horse_number,))
+                conn.execute("INSERT INTO horses (number, sort_key) VALUES (?, CAST(? AS INTEGER))",
+                             (horse_number, horse_number))
                 conn.commit()
                 return True
         except sqlite3.IntegrityError:
@@ -107,13 +351,18 @@ class DerbyDatabase:
     def get_all_horses(self) -> List[str]:
         """Get all horse numbers."""
         with self.get_connection() as conn:
-            cursor = conn.execute("SELECT number FROM horses ORDER BY CAST(number AS INTEGER)")
+            cursor = conn.execute("SELECT number FROM horses ORDER BY sort_key, number")
             return [row[0] for row in cursor.fetchall()]
     
     def remove_horse(self, horse_number: str) -> bool:
         """Remove a horse if not referenced in any bets."""
         try:
             with self.get_connection() as conn:
+                # Packed bets are not covered by the foreign key
+                horse_id = self._horse_ids(conn).get(horse_number)
+                for (blob,) in conn.execute("SELECT horse_ids FROM packed_bets"):
+                    if (unpack(blob) == horse_id).any():
+                        return False
                 conn.execute("DELETE FROM horses WHERE number = ?", (horse_number,))
                 conn.commit()
                 return True
@@ -141,6 +390,10 @@ class DerbyDatabase:
         """Remove a bettor and all their bets."""
         try:
             with self.get_connection() as conn:
+                for race_id, blob in conn.execute("SELECT race_id, horse_ids FROM packed_bets").fetchall():
+                    if bettor_id < len(unpack(blob)):
+                        conn.execute("UPDATE packed_bets SET horse_ids = ? WHERE race_id = ?",
+                                     (pack([(bettor_id, NO_HORSE)], blob), race_id))
                 conn.execute("DELETE FROM bettors WHERE id = ?", (bettor_id,))
                 conn.commit()
                 return True
@@ -169,12 +422,13 @@ class DerbyDatabase:
         """Mark a race as completed with results."""
         try:
             with self.get_connection() as conn:
+                horse_ids = self._horse_ids(conn)
                 conn.execute("""
                     UPDATE races 
-                    SET first_place_horse = ?, second_place_horse = ?, third_place_horse = ?, 
+                    SET first_horse_id = ?, second_horse_id = ?, third_horse_id = ?, 
                         completed_at = CURRENT_TIMESTAMP
                     WHERE race_number = ?
-                """, (first, second, third, race_number))
+                """, (*[self._horse_id(horse_ids, h) for h in (first, second, third)], race_number))
                 conn.commit()
                 return True
         except Exception:
@@ -184,9 +438,12 @@ class DerbyDatabase:
         """Get race details by race number."""
         with self.get_connection() as conn:
             cursor = conn.execute("""
-                SELECT id, race_number, first_place_horse, second_place_horse, 
-                       third_place_horse, completed_at
-                FROM races WHERE race_number = ?
+                SELECT r.id, r.race_number, h1.number, h2.number, h3.number, r.completed_at
+                FROM races r
+                LEFT JOIN horses h1 ON h1.id = r.first_horse_id
+                LEFT JOIN horses h2 ON h2.id = r.second_horse_id
+                LEFT JOIN horses h3 ON h3.id = r.third_horse_id
+                WHERE r.race_number = ?
             """, (race_number,))
             row = cursor.fetchone()
             if row:
@@ -205,9 +462,12 @@ class DerbyDatabase:
         """Get all races."""
         with self.get_connection() as conn:
             cursor = conn.execute("""
-                SELECT id, race_number, first_place_horse, second_place_horse, 
-                       third_place_horse, completed_at
-                FROM races ORDER BY race_number
+                SELECT r.id, r.race_number, h1.number, h2.number, h3.number, r.completed_at
+                FROM races r
+                LEFT JOIN horses h1 ON h1.id = r.first_horse_id
+                LEFT JOIN horses h2 ON h2.id = r.second_horse_id
+                LEFT JOIN horses h3 ON h3.id = r.third_horse_id
+                ORDER BY r.race_number
             """)
             return [{
                 "id": row[0],
@@ -224,10 +484,7 @@ class DerbyDatabase:
         """Add a bet for a bettor in a race."""
         try:
             with self.get_connection() as conn:
-                conn.execute("""
-                    INSERT OR REPLACE INTO bets (bettor_id, race_id, horse_number) 
-                    VALUES (?, ?, ?)
-                """, (bettor_id, race_id, horse_number))
+                self._store_bets(conn, race_id, [(bettor_id, self._horse_id(self._horse_ids(conn), horse_number))])
                 conn.commit()
                 return True
         except Exception:
@@ -238,89 +495,594 @@ class DerbyDatabase:
         try:
             with self.get_connection() as conn:
                 # Get race ID
-                race = self.get_race_by_number(race_number)
-                if not race:
+                row = conn.execute("SELECT id FROM races WHERE race_number = ?", (race_number,)).fetchone()
+                if not row:
                     return False
+                race_id = row[0]
                 
-                # Add all bets
-                for bettor_name, horse_number in bettor_bets.items():
-                    bettor = self.get_bettor_by_name(bettor_name)
-                    if bettor:
-                        conn.execute("""
-                            INSERT OR REPLACE INTO bets (bettor_id, race_id, horse_number) 
-                            VALUES (?, ?, ?)
-                        """, (bettor["id"], race["id"], horse_number))
+                # Add all bets, resolving names and horse numbers to ids once
+                bettor_ids = dict(conn.execute("SELECT name, id FROM bettors").fetchall())
+                horse_ids = self._horse_ids(conn)
+                self._store_bets(conn, race_id, [(bettor_ids[name], self._horse_id(horse_ids, horse))
+                                                 for name, horse in bettor_bets.items()
+                                                 if name in bettor_ids and horse])
                 
                 conn.commit()
                 return True
         except Exception:
             return False
     
+    def write_bet_batch(self, bets: List[Tuple[int, str, str]], draft: bool = False,
+                        operator: Optional[str] = None) -> Optional[List[Optional[str]]]:
+        """Upsert (race_number, bettor name, horse number) bets from many callers in one transaction.
+        
+        An empty horse number clears the bet, and a later bet for the same bettor
+        and race wins. Bets go to draft_bets when `draft` is set. Returns an error
+        message per bet (None where it was written), or None if the write failed.
+        """
+        errors: List[Optional[str]] = [None] * len(bets)
+        try:
+            with self.get_connection() as conn:
+                horse_ids = self._horse_ids(conn)
+                bettor_ids = self._lookup_ids(conn, "SELECT name, id FROM bettors WHERE name IN ({})",
+                                              list({name for _, name, _ in bets}))
+                race_numbers = sorted({race_number for race_number, _, _ in bets if race_number >= 1})
+                if not draft:
+                    conn.executemany("INSERT OR IGNORE INTO races (race_number) VALUES (?)",
+                                     [(race_number,) for race_number in race_numbers])
+                races = {row[0]: row[1:] for row in self._lookup_rows(
+                    conn, "SELECT race_number, id, completed_at FROM races WHERE race_number IN ({})", race_numbers)}
+                
+                # Later bets for the same bettor and race replace earlier ones
+                writes: Dict[Tuple[int, int], Optional[int]] = {}
+                for i, (race_number, name, horse) in enumerate(bets):
+                    if race_number < 1:
+                        errors[i] = f"Unknown race: {race_number}"
+                    elif race_number in races and races[race_number][1] is not None:
+                        errors[i] = f"Race {race_number} already has results"
+                    elif name not in bettor_ids:
+                        errors[i] = f"Unknown bettor: {name}"
+                    elif horse and horse not in horse_ids:
+                        errors[i] = f"Unknown horse: {horse}"
+                    else:
+                        writes[(race_number, bettor_ids[name])] = horse_ids.get(horse) if horse else None
+                
+                if draft:
+                    conn.executemany("""
+                        INSERT INTO draft_bets (race_number, bettor_id, horse_id, operator)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(race_number, bettor_id) DO UPDATE
+                        SET horse_id = excluded.horse_id, operator = excluded.operator,
+                            version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    """, [(race_number, bettor_id, horse_id, operator)
+                          for (race_number, bettor_id), horse_id in writes.items()])
+                else:
+                    by_race: Dict[int, List[Tuple[int, Optional[int]]]] = {}
+                    for (race_number, bettor_id), horse_id in writes.items():
+                        by_race.setdefault(race_number, []).append((bettor_id, horse_id))
+                    for race_number, race_bets in by_race.items():
+                        race_id = races[race_number][0]
+                        if self.bet_storage == "packed":
+                            self._store_bets(conn, race_id, [(bettor_id, horse_id or NO_HORSE)
+                                                             for bettor_id, horse_id in race_bets])
+                        else:
+                            self._store_bets(conn, race_id, [bet for bet in race_bets if bet[1]])
+                            conn.executemany("DELETE FROM bets WHERE bettor_id = ? AND race_id = ?",
+                                             [(bettor_id, race_id) for bettor_id, horse_id in race_bets if not horse_id])
+                
+                conn.commit()
+        except Exception as e:
+            print(f"Error writing bet batch: {e}")
+            return None
+        return errors
+    
+    def _lookup_rows(self, conn, query: str, keys: List) -> List[Tuple]:
+        """Run a query with an IN ({}) placeholder for the keys, in chunks SQLite accepts."""
+        rows = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows.extend(conn.execute(query.format(",".join("?" * len(chunk))), chunk).fetchall())
+        return rows
+    
+    def _lookup_ids(self, conn, query: str, keys: List) -> Dict:
+        """Key to id for the keys found by a (key, id) _lookup_rows query."""
+        return dict(self._lookup_rows(conn, query, keys))
+    
     def get_race_bets(self, race_number: int) -> Dict[str, str]:
-        """Get all bets for a specific race."""
+        """Get all bets for a specific race, from the active bet storage."""
         with self.get_connection() as conn:
+            if self.bet_storage == "packed":
+                packed = conn.execute("""
+                    SELECT p.horse_ids FROM packed_bets p
+                    JOIN races r ON p.race_id = r.id
+                    WHERE r.race_number = ?
+                """, (race_number,)).fetchone()
+                if not packed:
+                    return {}
+                names = dict(conn.execute("SELECT id, name FROM bettors").fetchall())
+                numbers = dict(conn.execute("SELECT id, number FROM horses").fetchall())
+                return {names[bettor_id]: numbers[horse_id]
+                        for bettor_id, horse_id in bet_pairs(packed[0]) if bettor_id in names}
+            
             cursor = conn.execute("""
-                SELECT b.name, bets.horse_number
+                SELECT b.name, h.number
                 FROM bets
                 JOIN bettors b ON bets.bettor_id = b.id
+                JOIN horses h ON bets.horse_id = h.id
                 JOIN races r ON bets.race_id = r.id
                 WHERE r.race_number = ?
             """, (race_number,))
             return {row[0]: row[1] for row in cursor.fetchall()}
     
-    # SCORING AND ANALYTICS
-    def calculate_scoreboard(self) -> List[Dict]:
-        """Calculate current scoreboard with race-by-race breakdown."""
-        with self.get_connection() as conn:
-            # Get all bettors
-            bettors = self.get_all_bettors()
-            
-            # Initialize scoreboard
-            scoreboard = []
-            
-            for bettor in bettors:
-                bettor_data = {
-                    "bettor_id": bettor["id"],
-                    "bettor_name": bettor["name"],
-                    "total_points": 0,
-                    "race_scores": {}
-                }
+    # DRAFT BET OPERATIONS
+    # Draft rows are never deleted before submission; clearing a bet stores a
+    # NULL horse so its version keeps counting up for optimistic writes.
+    def save_draft_bets(self, race_number: int, bettor_bets: Dict[str, str], operator: Optional[str] = None) -> bool:
+        """Upsert a batch of draft bets for a race, overwriting other operators' edits."""
+        try:
+            with self.get_connection() as conn:
+                bettor_ids = dict(conn.execute("SELECT name, id FROM bettors").fetchall())
+                horse_ids = self._horse_ids(conn)
+                conn.executemany("""
+                    INSERT INTO draft_bets (race_number, bettor_id, horse_id, operator)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(race_number, bettor_id) DO UPDATE
+                    SET horse_id = excluded.horse_id, operator = excluded.operator,
+                        version = version + 1, updated_at = CURRENT_TIMESTAMP
+                """, [(race_number, bettor_ids[name], self._horse_id(horse_ids, horse), operator)
+                      for name, horse in bettor_bets.items() if name in bettor_ids])
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving draft bets: {e}")
+            return False
+    
+    def save_draft_bets_versioned(self, race_number: int, bettor_bets: Dict[str, str],
+                                  expected_versions: Dict[str, int],
+                                  operator: Optional[str] = None) -> Optional[Tuple[Dict[str, int], Dict[str, Tuple[str, int]]]]:
+        """Write draft bets only where the stored version still matches.
+        
+        expected_versions maps bettor name to the version the caller last saw
+        (0 for "no draft yet"). Returns the new versions of the bets that were
+        written and the current (horse, version) of the ones that conflicted,
+        or None if the write failed.
+        """
+        saved = {}
+        conflicts = {}
+        try:
+            with self.get_connection() as conn:
+                bettor_ids = dict(conn.execute("SELECT name, id FROM bettors").fetchall())
+                horse_ids = self._horse_ids(conn)
                 
-                # Get points for each race
+                for name, horse in bettor_bets.items():
+                    bettor_id = bettor_ids.get(name)
+                    if bettor_id is None:
+                        continue
+                    horse_id = self._horse_id(horse_ids, horse)
+                    expected = expected_versions.get(name, 0)
+                    if expected == 0:
+                        cursor = conn.execute("""
+                            INSERT INTO draft_bets (race_number, bettor_id, horse_id, operator)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT(race_number, bettor_id) DO NOTHING
+                        """, (race_number, bettor_id, horse_id, operator))
+                    else:
+                        cursor = conn.execute("""
+                            UPDATE draft_bets
+                            SET horse_id = ?, operator = ?, version = version + 1,
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE race_number = ? AND bettor_id = ? AND version = ?
+                        """, (horse_id, operator, race_number, bettor_id, expected))
+                    
+                    if cursor.rowcount == 1:
+                        saved[name] = expected + 1
+                    else:
+                        row = conn.execute("""
+                            SELECT h.number, d.version FROM draft_bets d
+                            LEFT JOIN horses h ON h.id = d.horse_id
+                            WHERE d.race_number = ? AND d.bettor_id = ?
+                        """, (race_number, bettor_id)).fetchone()
+                        conflicts[name] = (row[0] or '', row[1]) if row else ('', 0)
+                
+                conn.commit()
+        except Exception as e:
+            print(f"Error saving draft bets: {e}")
+            return None
+        return saved, conflicts
+    
+    def get_draft_bets(self, race_number: int) -> Dict[str, str]:
+        """Get all draft bets for a race."""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT b.name, h.number
+                FROM draft_bets d
+                JOIN bettors b ON d.bettor_id = b.id
+                JOIN horses h ON d.horse_id = h.id
+                WHERE d.race_number = ?
+            """, (race_number,))
+            return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    def get_draft_bet_versions(self, race_number: int, since: str = "") -> Tuple[Dict[str, Tuple[str, int]], str]:
+        """Get (horse, version) for every draft row of a race, cleared ones included.
+        
+        With `since`, only rows updated at or after that time are read. Also
+        returns the latest update time seen, to pass as `since` next time.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT b.name, h.number, d.version, d.updated_at
+                FROM draft_bets d
+                JOIN bettors b ON d.bettor_id = b.id
+                LEFT JOIN horses h ON d.horse_id = h.id
+                WHERE d.race_number = ?{" AND d.updated_at >= ?" if since else ""}
+            """, (race_number, since) if since else (race_number,))
+            rows = cursor.fetchall()
+            latest = max([row[3] for row in rows if row[3]] + [since])
+            return {row[0]: (row[1] or '', row[2]) for row in rows}, latest
+    
+    def clear_draft_bets(self, race_number: int) -> bool:
+        """Delete all draft bets for a race."""
+        try:
+            with self.get_connection() as conn:
+                conn.execute("DELETE FROM draft_bets WHERE race_number = ?", (race_number,))
+                conn.commit()
+                return True
+        except Exception:
+            return False
+    
+    def submit_race_results(self, race_number: int, first: str, second: str, third: str,
+                            bettor_bets: Dict[str, str]) -> bool:
+        """Complete a race and promote its draft bets into bets in one transaction."""
+        try:
+            with self.get_connection() as conn:
+                horse_ids = self._horse_ids(conn)
+                podium = [self._horse_id(horse_ids, h) for h in (first, second, third)]
+                conn.execute("INSERT OR IGNORE INTO races (race_number) VALUES (?)", (race_number,))
                 cursor = conn.execute("""
-                    SELECT r.race_number, r.first_place_horse, r.second_place_horse, 
-                           r.third_place_horse, bets.horse_number
-                    FROM races r
-                    LEFT JOIN bets ON r.id = bets.race_id AND bets.bettor_id = ?
-                    WHERE r.completed_at IS NOT NULL
-                    ORDER BY r.race_number
-                """, (bettor["id"],))
+                    UPDATE races 
+                    SET first_horse_id = ?, second_horse_id = ?, third_horse_id = ?, 
+                        completed_at = CURRENT_TIMESTAMP
+                    WHERE race_number = ? AND completed_at IS NULL
+                """, (*podium, race_number))
+                if cursor.rowcount == 0:
+                    # Another operator submitted this race first
+                    conn.rollback()
+                    return False
                 
-                for row in cursor.fetchall():
-                    race_num, first, second, third, bet_horse = row
-                    points = 0
-                    
-                    if bet_horse:
-                        if bet_horse == first:
-                            points = 3
-                        elif bet_horse == second:
-                            points = 2
-                        elif bet_horse == third:
-                            points = 1
+                # The submitted bets are the final word - write them over the draft,
+                # and a cleared bet clears whatever the draft held for that bettor
+                bettor_ids = dict(conn.execute("SELECT name, id FROM bettors").fetchall())
+                conn.executemany("""
+                    INSERT INTO draft_bets (race_number, bettor_id, horse_id)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(race_number, bettor_id) DO UPDATE
+                    SET horse_id = excluded.horse_id, version = version + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                """, [(race_number, bettor_ids[name], self._horse_id(horse_ids, horse))
+                      for name, horse in bettor_bets.items() if name in bettor_ids])
+                
+                race_id = conn.execute("SELECT id FROM races WHERE race_number = ?", (race_number,)).fetchone()[0]
+                if self.bet_storage == "packed":
+                    drafts = conn.execute("SELECT bettor_id, horse_id FROM draft_bets WHERE race_number = ?",
+                                          (race_number,)).fetchall()
+                    self._store_bets(conn, race_id, [(bettor_id, horse_id or NO_HORSE) for bettor_id, horse_id in drafts])
+                else:
+                    # Bets written straight to the race (e.g. by the bet API) go too where the draft cleared them
+                    conn.execute("""
+                        DELETE FROM bets WHERE race_id = ? AND bettor_id IN (
+                            SELECT bettor_id FROM draft_bets WHERE race_number = ? AND horse_id IS NULL
+                        )
+                    """, (race_id, race_number))
+                    conn.execute("""
+                        INSERT OR REPLACE INTO bets (bettor_id, race_id, horse_id)
+                        SELECT d.bettor_id, r.id, d.horse_id
+                        FROM draft_bets d
+                        JOIN races r ON r.race_number = d.race_number
+                        WHERE d.race_number = ? AND d.horse_id IS NOT NULL
+                    """, (race_number,))
+                conn.execute("DELETE FROM draft_bets WHERE race_number = ?", (race_number,))
+                conn.execute("DELETE FROM race_partitions WHERE race_number = ?", (race_number,))
+                
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error submitting race {race_number}: {e}")
+            return False
+    
+    # RESULT CORRECTIONS
+    def correct_race_result(self, race_number: int, placings: Optional[Dict[str, str]] = None,
+                            bet_changes: Optional[Dict[str, str]] = None,
+                            operator: str = "", reason: str = "") -> bool:
+        """Rewrite a completed race's placings and bets and record each change in one transaction.
+        
+        placings maps 'first', 'second' and 'third' to horse numbers; bet_changes
+        maps bettor names to horse numbers, with an empty number removing the bet.
+        """
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute("""
+                    SELECT id, first_horse_id, second_horse_id, third_horse_id
+                    FROM races WHERE race_number = ? AND completed_at IS NOT NULL
+                """, (race_number,)).fetchone()
+                if row is None:
+                    raise ValueError(f"Race {race_number} has no results to correct")
+                race_id = row[0]
+                horse_ids = self._horse_ids(conn)
+                horse_numbers = {horse_id: number for number, horse_id in horse_ids.items()}
+                audit = []
+                
+                podium = [self._horse_id(horse_ids, placings[field]) if placings and field in placings else old_id
+                          for field, old_id in zip(PLACE_FIELDS, row[1:])]
+                placed = [horse_id for horse_id in podium if horse_id]
+                if podium[0] is None or len(set(placed)) < len(placed):
+                    raise ValueError("A race needs a winner and different horses in each place")
+                for field, old_id, new_id in zip(PLACE_FIELDS, row[1:], podium):
+                    if new_id != old_id:
+                        conn.execute(f"UPDATE races SET {field}_horse_id = ? WHERE id = ?", (new_id, race_id))
+                        audit.append((field, None, horse_numbers.get(old_id), horse_numbers.get(new_id)))
+                
+                if bet_changes:
+                    bettor_ids = dict(conn.execute("SELECT name, id FROM bettors").fetchall())
+                    unknown = [name for name in bet_changes if name not in bettor_ids]
+                    if unknown:
+                        raise ValueError(f"Unknown bettor: {unknown[0]}")
+                    current = self._race_horse_ids(conn, race_id)
+                    changes = []
+                    for name, horse in bet_changes.items():
+                        bettor_id = bettor_ids[name]
+                        new_id = self._horse_id(horse_ids, horse)
+                        old_id = current.get(bettor_id)
+                        if new_id != old_id:
+                            changes.append((bettor_id, new_id))
+                            audit.append(("bet", name, horse_numbers.get(old_id), horse_numbers.get(new_id)))
                     
-                    bettor_data["race_scores"][f"Race {race_num}"] = points
-                    bettor_data["total_points"] += points
+                    if self.bet_storage == "packed":
+                        self._store_bets(conn, race_id, [(bettor_id, horse_id or NO_HORSE)
+                                                         for bettor_id, horse_id in changes])
+                    else:
+                        self._store_bets(conn, race_id, [change for change in changes if change[1]])
+                        conn.executemany("DELETE FROM bets WHERE bettor_id = ? AND race_id = ?",
+                                         [(bettor_id, race_id) for bettor_id, horse_id in changes if not horse_id])
                 
-                scoreboard.append(bettor_data)
-            
-            # Sort by total points (descending)
-            scoreboard.sort(key=lambda x: x["total_points"], reverse=True)
-            
-            # Add ranks
-            for i, bettor in enumerate(scoreboard):
-                bettor["rank"] = i + 1
-            
-            return scoreboard
+                conn.executemany("""
+                    INSERT INTO result_corrections
+                    (race_number, field, bettor_name, old_value, new_value, operator, reason)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [(race_number, *change, operator, reason) for change in audit])
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error correcting race {race_number}: {e}")
+            return False
+    
+    def _race_horse_ids(self, conn, race_id: int) -> Dict[int, int]:
+        """Bettor id to horse id for a race's bets, in the current storage mode."""
+        if self.bet_storage == "packed":
+            row = conn.execute("SELECT horse_ids FROM packed_bets WHERE race_id = ?", (race_id,)).fetchone()
+            return dict(bet_pairs(row[0])) if row else {}
+        return dict(conn.execute("SELECT bettor_id, horse_id FROM bets WHERE race_id = ?", (race_id,)).fetchall())
+    
+    def get_result_corrections(self, race_number: Optional[int] = None) -> List[Dict]:
+        """Get the correction audit trail, newest first, for one race or all."""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT race_number, field, bettor_name, old_value, new_value, operator, reason, corrected_at
+                FROM result_corrections
+                WHERE ? IS NULL OR race_number = ?
+                ORDER BY id DESC
+            """, (race_number, race_number))
+            return [{
+                "race_number": row[0],
+                "field": row[1],
+                "bettor_name": row[2],
+                "old_value": row[3],
+                "new_value": row[4],
+                "operator": row[5],
+                "reason": row[6],
+                "corrected_at": row[7]
+            } for row in cursor.fetchall()]
+    
+    # MULTI-OPERATOR ENTRY
+    def set_bettor_partitions(self, assignments: Dict[str, str]) -> bool:
+        """Replace the explicit bettor-to-partition assignments."""
+        try:
+            with self.get_connection() as conn:
+                bettor_ids = dict(conn.execute("SELECT name, id FROM bettors").fetchall())
+                conn.execute("DELETE FROM bettor_partitions")
+                conn.executemany(
+                    "INSERT INTO bettor_partitions (bettor_id, partition) VALUES (?, ?)",
+                    [(bettor_ids[name], partition) for name, partition in assignments.items()
+                     if name in bettor_ids and partition]
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving bettor partitions: {e}")
+            return False
+    
+    def get_bettor_partitions(self) -> Dict[str, str]:
+        """Get the explicit bettor-to-partition assignments."""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT b.name, p.partition
+                FROM bettor_partitions p
+                JOIN bettors b ON p.bettor_id = b.id
+            """)
+            return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    def claim_partition(self, race_number: int, partition: str, operator: str) -> bool:
+        """Record which operator is entering a partition for a race."""
+        try:
+            with self.get_connection() as conn:
+                conn.execute("""
+                    INSERT INTO race_partitions (race_number, partition, operator)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(race_number, partition) DO UPDATE
+                    SET operator = excluded.operator, version = version + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE operator IS NOT excluded.operator
+                """, (race_number, partition, operator))
+                conn.commit()
+                return True
+        except Exception:
+            return False
+    
+    def set_partition_complete(self, race_number: int, partition: str, complete: bool,
+                               expected_version: int) -> bool:
+        """Mark a partition complete (or reopen it) if nobody changed it since it was read."""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute("""
+                    UPDATE race_partitions
+                    SET completed_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END,
+                        version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE race_number = ? AND partition = ? AND version = ?
+                """, (complete, race_number, partition, expected_version))
+                conn.commit()
+                return cursor.rowcount == 1
+        except Exception:
+            return False
+    
+    def get_partition_status(self, race_number: int) -> Dict[str, Dict]:
+        """Get operator, completion and version for each claimed partition of a race."""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT partition, operator, completed_at, version
+                FROM race_partitions WHERE race_number = ?
+            """, (race_number,))
+            return {row[0]: {
+                "operator": row[1],
+                "completed_at": row[2],
+                "is_completed": row[2] is not None,
+                "version": row[3]
+            } for row in cursor.fetchall()}
+    
+    # BET STORAGE
+    def _store_bets(self, conn, race_id: int, bets: List[Tuple[int, int]]):
+        """Write (bettor_id, horse_id) bets for a race in the current storage mode."""
+        if self.bet_storage == "packed":
+            row = conn.execute("SELECT horse_ids FROM packed_bets WHERE race_id = ?", (race_id,)).fetchone()
+            conn.execute("""
+                INSERT OR REPLACE INTO packed_bets (race_id, horse_ids, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            """, (race_id, pack(bets, row[0] if row else None)))
+        else:
+            conn.executemany("""
+                INSERT OR REPLACE INTO bets (bettor_id, race_id, horse_id) 
+                VALUES (?, ?, ?)
+            """, [(bettor_id, race_id, horse_id) for bettor_id, horse_id in bets])
+    
+    def set_bet_storage(self, mode: str) -> bool:
+        """Switch between bet rows and packed blobs, converting every stored bet."""
+        if mode not in BET_STORAGE_MODES:
+            print(f"Unknown bet storage mode: {mode}")
+            return False
+        try:
+            with self.get_connection() as conn:
+                if mode == "packed":
+                    # Export rows into each race's blob
+                    race_ids = [row[0] for row in conn.execute("SELECT DISTINCT race_id FROM bets")]
+                    for race_id in race_ids:
+                        bets = conn.execute("SELECT bettor_id, horse_id FROM bets WHERE race_id = ?",
+                                            (race_id,)).fetchall()
+                        row = conn.execute("SELECT horse_ids FROM packed_bets WHERE race_id = ?",
+                                           (race_id,)).fetchone()
+                        conn.execute("INSERT OR REPLACE INTO packed_bets (race_id, horse_ids) VALUES (?, ?)",
+                                     (race_id, pack(bets, row[0] if row else None)))
+                    conn.execute("DELETE FROM bets")
+                else:
+                    # Import blobs back into rows
+                    for race_id, blob in conn.execute("SELECT race_id, horse_ids FROM packed_bets").fetchall():
+                        conn.executemany("""
+                            INSERT OR REPLACE INTO bets (bettor_id, race_id, horse_id)
+                            SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM bettors WHERE id = ?)
+                        """, [(bettor_id, race_id, horse_id, bettor_id)
+                              for bettor_id, horse_id in bet_pairs(blob)])
+                    conn.execute("DELETE FROM packed_bets")
+                conn.execute("""
+                    INSERT OR REPLACE INTO settings (key, value, updated_at)
+                    VALUES ('bet_storage', ?, CURRENT_TIMESTAMP)
+                """, (mode,))
+                conn.commit()
+            self.bet_storage = mode
+            return True
+        except Exception as e:
+            print(f"Error switching bet storage to {mode}: {e}")
+            return False
+    
+    def get_bet_storage_stats(self) -> Dict:
+        """Count bet rows and packed races and their size in bytes."""
+        with self.get_connection() as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM bets").fetchone()[0]
+            packed_races, packed_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(horse_ids)), 0) FROM packed_bets"
+            ).fetchone()
+            return {"mode": self.bet_storage, "bet_rows": rows,
+                    "packed_races": packed_races, "packed_bytes": packed_bytes}
+    
+    # SCORING RULES
+    def get_scoring_rules(self) -> Dict:
+        """The event's scoring rule set (see scoring_rules.py)."""
+        return parse_rules(self.get_setting('scoring_rules'))
+    
+    def set_scoring_rules(self, rules: Dict) -> bool:
+        """Validate and save the event's scoring rule set."""
+        try:
+            return self.set_setting('scoring_rules', rules_to_json(rules))
+        except (ValueError, TypeError) as e:
+            print(f"Error saving scoring rules: {e}")
+            return False
+    
+    # SCORING AND ANALYTICS
+    def get_scoring_data(self) -> Dict:
+        """Get bettors, horses, completed podiums and bets keyed by integer ids.
+        
+        Bets come from the active bet storage only, so rows or blobs left
+        behind by the other mode are never laid over them.
+        """
+        packed = self.bet_storage == "packed"
+        with self.get_connection() as conn:
+            total_races = conn.execute("SELECT value FROM settings WHERE key = 'total_races'").fetchone()
+            scoring_rules = conn.execute("SELECT value FROM settings WHERE key = 'scoring_rules'").fetchone()
+            return {
+                "bettors": conn.execute("SELECT id, name FROM bettors ORDER BY name").fetchall(),
+                "horses": conn.execute("SELECT id, number FROM horses ORDER BY sort_key, number").fetchall(),
+                # A missing placing is -1, which the bet matrix treats as no horse
+                "races": conn.execute("""
+                    SELECT race_number, COALESCE(first_horse_id, -1), COALESCE(second_horse_id, -1),
+                           COALESCE(third_horse_id, -1)
+                    FROM races WHERE completed_at IS NOT NULL
+                """).fetchall(),
+                "bets": [] if packed else conn.execute("""
+                    SELECT bets.bettor_id, r.race_number, bets.horse_id
+                    FROM bets JOIN races r ON bets.race_id = r.id
+                """).fetchall(),
+                "packed_bets": conn.execute("""
+                    SELECT r.race_number, p.horse_ids
+                    FROM packed_bets p JOIN races r ON p.race_id = r.id
+                """).fetchall() if packed else [],
+                "total_races": int(total_races[0]) if total_races else 0,
+                "scoring_rules": scoring_rules[0] if scoring_rules else ""
+            }
+    
+    def calculate_scoreboard(self) -> List[Dict]:
+        """Calculate current scoreboard with race-by-race breakdown."""
+        matrix = build_bet_matrix(self.get_scoring_data())
+        points = matrix.points()
+        totals = matrix.totals()
+        completed = np.flatnonzero(matrix.completed)
+        race_labels = [f"Race {race_num}" for race_num in matrix.race_numbers[completed].tolist()]
+        
+        scoreboard = []
+        for rank, bettor in enumerate(matrix.ranking().tolist(), start=1):
+            scoreboard.append({
+                "bettor_id": int(matrix.bettor_ids[bettor]),
+                "bettor_name": matrix.bettor_names[bettor],
+                "total_points": int(totals[bettor]),
+                "race_scores": dict(zip(race_labels, points[bettor, completed].tolist())),
+                "rank": rank
+            })
+        return scoreboard
     
     # SETTINGS
     def set_setting(self, key: str, value: str) -> bool:
@@ -343,6 +1105,30 @@ class DerbyDatabase:
             row = cursor.fetchone()
             return row[0] if row else default
     
+    # PERFORMANCE PROFILES
+    def set_performance_profile(self, name: str) -> bool:
+        """Switch to a named performance profile and set its journal mode."""
+        if name not in PERFORMANCE_PROFILES:
+            print(f"Unknown SQLite performance profile: {name}")
+            return False
+        self._use_profile(name)
+        try:
+            journal_mode = PERFORMANCE_PROFILES[name]['journal_mode']
+            with self.get_connection() as conn:
+                result = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+            if result.upper() != journal_mode:
+                # Leaving WAL needs every other connection closed
+                print(f"Journal mode is still {result}; it changes once other connections close")
+            return True
+        except Exception as e:
+            print(f"Error setting journal mode: {e}")
+            return False
+    
+    def get_journal_mode(self) -> str:
+        """The journal mode the database file is using."""
+        with self.get_connection() as conn:
+            return conn.execute("PRAGMA journal_mode").fetchone()[0]
+    
     # MIGRATION FROM JSON
     def migrate_from_json(self, json_file: str = "derby_data.json") -> bool:
         """Migrate existing JSON data to database."""
@@ -425,11 +1211,17 @@ class DerbyDatabase:
         try:
             with self.get_connection() as conn:
                 # Delete in correct order to respect foreign keys
+                conn.execute("DELETE FROM result_corrections")
+                conn.execute("DELETE FROM race_partitions")
+                conn.execute("DELETE FROM bettor_partitions")
+                conn.execute("DELETE FROM draft_bets")
                 conn.execute("DELETE FROM bets")
+                conn.execute("DELETE FROM packed_bets")
                 conn.execute("DELETE FROM races")
                 conn.execute("DELETE FROM bettors")
                 conn.execute("DELETE FROM horses")
-                conn.execute("DELETE FROM settings")
+                # How the database is stored and tuned is not event data
+                conn.execute("DELETE FROM settings WHERE key NOT IN ('bet_storage', 'sqlite_profile')")
                 conn.commit()
                 return True
         except Exception:
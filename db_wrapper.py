@@ -5,18 +5,43 @@ This module provides a seamless interface between the database and Streamlit,
 maintaining backward compatibility while using the database for persistence.
 """
 
+import threading
+import time
 import streamlit as st
+import bet_api
+import metrics
+import profiling
+import query_trace
 from typing import List, Dict, Optional
 from database import DerbyDatabase
+from bet_matrix import Standings, StandingsHistory, load_bet_matrix
+from partitioning import build_partitions
+from precompute import PrecomputeWorker
+from write_queue import BetWriteQueue
+from scoring_rules import NO_BET, PLACE_FIELDS
+from scoreboard_snapshot import default_snapshot_path, get_snapshot
+
+# Draft bets are buffered in session state and written in batches: after
+# DRAFT_FLUSH_SECONDS since the first unsaved edit, or once DRAFT_BATCH_SIZE
+# edits are pending, whichever comes first.
+DRAFT_FLUSH_SECONDS = 2.0
+DRAFT_BATCH_SIZE = 200
 
 class StreamlitDatabaseWrapper:
     """Wrapper that integrates database with Streamlit session state."""
     
-    def __init__(self):
-        """Initialize the database wrapper."""
-        if 'db' not in st.session_state:
+    def __init__(self, db: Optional[DerbyDatabase] = None):
+        """Initialize the database wrapper, optionally around an existing database."""
+        if db is not None:
+            st.session_state.db = db
+        elif 'db' not in st.session_state:
             st.session_state.db = DerbyDatabase()
         self.db = st.session_state.db
+        self.snapshot_path = default_snapshot_path(self.db.db_path)
+        self.standings_history = StandingsHistory()
+        self.precompute = PrecomputeWorker(self.db, self.standings_history, self.snapshot_path)
+        self._write_queues: Dict[tuple, BetWriteQueue] = {}
+        self._write_queues_lock = threading.Lock()
     
     # INITIALIZATION AND LOADING
     def load_state_from_database(self):
@@ -30,12 +55,12 @@ class StreamlitDatabaseWrapper:
             self.setup_horses_bulk(8)
             self.db.set_setting('auto_setup_done', 'True')
         
-        # Load horses
-        st.session_state.horses = self.db.get_all_horses()
+        # Every bet and result as integer arrays, already scored by the precompute worker
+        matrix = self.current_matrix()
+        st.session_state.bet_matrix = matrix
         
-        # Load bettors (convert to old format for compatibility)
-        bettors_from_db = self.db.get_all_bettors()
-        st.session_state.bettors = [{"name": b["name"]} for b in bettors_from_db]
+        # Load horses
+        st.session_state.horses = list(matrix.horse_numbers)
         
         # Load settings
         st.session_state.current_race = int(self.db.get_setting('current_race', '1'))
@@ -45,40 +70,48 @@ class StreamlitDatabaseWrapper:
         st.session_state.target_bettor_count = int(self.db.get_setting('target_bettor_count', '0'))
         st.session_state.total_races = int(self.db.get_setting('total_races', '10'))
         
-        # Load races (convert to old format)
-        races_from_db = self.db.get_all_races()
+        # Load race placings; bets and scores stay in the matrix, by bettor row
         st.session_state.races = []
-        
-        for race in races_from_db:
-            race_data = {
-                'race_number': race['race_number'],
-                'bettors': st.session_state.bettors.copy()
-            }
-            
+        for race in self.db.get_all_races():
+            race_data = {'race_number': race['race_number']}
             if race['is_completed']:
-                # Get bets for this race
-                race_bets = self.db.get_race_bets(race['race_number'])
-                
                 race_data['results'] = {
                     'first': race['first'],
                     'second': race['second'],
                     'third': race['third'],
-                    'timestamp': race['completed_at'],
-                    'bettor_bets': race_bets
+                    'timestamp': race['completed_at']
                 }
-            
             st.session_state.races.append(race_data)
-        
-        # Calculate scores (for backward compatibility)
-        self.calculate_scores_from_database()
     
-    def calculate_scores_from_database(self):
-        """Calculate scores from database and store in session state."""
-        scoreboard = self.db.calculate_scoreboard()
-        st.session_state.scores = {}
-        
-        for bettor_data in scoreboard:
-            st.session_state.scores[bettor_data['bettor_name']] = bettor_data['total_points']
+    def current_matrix(self):
+        """The precomputed bet matrix including every committed write, loaded here if the worker lags."""
+        published = self.precompute.current()
+        return published.matrix if published is not None else load_bet_matrix(self.db)
+    
+    def refresh_bet_matrix(self):
+        """Reload the bet matrix after bettors, horses or results change."""
+        self.precompute.notify()
+        st.session_state.bet_matrix = self.current_matrix()
+    
+    def get_standings(self):
+        """Standings after every completed race, extended with any newly completed races."""
+        return self.standings_history.update(st.session_state.bet_matrix)
+    
+    # SCOREBOARD SNAPSHOTS
+    def publish_scoreboard_snapshot(self) -> bool:
+        """Bring the snapshot public scoreboard sessions map up to date with every committed write."""
+        try:
+            return self.precompute.current() is not None
+        except Exception as e:
+            print(f"Error writing scoreboard snapshot: {e}")
+            return False
+    
+    def get_scoreboard_snapshot(self):
+        """The latest scoreboard snapshot, written first if there is none."""
+        snapshot = get_snapshot(self.snapshot_path)
+        if snapshot is None and self.publish_scoreboard_snapshot():
+            snapshot = get_snapshot(self.snapshot_path)
+        return snapshot
     
     # HORSE OPERATIONS
     def setup_horses_bulk(self, horse_count: int) -> bool:
@@ -116,8 +149,7 @@ class StreamlitDatabaseWrapper:
         """Add a bettor."""
         bettor_id = self.db.add_bettor(name)
         if bettor_id:
-            st.session_state.bettors.append({"name": name})
-            st.session_state.scores[name] = 0
+            self.refresh_bet_matrix()
             return True
         return False
     
@@ -127,10 +159,7 @@ class StreamlitDatabaseWrapper:
         if bettor:
             success = self.db.remove_bettor(bettor['id'])
             if success:
-                # Update session state
-                st.session_state.bettors = [b for b in st.session_state.bettors if b['name'] != name]
-                if name in st.session_state.scores:
-                    del st.session_state.scores[name]
+                self.refresh_bet_matrix()
                 return True
         return False
     
@@ -144,31 +173,212 @@ class StreamlitDatabaseWrapper:
         self.db.set_setting('bettors_setup_complete', 'True')
         st.session_state.bettors_setup_complete = True
     
+    # DRAFT BET OPERATIONS
+    def get_operator_name(self) -> str:
+        """Name recorded against this session's draft writes."""
+        return st.session_state.get('operator_name') or st.session_state.get('username') or 'admin'
+    
+    def load_draft_bets(self, race_number: int) -> Dict[str, str]:
+        """Load the saved draft bets for a race, including edits not yet flushed."""
+        stored, latest = self.db.get_draft_bet_versions(race_number)
+        
+        # Remember the versions we read so our writes can detect other operators' edits
+        if 'draft_versions' not in st.session_state:
+            st.session_state.draft_versions = {}
+        st.session_state.draft_versions[race_number] = {name: version for name, (_, version) in stored.items()}
+        if 'draft_seen_at' not in st.session_state:
+            st.session_state.draft_seen_at = {}
+        st.session_state.draft_seen_at[race_number] = latest
+        
+        draft = {name: horse for name, (horse, _) in stored.items()}
+        draft.update(st.session_state.get('pending_draft_bets', {}).get(race_number, {}))
+        return {name: horse for name, horse in draft.items() if horse}
+    
+    def queue_draft_bets(self, race_number: int, bettor_bets: Dict[str, str], flush_now: bool = False):
+        """Buffer changed draft bets and flush them once the debounce window allows."""
+        if 'pending_draft_bets' not in st.session_state:
+            st.session_state.pending_draft_bets = {}
+        pending = st.session_state.pending_draft_bets
+        if not pending:
+            st.session_state.pending_draft_since = time.monotonic()
+        pending.setdefault(race_number, {}).update(bettor_bets)
+        
+        self.flush_draft_bets(force=flush_now)
+    
+    def flush_draft_bets(self, force: bool = False) -> bool:
+        """Write buffered draft bets to the database as one batch per race.
+        
+        Writes are optimistic: a bet another operator changed since we read it
+        is not overwritten but recorded in draft_conflicts with its current value.
+        """
+        pending = st.session_state.get('pending_draft_bets')
+        if not pending:
+            return True
+        
+        pending_count = sum(len(bets) for bets in pending.values())
+        waited = time.monotonic() - st.session_state.get('pending_draft_since', 0)
+        if not force and pending_count < DRAFT_BATCH_SIZE and waited < DRAFT_FLUSH_SECONDS:
+            return True
+        
+        if 'draft_versions' not in st.session_state:
+            st.session_state.draft_versions = {}
+        if 'draft_conflicts' not in st.session_state:
+            st.session_state.draft_conflicts = {}
+        
+        for race_number in list(pending):
+            versions = st.session_state.draft_versions.setdefault(race_number, {})
+            result = self.db.save_draft_bets_versioned(
+                race_number, pending[race_number], versions, self.get_operator_name()
+            )
+            if result is None:
+                return False  # Keep the rest buffered and retry on the next flush
+            
+            saved, conflicts = result
+            versions.update(saved)
+            for name, (horse, version) in conflicts.items():
+                versions[name] = version
+                st.session_state.draft_conflicts.setdefault(race_number, {})[name] = horse
+            del pending[race_number]
+        return True
+    
+    def pull_draft_changes(self, race_number: int) -> int:
+        """Pick up draft bets other operators or the bet API saved since we loaded the race.
+        
+        They are recorded in draft_conflicts, so the bet grid takes them over
+        like any other operator's edit. Bets this session has not flushed yet
+        are left to the version check on flush. Returns how many were found.
+        """
+        seen = st.session_state.get('draft_seen_at', {}).get(race_number)
+        if seen is None:
+            return 0  # The race's drafts have not been loaded
+        
+        changes, latest = self.db.get_draft_bet_versions(race_number, seen)
+        st.session_state.draft_seen_at[race_number] = latest
+        versions = st.session_state.draft_versions.setdefault(race_number, {})
+        pending = st.session_state.get('pending_draft_bets', {}).get(race_number, {})
+        newer = {}
+        for name, (horse, version) in changes.items():
+            if version > versions.get(name, 0) and name not in pending:
+                versions[name] = version
+                newer[name] = horse
+        if newer:
+            if 'draft_conflicts' not in st.session_state:
+                st.session_state.draft_conflicts = {}
+            st.session_state.draft_conflicts.setdefault(race_number, {}).update(newer)
+        return len(newer)
+    
+    def get_saved_draft_bets(self, race_number: int) -> Dict[str, str]:
+        """Get the draft bets every operator has saved for a race."""
+        return self.db.get_draft_bets(race_number)
+    
+    def take_draft_conflicts(self, race_number: int) -> Dict[str, str]:
+        """Return and forget the bets another operator changed under us for a race."""
+        return st.session_state.get('draft_conflicts', {}).pop(race_number, {})
+    
+    # MULTI-OPERATOR ENTRY
+    def get_partition_config(self) -> Dict:
+        """Get how the bettor list is split between operators."""
+        return {
+            'mode': self.db.get_setting('partition_mode', 'none'),
+            'count': int(self.db.get_setting('partition_count', '2')),
+            'page_size': int(self.db.get_setting('partition_page_size', '100'))
+        }
+    
+    def set_partition_config(self, mode: str, count: int, page_size: int):
+        """Set how the bettor list is split between operators."""
+        self.db.set_setting('partition_mode', mode)
+        self.db.set_setting('partition_count', str(count))
+        self.db.set_setting('partition_page_size', str(page_size))
+    
+    def set_bettor_partitions(self, assignments: Dict[str, str]) -> bool:
+        """Save explicit bettor-to-partition assignments."""
+        return self.db.set_bettor_partitions(assignments)
+    
+    def get_partitions(self) -> Dict[str, List[str]]:
+        """Get the current partitions of the bettor list."""
+        config = self.get_partition_config()
+        names = st.session_state.bet_matrix.bettor_names
+        assignments = self.db.get_bettor_partitions() if config['mode'] == 'explicit' else None
+        return build_partitions(names, config['mode'], config['count'], config['page_size'], assignments)
+    
+    def claim_partition(self, race_number: int, partition: str) -> bool:
+        """Record this operator as entering a partition."""
+        return self.db.claim_partition(race_number, partition, self.get_operator_name())
+    
+    def set_partition_complete(self, race_number: int, partition: str, complete: bool, expected_version: int) -> bool:
+        """Mark a partition complete or reopen it (fails if someone else changed it first)."""
+        return self.db.set_partition_complete(race_number, partition, complete, expected_version)
+    
+    def get_partition_status(self, race_number: int) -> Dict[str, Dict]:
+        """Get claim and completion status for each partition of a race."""
+        return self.db.get_partition_status(race_number)
+    
     # RACE OPERATIONS
     def submit_race_results(self, race_number: int, first: str, second: str, third: str, bettor_bets: Dict[str, str]) -> bool:
         """Submit complete race results."""
-        # Create race if it doesn't exist
-        race = self.db.get_race_by_number(race_number)
-        if not race:
-            race_id = self.db.create_race(race_number)
-            if not race_id:
-                return False
+        start = time.perf_counter()
         
-        # Complete the race
-        success = self.db.complete_race(race_number, first, second, third)
-        if not success:
-            return False
+        # Get every buffered edit into the draft before it is promoted
+        self.flush_draft_bets(force=True)
         
-        # Add all bets
-        success = self.db.add_bets_bulk(race_number, bettor_bets)
+        # Results, bets and draft promotion commit together
+        success = self.db.submit_race_results(race_number, first, second, third, bettor_bets)
+        metrics.observe_race_submission(time.perf_counter() - start, success)
         if not success:
             return False
         
-        # Update session state
+        # The worker rescores and republishes the public scoreboard; session state waits for it
+        self.precompute.notify()
         self.load_state_from_database()
         
         return True
     
+    def preview_race_results(self, race_number: int, first: str, second: str, third: str,
+                             bettor_bets: Dict[str, str]) -> Optional[Standings]:
+        """Standings as if a race were submitted with these results and bets, without saving anything."""
+        matrix = st.session_state.bet_matrix
+        race_index = matrix.race_index(race_number)
+        if race_index is None:
+            return None
+        
+        # Earlier races come from the kept standings; only this race is scored and ranked
+        self.standings_history.update(matrix)
+        preview = matrix.with_race_changes(race_index, {'first': first, 'second': second, 'third': third}, bettor_bets)
+        return self.standings_history.preview(preview)
+    
+    def correct_race_result(self, race_number: int, placings: Dict[str, str], bet_changes: Dict[str, str],
+                            reason: str = "") -> bool:
+        """Correct a completed race and rescore only that race."""
+        if not self.db.correct_race_result(race_number, placings, bet_changes, self.get_operator_name(), reason):
+            return False
+        
+        # Apply the same change to the matrix; its points are rescored for this race's columns only
+        race_index = st.session_state.bet_matrix.race_index(race_number)
+        matrix = st.session_state.bet_matrix.with_race_changes(race_index, placings, bet_changes)
+        
+        # Swapping the matrix drops everything cached on the old one in one step
+        st.session_state.bet_matrix = matrix
+        for race in st.session_state.races:
+            if race['race_number'] == race_number and 'results' in race:
+                race['results'].update({field: matrix.horse_numbers[horse] if horse != NO_BET else None
+                                        for field, horse in zip(PLACE_FIELDS, matrix.podium[race_index].tolist())})
+        
+        # The worker republishes the snapshot; viewers remap it on their next rerun
+        self.precompute.notify()
+        return True
+    
+    def get_result_corrections(self, race_number: Optional[int] = None) -> List[Dict]:
+        """Get the correction audit trail, newest first."""
+        return self.db.get_result_corrections(race_number)
+    
+    def bet_write_queue(self, draft: bool = False, operator: Optional[str] = None) -> BetWriteQueue:
+        """The shared group-commit queue for bets, or for one operator's draft bets, started on first use."""
+        with self._write_queues_lock:
+            key = (draft, operator)
+            if key not in self._write_queues:
+                self._write_queues[key] = BetWriteQueue(self.db, draft, operator, on_commit=self.precompute.notify)
+            return self._write_queues[key]
+    
     def advance_to_next_race(self):
         """Move to the next race."""
         new_race_number = st.session_state.current_race + 1
@@ -179,6 +389,7 @@ class StreamlitDatabaseWrapper:
         """Set the total number of races."""
         self.db.set_setting('total_races', str(total_races))
         st.session_state.total_races = total_races
+        self.refresh_bet_matrix()
     
     def get_total_races(self) -> int:
         """Get the total number of races."""
@@ -191,21 +402,21 @@ class StreamlitDatabaseWrapper:
         if success:
             # Reset session state
             st.session_state.horses = []
-            st.session_state.bettors = []
             st.session_state.races = []
             st.session_state.current_race = 1
-            st.session_state.scores = {}
             st.session_state.setup_complete = False
             st.session_state.target_horse_count = 0
             st.session_state.bettors_setup_complete = False
             st.session_state.target_bettor_count = 0
             st.session_state.total_races = 10
+            st.session_state.pending_draft_bets = {}
+            self.refresh_bet_matrix()
         return success
     
     def reset_horses_only(self):
         """Reset only horses."""
         # Check if bettors exist
-        if st.session_state.bettors:
+        if st.session_state.bet_matrix.bettor_names:
             return False, "Cannot reset horses while bettors exist"
         
         # Delete all horses
@@ -221,6 +432,7 @@ class StreamlitDatabaseWrapper:
         st.session_state.horses = []
         st.session_state.setup_complete = False
         st.session_state.target_horse_count = 0
+        self.refresh_bet_matrix()
         
         return True, "Horses reset successfully"
     
@@ -241,10 +453,9 @@ class StreamlitDatabaseWrapper:
         self.db.set_setting('target_bettor_count', '0')
         
         # Update session state
-        st.session_state.bettors = []
         st.session_state.bettors_setup_complete = False
         st.session_state.target_bettor_count = 0
-        st.session_state.scores = {}
+        self.refresh_bet_matrix()
         
         return True, "Bettors reset successfully"
     
@@ -254,11 +465,21 @@ class StreamlitDatabaseWrapper:
     
     def export_data(self) -> Dict:
         """Export data in the old JSON format for compatibility."""
+        # The old format is keyed by name, so names are attached to the matrix rows here
+        matrix = st.session_state.bet_matrix
+        bettors = [{"name": name} for name in matrix.bettor_names]
+        races = []
+        for race in st.session_state.races:
+            race_data = {'race_number': race['race_number'], 'bettors': bettors}
+            if 'results' in race:
+                race_data['results'] = dict(race['results'],
+                                            bettor_bets=matrix.race_bets(matrix.race_index(race['race_number'])))
+            races.append(race_data)
         return {
             'horses': self.db.get_all_horses(),
-            'bettors': [{"name": b["name"]} for b in self.db.get_all_bettors()],
-            'races': st.session_state.races,  # Use session state for compatibility
-            'scores': st.session_state.scores,
+            'bettors': bettors,
+            'races': races,
+            'scores': dict(zip(matrix.bettor_names, matrix.totals().tolist())),
             'current_race': st.session_state.current_race,
             'setup_complete': st.session_state.setup_complete,
             'target_horse_count': st.session_state.target_horse_count,
@@ -270,14 +491,71 @@ class StreamlitDatabaseWrapper:
     def get_stats(self) -> Dict:
         """Get system statistics."""
         return self.db.get_stats()
+    
+    # DATABASE PERFORMANCE
+    def set_sqlite_profile(self, name: str) -> bool:
+        """Switch the SQLite performance profile and remember the choice."""
+        # Leaving WAL needs the worker's connection closed too
+        self.precompute.close()
+        if not self.db.set_performance_profile(name):
+            return False
+        return self.db.set_setting('sqlite_profile', name)
+    
+    def set_bet_storage(self, mode: str) -> bool:
+        """Convert stored bets to rows or packed blobs."""
+        if not self.db.set_bet_storage(mode):
+            return False
+        self.refresh_bet_matrix()
+        return True
+    
+    def set_scoring_rules(self, rules: Dict) -> bool:
+        """Save new scoring rules and rescore the whole event once."""
+        if not self.db.set_scoring_rules(rules):
+            return False
+        self.refresh_bet_matrix()
+        return True
+    
+    # PROFILING
+    def set_profiling_enabled(self, enabled: bool):
+        """Switch rerun profiling on or off and remember the choice."""
+        self.db.set_setting('profiling_enabled', str(enabled))
+        profiling.set_enabled(enabled)
+    
+    def set_query_tracing(self, enabled: bool, slow_query_ms: float):
+        """Switch SQL tracing on or off, set the slow query threshold and remember both."""
+        self.db.set_setting('query_trace_enabled', str(enabled))
+        self.db.set_setting('slow_query_ms', str(slow_query_ms))
+        query_trace.set_enabled(enabled)
+        query_trace.set_slow_query_ms(slow_query_ms)
 
 # Global instance
 @st.cache_resource
 def get_db_wrapper():
     """Get a cached database wrapper instance."""
-    return StreamlitDatabaseWrapper()
+    wrapper = StreamlitDatabaseWrapper()
+    metrics_location = metrics.start_exporter()
+    if metrics_location:
+        print(f"📈 Metrics published at {metrics_location}")
+    if wrapper.db.get_setting('profiling_enabled', 'False') == 'True':
+        profiling.set_enabled(True)
+    if wrapper.db.get_setting('query_trace_enabled', 'False') == 'True':
+        query_trace.set_enabled(True)
+    slow_query_ms = wrapper.db.get_setting('slow_query_ms')
+    if slow_query_ms:
+        query_trace.set_slow_query_ms(float(slow_query_ms))
+    # The database may have changed while the server was down; the worker builds at once
+    wrapper.precompute.start()
+    api_location = bet_api.start_api(wrapper)
+    if api_location:
+        print(f"📱 Bet API listening at {api_location}")
+    return wrapper
 
 def initialize_app():
-    """Initialize the app by loading data from database."""
+    """Initialize the app by loading data from database.
+    
+    Public scoreboard sessions read the scoreboard snapshot instead.
+    """
     db_wrapper = get_db_wrapper()
-    db_wrapper.load_state_from_database() 
\ No newline at end of file
+    if st.session_state.get('user_role') == "viewer":
+        return
+    db_wrapper.load_state_from_database()
\ No newline at end of file
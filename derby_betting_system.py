@@ -1,9 +1,24 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import json
 import os
-from db_wrapper import get_db_wrapper, initialize_app
+import metrics
+import profiling
+import query_trace
+from db_wrapper import get_db_wrapper, initialize_app, DRAFT_FLUSH_SECONDS
+from database import PERFORMANCE_PROFILES
+from packed_bets import BET_STORAGE_MODES
+from partitioning import PARTITION_MODES, partition_label
+from scoring_rules import NO_BET, PRESET_RULES, describe_rules
+from clinch import build_outlook, matrix_outlook, remaining_races
+from simulation import ODDS_MODES, simulate_standings
+from race_analytics import race_analytics
+from bettor_stats import bettor_stats
+from bet_import import parse_paste_bets, parse_csv_bets, validate_bets, accepted_bets, REPORT_CATEGORIES
+
+profiling.start_rerun("Full rerun")
 
 # Page configuration
 st.set_page_config(
@@ -18,18 +33,15 @@ initialize_app()
 
 # Get database wrapper instance
 db = get_db_wrapper()
+profiling.checkpoint("initialize_app")
 
 # Initialize session state variables (for UI compatibility)
 if 'horses' not in st.session_state:
     st.session_state.horses = []
-if 'bettors' not in st.session_state:
-    st.session_state.bettors = []
 if 'races' not in st.session_state:
     st.session_state.races = []
 if 'current_race' not in st.session_state:
     st.session_state.current_race = 1
-if 'scores' not in st.session_state:
-    st.session_state.scores = {}
 if 'setup_complete' not in st.session_state:
     st.session_state.setup_complete = False
 if 'target_horse_count' not in st.session_state:
@@ -46,6 +58,10 @@ if 'user_role' not in st.session_state:
     st.session_state.user_role = None
 if 'total_races' not in st.session_state:
     st.session_state.total_races = 10
+profiling.checkpoint("session_state_init")
+
+# How often the multi-operator progress view polls the database
+PARTITION_PROGRESS_SECONDS = 5
 
 # Hardcoded credentials (in production, these should be stored securely)
 ADMIN_CREDENTIALS = {
@@ -85,6 +101,7 @@ def login_page():
                 if is_valid:
                     st.session_state.authenticated = True
                     st.session_state.user_role = role
+                    st.session_state.username = username
                     st.success("Login successful! Redirecting...")
                     st.rerun()
                 else:
@@ -104,6 +121,7 @@ def logout():
     """Handle user logout."""
     st.session_state.authenticated = False
     st.session_state.user_role = None
+    st.session_state.username = None
     st.rerun()
 
 def show_user_scoreboard():
@@ -128,66 +146,95 @@ def show_user_scoreboard():
         if st.button("🔄 Refresh Scoreboard", use_container_width=True):
             st.rerun()
 
+def format_movement(places: int) -> str:
+    """Rank movement arrow for a scoreboard row."""
+    if places > 0:
+        return f"▲ {places}"
+    if places < 0:
+        return f"▼ {-places}"
+    return "–"
+
+BETTOR_STATS_COLUMNS = {
+    "Hit Rate %": st.column_config.NumberColumn("Hit Rate", help="Share of races bet on that scored", format="%.1f%%"),
+    "Avg per Race": st.column_config.NumberColumn("Avg/Race", format="%.2f"),
+    "vs Field": st.column_config.NumberColumn("vs Field", help="Total points minus the average total", format="%+.1f")
+}
+
+def format_status(clinched: bool, eliminated: bool) -> str:
+    """Title race status for a scoreboard row."""
+    if clinched:
+        return "🏆 Clinched"
+    if eliminated:
+        return "❌ Eliminated"
+    return "In contention"
+
+def display_title_race(outlook, names, order, races_left: int):
+    """Show who can still finish first and the leaders' magic numbers."""
+    st.markdown("### 🔮 Title Race")
+    winner = outlook.winner()
+    if winner is not None:
+        st.success(f"🏆 **{names[winner]}** has clinched first place with {races_left} race(s) to spare!")
+        return
+    
+    st.write(f"**{outlook.contenders}** of {len(names)} bettors can still finish first with {races_left} race(s) left.")
+    order = np.asarray(order)
+    for bettor in order[~outlook.eliminated[order]][:3].tolist():
+        st.write(f"• **{names[bettor]}** ({outlook.totals[bettor]} points) - magic number **{outlook.magic_numbers[bettor]}**")
+    st.caption("The magic number is how many more points a bettor needs to clinch first place "
+               "even if every rival scores their maximum. It also drops when rivals miss.")
+
+@st.fragment
+@profiling.profiled("display_simple_scoreboard")
 def display_simple_scoreboard():
     """Display a simplified scoreboard showing only total scores."""
     import pandas as pd
     
-    if not st.session_state.bettors:
+    # Standings come from the memory-mapped snapshot, not the database
+    snapshot = db.get_scoreboard_snapshot()
+    if snapshot is None or not snapshot.bettor_count:
         st.info("No bettors added yet.")
         return
     
     st.markdown("## 🏆 Current Standings")
     
     # Get basic race info
-    completed_races = len([r for r in st.session_state.races if 'results' in r])
-    total_bettors = len(st.session_state.bettors)
+    completed_races = snapshot.completed_races
+    total_races = snapshot.total_races or st.session_state.total_races
+    total_bettors = snapshot.bettor_count
     
     # Show key stats
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Total Participants", total_bettors)
     with col2:
-        st.metric("Races Completed", f"{completed_races}/{st.session_state.total_races}")
+        st.metric("Races Completed", f"{completed_races}/{total_races}")
     with col3:
         if completed_races > 0:
-            st.metric("Progress", f"{int((completed_races / st.session_state.total_races) * 100)}%")
+            st.metric("Progress", f"{int((completed_races / total_races) * 100)}%")
         else:
             st.metric("Status", "Starting Soon")
     
     st.markdown("---")
     
-    # Calculate total scores for each bettor
-    bettor_scores = []
-    for bettor in st.session_state.bettors:
-        total_points = 0
-        bettor_name = bettor['name']
-        
-        # Calculate points from completed races
-        for race in st.session_state.races:
-            if 'results' in race:
-                bet_horse = race['results']['bettor_bets'].get(bettor_name, None)
-                if bet_horse == race['results']['first']:
-                    total_points += 3
-                elif bet_horse == race['results']['second']:
-                    total_points += 2
-                elif bet_horse == race['results']['third']:
-                    total_points += 1
-        
-        bettor_scores.append({
-            'Name': bettor_name,
-            'Total Points': total_points
-        })
-    
-    # Sort by points (descending)
-    bettor_scores.sort(key=lambda x: x['Total Points'], reverse=True)
-    
-    # Add rank
-    for i, bettor in enumerate(bettor_scores):
-        bettor['Rank'] = i + 1
-    
-    # Create DataFrame
-    df = pd.DataFrame(bettor_scores)
-    df = df[['Rank', 'Name', 'Total Points']]  # Reorder columns
+    # Create DataFrame in rank order (ties by name)
+    names = snapshot.names()
+    order = snapshot.order.tolist()
+    df = pd.DataFrame({
+        'Rank': range(1, total_bettors + 1),
+        'Move': [format_movement(places) for places in snapshot.movement[order].tolist()],
+        'Name': [names[i] for i in order],
+        'Total Points': snapshot.totals[order]
+    })
+    
+    # Who can still finish first, from the snapshot's current and maximum totals
+    races_left = total_races - completed_races
+    if completed_races > 0 and races_left > 0:
+        outlook = build_outlook(snapshot.totals, snapshot.max_totals)
+        df['Max Points'] = snapshot.max_totals[order]
+        df['Status'] = [format_status(clinched, eliminated) for clinched, eliminated
+                        in zip(outlook.clinched[order].tolist(), outlook.eliminated[order].tolist())]
+        display_title_race(outlook, names, order, races_left)
+        st.markdown("---")
     
     # Search functionality
     search_term = st.text_input("🔍 Search for your name:", key="simple_search")
@@ -203,10 +250,23 @@ def display_simple_scoreboard():
                 hide_index=True,
                 column_config={
                     "Rank": st.column_config.NumberColumn("Rank", width="small"),
+                    "Move": st.column_config.TextColumn("Move", help="Places gained since the previous race", width="small"),
                     "Name": st.column_config.TextColumn("Name", width="medium"),
-                    "Total Points": st.column_config.NumberColumn("Points", width="small")
+                    "Total Points": st.column_config.NumberColumn("Points", width="small"),
+                    "Max Points": st.column_config.NumberColumn("Max", help="Highest total still reachable", width="small"),
+                    "Status": st.column_config.TextColumn("Status", width="small")
                 }
             )
+            
+            # Stats for the first few matches, from the snapshot
+            with st.expander("📊 Bettor Stats", expanded=len(filtered_df) == 1):
+                matches = [snapshot.order[rank - 1] for rank in filtered_df['Rank'].head(10).tolist()]
+                st.dataframe(
+                    pd.DataFrame(snapshot.bettor_stats().rows(matches)),
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config=BETTOR_STATS_COLUMNS
+                )
         else:
             st.warning(f"No results found for '{search_term}'")
         
@@ -223,8 +283,11 @@ def display_simple_scoreboard():
             hide_index=True,
             column_config={
                 "Rank": st.column_config.NumberColumn("Rank", width="small"),
+                "Move": st.column_config.TextColumn("Move", help="Places gained since the previous race", width="small"),
                 "Name": st.column_config.TextColumn("Name", width="medium"),
-                "Total Points": st.column_config.NumberColumn("Points", width="small")
+                "Total Points": st.column_config.NumberColumn("Points", width="small"),
+                "Max Points": st.column_config.NumberColumn("Max", help="Highest total still reachable", width="small"),
+                "Status": st.column_config.TextColumn("Status", width="small")
             }
         )
     
@@ -237,32 +300,196 @@ def display_simple_scoreboard():
                 hide_index=True,
                 column_config={
                     "Rank": st.column_config.NumberColumn("Rank", width="small"),
+                    "Move": st.column_config.TextColumn("Move", help="Places gained since the previous race", width="small"),
                     "Name": st.column_config.TextColumn("Name", width="medium"),
-                    "Total Points": st.column_config.NumberColumn("Points", width="small")
+                    "Total Points": st.column_config.NumberColumn("Points", width="small"),
+                    "Max Points": st.column_config.NumberColumn("Max", help="Highest total still reachable", width="small"),
+                    "Status": st.column_config.TextColumn("Status", width="small")
                 },
                 height=400
             )
     
     # Race completion status
-    if completed_races < st.session_state.total_races:
+    if completed_races < total_races:
         st.markdown("---")
-        st.info(f"🏁 {st.session_state.total_races - completed_races} races remaining. Check back for updates!")
+        st.info(f"🏁 {total_races - completed_races} races remaining. Check back for updates!")
     else:
         st.markdown("---")
-        st.success(f"🏆 All {st.session_state.total_races} races completed! Final results above.")
+        st.success(f"🏆 All {total_races} races completed! Final results above.")
+
+def display_live_odds(matrix):
+    """Simulate the remaining races and show each bettor's chance of finishing on top."""
+    with st.expander("🎲 Live Odds", expanded=False):
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col1:
+            simulations = st.selectbox("Simulations", [1000, 10000, 50000], index=1, key="odds_simulations")
+        with col2:
+            odds_mode = st.selectbox(
+                "Horse odds",
+                ODDS_MODES,
+                format_func=lambda mode: "Equal for every horse" if mode == "uniform" else "By bet popularity",
+                key="odds_mode"
+            )
+        with col3:
+            st.markdown("<br>", unsafe_allow_html=True)  # Add spacing
+            if st.button("🎲 Run Simulation", key="run_simulation"):
+                with st.spinner(f"Simulating {simulations:,} outcomes of the remaining races..."):
+                    st.session_state.simulation = (matrix, simulate_standings(matrix, simulations, odds_mode))
+        
+        if 'simulation' not in st.session_state:
+            st.caption("Samples the remaining races and scores every outcome against the bets placed so far.")
+            return
+        simulated_matrix, result = st.session_state.simulation
+        if simulated_matrix is not matrix:
+            st.warning("Bets or results have changed since this simulation. Run it again for current odds.")
+        
+        # Bettors with any chance of a top-ten finish, most likely winners first
+        order = np.lexsort((-result.podium, -result.win))
+        order = order[result.top_ten[order] > 0][:25]
+        st.dataframe(
+            pd.DataFrame({
+                'Bettor': [simulated_matrix.bettor_names[b] for b in order.tolist()],
+                'Points': simulated_matrix.totals()[order],
+                'Expected': result.expected_totals[order],
+                'Win %': result.win[order] * 100,
+                'Podium %': result.podium[order] * 100,
+                'Top 10 %': result.top_ten[order] * 100
+            }),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Expected": st.column_config.NumberColumn("Expected", help="Average final total", format="%.1f"),
+                "Win %": st.column_config.NumberColumn("Win %", format="%.1f%%"),
+                "Podium %": st.column_config.NumberColumn("Podium %", format="%.1f%%"),
+                "Top 10 %": st.column_config.NumberColumn("Top 10 %", format="%.1f%%")
+            }
+        )
+        st.caption(f"{result.simulations:,} simulations, {'equal' if result.odds == 'uniform' else 'popularity'} odds. "
+                   "Bettors without a bet on a remaining race get a random pick from the same odds.")
+
+def display_result_correction():
+    """Correct a completed race's placings or bets, with the audit trail of past corrections."""
+    matrix = st.session_state.bet_matrix
+    completed = [int(race) for race in matrix.race_numbers[matrix.completed]]
+    with st.expander("✏️ Correct Results", expanded=False):
+        if not completed:
+            st.info("No completed races to correct.")
+            return
+        
+        race_number = st.selectbox("Race", completed, index=len(completed) - 1, key="correction_race")
+        race_index = matrix.race_index(race_number)
+        choices = [""] + list(matrix.horse_numbers)
+        current = [matrix.horse_numbers[h] if h >= 0 else "" for h in matrix.podium[race_index].tolist()]
+        
+        cols = st.columns(3)
+        placings = {}
+        for col, field, label, horse in zip(cols, ("first", "second", "third"), ("🥇 1st", "🥈 2nd", "🥉 3rd"), current):
+            with col:
+                placings[field] = st.selectbox(label, choices, index=choices.index(horse),
+                                               key=f"correction_{field}_{race_number}")
+        
+        bet_text = st.text_area(
+            "Bet corrections",
+            placeholder="John Smith:3\nJane Doe:",
+            help="One line per bettor in format 'Name:HorseNumber'; leave the horse empty to remove the bet",
+            key=f"correction_bets_{race_number}"
+        )
+        reason = st.text_input("Reason", key=f"correction_reason_{race_number}")
+        
+        if st.button("✏️ Apply Correction", key="apply_correction"):
+            parsed = parse_paste_bets(bet_text)
+            bet_changes = {name.strip(): horse.strip() for name, horse in zip(parsed['name'], parsed['horse'])
+                           if name is not None}
+            unknown = [name for name in bet_changes if name not in matrix.bettor_names]
+            bad_horses = [horse for horse in bet_changes.values() if horse and horse not in matrix.horse_numbers]
+            if parsed['name'].isna().any():
+                st.error("Every bet correction needs a 'Name:HorseNumber' line.")
+            elif unknown:
+                st.error(f"Unknown bettors: {', '.join(unknown[:5])}")
+            elif bad_horses:
+                st.error(f"Unknown horses: {', '.join(bad_horses[:5])}")
+            elif not reason.strip():
+                st.error("Please give a reason for the correction.")
+            elif db.correct_race_result(race_number, placings, bet_changes, reason.strip()):
+                st.success(f"✅ Race {race_number} corrected and rescored.")
+                st.rerun()
+            else:
+                st.error("❌ Could not apply the correction. Every race needs a winner and a different horse in each place.")
+        
+        corrections = db.get_result_corrections()
+        if corrections:
+            st.markdown("**Correction history**")
+            st.dataframe(
+                pd.DataFrame([{
+                    "Race": row["race_number"],
+                    "Changed": row["field"].title() if row["field"] != "bet" else f"Bet: {row['bettor_name']}",
+                    "From": row["old_value"] or "",
+                    "To": row["new_value"] or "",
+                    "By": row["operator"],
+                    "Reason": row["reason"],
+                    "When": row["corrected_at"]
+                } for row in corrections]),
+                use_container_width=True,
+                hide_index=True
+            )
+
+def display_horse_popularity():
+    """Bet counts, field shares and pool payouts for every race, with a CSV export."""
+    matrix = st.session_state.bet_matrix
+    with st.expander("🐎 Horse Popularity", expanded=False):
+        analytics = race_analytics(matrix)
+        race_rows = analytics.race_rows()
+        if not race_rows:
+            st.info("No bets recorded yet.")
+            return
+        
+        st.dataframe(
+            pd.DataFrame(race_rows),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Win Payout": st.column_config.NumberColumn("Win Payout", help="Pool payout of the winning horse", format="%.2fx"),
+                "Scorers": st.column_config.NumberColumn("Scorers", help="Bettors who scored in the race"),
+                "Pooled Points per Winner": st.column_config.NumberColumn(
+                    "Pooled Points per Winner", help="The race's points split among everyone who picked the winner", format="%.2f")
+            }
+        )
+        st.caption("Pool payouts are parimutuel: what one unit on a horse would return if every bettor in the race "
+                   "put one unit into a single win pool.")
+        
+        race_number = st.selectbox("Horses in race", [row['Race'] for row in race_rows], key="popularity_race")
+        st.dataframe(
+            pd.DataFrame(analytics.horse_rows(matrix.race_index(race_number))),
+            use_container_width=True,
+            hide_index=True,
+            column_config={"Payout": st.column_config.NumberColumn("Payout", format="%.2fx")}
+        )
+        
+        st.download_button(
+            label="📊 Download CSV",
+            data=pd.DataFrame(analytics.all_horse_rows()).to_csv(index=False),
+            file_name=f"derby_horse_popularity_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv",
+            key="download_horse_popularity"
+        )
 
+@st.fragment
+@profiling.profiled("display_scoreboard")
 def display_scoreboard():
     """Display the scoreboard as a table with all races - optimized for large numbers of bettors"""
     import pandas as pd
     
-    if not st.session_state.bettors:
+    if not st.session_state.bet_matrix.bettor_names:
         st.info("No bettors added yet.")
         return
     
     st.markdown("## 🏆 Scoreboard")
     
+    # Standings after every completed race, for "as of" views and movement
+    standings = db.get_standings()
+    
     # Scoreboard options and filters
-    col1, col2, col3 = st.columns([2, 1, 1])
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
     
     with col1:
         search_term = st.text_input("🔍 Search bettors:", key="scoreboard_search")
@@ -273,14 +500,24 @@ def display_scoreboard():
     with col3:
         bettors_per_page = st.selectbox("Bettors per page:", [10, 25, 50, 100], index=1, key="scoreboard_per_page")
     
-    # Create data for the table
-    bettor_names = [b['name'] for b in st.session_state.bettors]
+    with col4:
+        as_of = st.selectbox(
+            "Standings as of:",
+            [None] + standings.race_numbers.tolist()[::-1],
+            format_func=lambda race: "Latest" if race is None else f"After Race {race}",
+            key="scoreboard_as_of"
+        )
+    
+    # Create data for the table from the bet matrix rows
+    matrix = st.session_state.bet_matrix
+    bettor_names = matrix.bettor_names
     
     # Filter bettors based on search
     if search_term:
-        filtered_bettor_names = [name for name in bettor_names if search_term.lower() in name.lower()]
+        rows = [i for i, name in enumerate(bettor_names) if search_term.lower() in name.lower()]
     else:
-        filtered_bettor_names = bettor_names
+        rows = list(range(len(bettor_names)))
+    filtered_bettor_names = [bettor_names[i] for i in rows]
     
     if not filtered_bettor_names:
         st.info("No bettors found matching your search.")
@@ -297,53 +534,42 @@ def display_scoreboard():
         # Only show completed races
         completed_race_numbers = [r['race_number'] for r in st.session_state.races if 'results' in r]
         races_to_show = completed_race_numbers if completed_race_numbers else [1]
+    if as_of is not None:
+        races_to_show = [race_num for race_num in races_to_show if race_num <= as_of]
     
     # Add columns for races
+    points = matrix.points()[rows]
     for race_num in races_to_show:
         race_col = f"R{race_num}"  # Shorter column names for mobile
-        table_data[race_col] = []
-        
-        # Find if this race has been completed
-        completed_race = None
-        for race in st.session_state.races:
-            if race.get('race_number') == race_num and 'results' in race:
-                completed_race = race
-                break
-        
-        # For each bettor, determine their points in this race
-        for bettor_name in filtered_bettor_names:
-            if completed_race:
-                points = 0
-                bet_horse = completed_race['results']['bettor_bets'].get(bettor_name, None)
-                if bet_horse == completed_race['results']['first']:
-                    points = 3
-                elif bet_horse == completed_race['results']['second']:
-                    points = 2
-                elif bet_horse == completed_race['results']['third']:
-                    points = 1
-                table_data[race_col].append(points)
-            else:
-                # Race not completed yet, show blank
-                table_data[race_col].append("")
-    
-    # Calculate total points (only from completed races)
-    total_points = []
-    for i, bettor_name in enumerate(filtered_bettor_names):
-        total = 0
-        for col in table_data.keys():
-            if col.startswith('R') and table_data[col][i] != "":
-                total += table_data[col][i]
-        total_points.append(total)
-    table_data['Total'] = total_points
+        race_idx = matrix.race_index(race_num)
+        
+        if race_idx is not None and matrix.completed[race_idx]:
+            table_data[race_col] = points[:, race_idx]
+        else:
+            # Race not completed yet, show blank
+            table_data[race_col] = [""] * len(rows)
     
-    # Create DataFrame
-    df = pd.DataFrame(table_data)
+    # Total points, rank and movement as of the chosen race are column lookups
+    total_points = standings.totals_as_of(as_of)[rows].tolist()
+    table_data['Total'] = total_points
     
-    # Sort by total points (descending), then by name for ties
-    df = df.sort_values(['Total', 'Bettor'], ascending=[False, True]).reset_index(drop=True)
+    # Title race for the latest standings while races remain
+    races_left = len(remaining_races(matrix))
+    outlook = None
+    if as_of is None and len(standings.race_numbers) and races_left:
+        outlook = matrix_outlook(matrix)
+        table_data['Max'] = outlook.max_totals[rows]
+        table_data['Status'] = [format_status(clinched, eliminated) for clinched, eliminated
+                                in zip(outlook.clinched[rows].tolist(), outlook.eliminated[rows].tolist())]
     
-    # Add rank column
-    df.insert(0, 'Rank', range(1, len(df) + 1))
+    # Create DataFrame
+    with profiling.timed("display_scoreboard: dataframe"):
+        df = pd.DataFrame(table_data)
+        df.insert(0, 'Rank', standings.ranks_as_of(as_of)[rows])
+        df.insert(1, 'Move', [format_movement(places) for places in standings.movement(as_of)[rows].tolist()])
+        
+        # Rank order is total points (descending), then name for ties
+        df = df.sort_values('Rank').reset_index(drop=True)
     
     # Statistics
     total_bettors = len(filtered_bettor_names)
@@ -365,6 +591,13 @@ def display_scoreboard():
     
     st.markdown("---")
     
+    if outlook is not None:
+        display_title_race(outlook, bettor_names, matrix.ranking(), races_left)
+        st.markdown("---")
+    
+    if races_left:
+        display_live_odds(matrix)
+    
     # Pagination
     total_filtered = len(df)
     if total_filtered > bettors_per_page:
@@ -396,6 +629,11 @@ def display_scoreboard():
             format="%d",
             width="small"
         ),
+        "Move": st.column_config.TextColumn(
+            "Move",
+            help="Places gained since the previous race",
+            width="small"
+        ),
         "Bettor": st.column_config.TextColumn(
             "Bettor",
             help="Bettor name",
@@ -406,6 +644,17 @@ def display_scoreboard():
             help="Total points from all races",
             format="%d",
             width="small"
+        ),
+        "Max": st.column_config.NumberColumn(
+            "Max",
+            help="Highest total still reachable",
+            format="%d",
+            width="small"
+        ),
+        "Status": st.column_config.TextColumn(
+            "Status",
+            help="Whether the bettor can still finish first",
+            width="small"
         )
     }
     
@@ -429,7 +678,7 @@ def display_scoreboard():
     
     # Additional views
     with st.expander("📊 Additional Views", expanded=False):
-        view_tab1, view_tab2, view_tab3 = st.tabs(["🏆 Top 10", "📈 Race Breakdown", "📋 Full List"])
+        view_tab1, view_tab2, view_tab4, view_tab3 = st.tabs(["🏆 Top 10", "📈 Race Breakdown", "📊 Stats", "📋 Full List"])
         
         with view_tab1:
             st.subheader("Top 10 Leaderboard")
@@ -455,17 +704,19 @@ def display_scoreboard():
             if completed_races > 0:
                 # Show race-by-race statistics
                 race_stats = {}
+                race_picks = matrix.picks[rows]
                 for race_num in range(1, completed_races + 1):
-                    race_col = f"R{race_num}"
-                    if race_col in df.columns:
-                        points_this_race = [p for p in df[race_col] if p != ""]
-                        if points_this_race:
-                            race_stats[f"Race {race_num}"] = {
-                                "Winners (3pts)": sum(1 for p in points_this_race if p == 3),
-                                "Second (2pts)": sum(1 for p in points_this_race if p == 2),
-                                "Third (1pt)": sum(1 for p in points_this_race if p == 1),
-                                "No points": sum(1 for p in points_this_race if p == 0)
-                            }
+                    race_idx = matrix.race_index(race_num)
+                    if f"R{race_num}" in df.columns and race_idx is not None and matrix.completed[race_idx]:
+                        picks = race_picks[:, race_idx]
+                        placed = [int((picks == horse).sum()) if horse >= 0 else 0 for horse in matrix.podium[race_idx].tolist()]
+                        race_stats[f"Race {race_num}"] = {
+                            "Points": "-".join(map(str, matrix.scoring.race_points(race_idx))),
+                            "Winners": placed[0],
+                            "Second": placed[1],
+                            "Third": placed[2],
+                            "No points": len(picks) - sum(placed)
+                        }
                 
                 if race_stats:
                     stats_df = pd.DataFrame(race_stats).T
@@ -473,6 +724,23 @@ def display_scoreboard():
             else:
                 st.info("No completed races yet.")
         
+        with view_tab4:
+            st.subheader("Bettor Stats")
+            if completed_races > 0:
+                # Search matches in rank order, as in the table above
+                stats_rows = [rows[i] for i in np.argsort(standings.ranks_as_of()[rows], kind='stable').tolist()]
+                st.dataframe(
+                    pd.DataFrame(bettor_stats(matrix).rows(stats_rows)),
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config=BETTOR_STATS_COLUMNS,
+                    height=400
+                )
+                st.caption("Wins, places and shows count picks that finished 1st, 2nd and 3rd. "
+                           "Best Streak is the longest run of races in a row with points.")
+            else:
+                st.info("No completed races yet.")
+        
         with view_tab3:
             st.subheader("Complete Scoreboard")
             # Show full table without pagination
@@ -526,17 +794,526 @@ def display_scoreboard():
                 mime="application/json"
             )
 
+def get_race_positions(race_number: int, horse_numbers: list) -> tuple:
+    """Read the entered 1st/2nd/3rd place horses and list any invalid ones."""
+    first_place = st.session_state.get(f"first_{race_number}", '')
+    second_place = st.session_state.get(f"second_{race_number}", '')
+    third_place = st.session_state.get(f"third_{race_number}", '')
+    
+    # Validation for race positions
+    invalid_horses = []
+    for position, horse_num in [("1st", first_place), ("2nd", second_place), ("3rd", third_place)]:
+        if horse_num and horse_num not in horse_numbers:
+            invalid_horses.append(f"{position} place: Horse #{horse_num}")
+    
+    return first_place, second_place, third_place, invalid_horses
+
+def display_results_preview(race_number: int, first_place: str, second_place: str, third_place: str,
+                            bettor_bets: dict):
+    """Projected standings if a race were submitted with the entered results and bets."""
+    if not st.toggle("🔮 Preview standings", key=f"preview_standings_{race_number}",
+                     help="See how the standings would change before submitting. Nothing is saved."):
+        return
+    
+    standings = db.preview_race_results(race_number, first_place, second_place, third_place, bettor_bets)
+    if standings is None:
+        st.info(f"Race {race_number} is outside the event.")
+        return
+    
+    matrix = st.session_state.bet_matrix
+    ranks = standings.ranks_as_of(race_number)
+    totals = standings.totals_as_of(race_number)
+    race_points = totals - standings.totals_as_of(race_number - 1)
+    order = np.argsort(ranks)[:10]
+    st.dataframe(
+        pd.DataFrame({
+            'Rank': ranks[order],
+            'Bettor': [matrix.bettor_names[b] for b in order.tolist()],
+            'Points': totals[order],
+            'This Race': race_points[order],
+            'Move': [format_movement(places) for places in standings.movement(race_number)[order].tolist()]
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Move": st.column_config.TextColumn("Move", help="Places gained if these results are submitted", width="small")
+        }
+    )
+    st.caption(f"Projected top 10 after race {race_number}: {int((race_points > 0).sum()):,} of "
+               f"{len(race_points):,} bettors would score.")
+
+@st.fragment
+@profiling.profiled("race_results_entry")
+def race_results_entry(race_number: int, horse_numbers: list):
+    """Race result inputs - editing a position only reruns this section."""
+    st.subheader("Enter Race Results")
+    st.write("Enter the winning horse numbers for each position:")
+    
+    # Initialize race results for this race
+    first_key = f"first_{race_number}"
+    second_key = f"second_{race_number}"
+    third_key = f"third_{race_number}"
+    
+    # Initialize keys if they don't exist
+    if first_key not in st.session_state:
+        st.session_state[first_key] = ''
+    if second_key not in st.session_state:
+        st.session_state[second_key] = ''
+    if third_key not in st.session_state:
+        st.session_state[third_key] = ''
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.text_input("1st Place Horse #", key=first_key)
+    with col2:
+        st.text_input("2nd Place Horse #", key=second_key)
+    with col3:
+        st.text_input("3rd Place Horse #", key=third_key)
+    
+    first_place, second_place, third_place, invalid_horses = get_race_positions(race_number, horse_numbers)
+    
+    if invalid_horses:
+        st.error(f"Invalid horse numbers entered: {', '.join(invalid_horses)}")
+    
+    # The submit panel lives in the bet entry fragment, so only rerun the
+    # whole app when the results flip between ready and not ready.
+    results_ready = (bool(first_place and second_place and third_place) and not invalid_horses and
+                     len({first_place, second_place, third_place}) == 3)
+    ready_key = f"results_ready_{race_number}"
+    previously_ready = st.session_state.get(ready_key)
+    st.session_state[ready_key] = results_ready
+    if previously_ready is not None and previously_ready != results_ready:
+        st.rerun()
+
+def get_race_bets(race_number: int) -> dict:
+    """Bets entered so far for a race, keyed by bettor name (filled bets only)."""
+    bets_key = f"race_bets_{race_number}"
+    if bets_key not in st.session_state:
+        # Restore any draft saved before a refresh or dropped connection
+        st.session_state[bets_key] = db.load_draft_bets(race_number)
+    return st.session_state[bets_key]
+
+def set_race_bets(race_number: int, updates: dict):
+    """Apply bets from bulk entry and reset the bet grid so it shows them."""
+    bets = get_race_bets(race_number)
+    for bettor, horse in updates.items():
+        if horse:
+            bets[bettor] = horse
+        else:
+            bets.pop(bettor, None)
+    db.queue_draft_bets(race_number, updates, flush_now=True)
+    
+    # A new editor revision starts a fresh grid from the updated bets
+    rev_key = f"bet_editor_rev_{race_number}"
+    st.session_state[rev_key] = st.session_state.get(rev_key, 0) + 1
+
+def import_bets(race_number: int, parsed_bets, bettor_names: list, horse_numbers: list) -> bool:
+    """Validate parsed bets in one pass and write the accepted ones as one batch."""
+    report = validate_bets(parsed_bets, bettor_names, horse_numbers)
+    st.session_state[f"bet_import_report_{race_number}"] = report
+    
+    imported = accepted_bets(report)
+    if imported:
+        set_race_bets(race_number, imported)
+    return bool(imported)
+
+def show_bet_import_report(race_number: int):
+    """Summarize the last bet import for this race."""
+    report = st.session_state.get(f"bet_import_report_{race_number}")
+    if report is None:
+        return
+    
+    accepted = len(report['accepted'])
+    rejected = sum(len(report[category]) for category in REPORT_CATEGORIES if category != 'accepted')
+    if accepted:
+        st.success(f"Imported {accepted} bets!")
+    if rejected:
+        st.warning(f"Errors with {rejected} entries")
+        labels = {
+            'malformed': "Format errors",
+            'unknown_bettor': "Unknown bettors",
+            'unknown_horse': "Unknown horses",
+            'duplicate': "Duplicates (last entry kept)"
+        }
+        cols = st.columns(len(labels))
+        for col, (category, label) in zip(cols, labels.items()):
+            with col:
+                st.metric(label, len(report[category]))
+        for category, label in labels.items():
+            if len(report[category]):
+                st.caption(f"{label}:")
+                st.dataframe(report[category], hide_index=True, use_container_width=True,
+                             height=min(35 * len(report[category]) + 38, 250))
+
+def apply_draft_conflicts(race_number: int) -> dict:
+    """Take over bets another operator changed under us and refresh the grid."""
+    conflicts = db.take_draft_conflicts(race_number)
+    if conflicts:
+        bets = get_race_bets(race_number)
+        for bettor, horse in conflicts.items():
+            if horse:
+                bets[bettor] = horse
+            else:
+                bets.pop(bettor, None)
+        rev_key = f"bet_editor_rev_{race_number}"
+        st.session_state[rev_key] = st.session_state.get(rev_key, 0) + 1
+    return conflicts
+
+def clear_race_bets(race_number: int):
+    """Drop all bet entry state for a race."""
+    for key in [f"race_bets_{race_number}", f"bet_editor_base_{race_number}", f"bet_import_report_{race_number}",
+                f"bet_editor_touched_{race_number}", f"bet_editor_rev_{race_number}"]:
+        if key in st.session_state:
+            del st.session_state[key]
+
+def apply_bet_grid_edits(race_number: int, editor_key: str):
+    """Bet grid on_change callback - apply only the cells that changed."""
+    base_df = st.session_state[f"bet_editor_base_{race_number}"]
+    edited_rows = st.session_state[editor_key]["edited_rows"]
+    bets = get_race_bets(race_number)
+    
+    # edited_rows holds every edit since the grid was built, so also revisit
+    # rows edited before in case an edit was undone
+    touched_key = f"bet_editor_touched_{race_number}"
+    touched = st.session_state.get(touched_key, set()) | set(edited_rows)
+    st.session_state[touched_key] = touched
+    
+    changes = {}
+    for row in touched:
+        bettor = base_df.at[row, "Bettor"]
+        horse = edited_rows.get(row, {}).get("Horse", base_df.at[row, "Horse"])
+        horse = str(horse).strip() if horse is not None else ''
+        if horse != bets.get(bettor, ''):
+            changes[bettor] = horse
+            if horse:
+                bets[bettor] = horse
+            else:
+                bets.pop(bettor, None)
+    
+    if changes:
+        db.queue_draft_bets(race_number, changes)
+
+@st.fragment(run_every=DRAFT_FLUSH_SECONDS)
+@profiling.profiled("draft_autosave")
+def draft_autosave():
+    """Flush buffered draft bets to the database and pick up other operators' in the background."""
+    db.flush_draft_bets()
+    db.pull_draft_changes(st.session_state.current_race)
+    if any(st.session_state.get('draft_conflicts', {}).values()):
+        st.rerun()  # Let the bet grid show the other operator's values
+    if st.session_state.get('pending_draft_bets'):
+        st.caption("💾 Saving draft...")
+    else:
+        st.caption("💾 Draft saved")
+
+@st.fragment
+@profiling.profiled("bet_entry_grid")
+def bet_entry_grid(race_number: int, bettor_names: list, horse_numbers: list, partition: str = None):
+    """Bet grid, progress and submission - editing a bet only reruns this section.
+    
+    With a partition, the grid covers only that operator's share and ends with
+    a mark-complete control instead of the submit button.
+    """
+    import pandas as pd
+    
+    st.write("**Individual Bet Entry:**")
+    st.caption("Type a horse number in the Horse column. Use the grid toolbar to search bettors.")
+    
+    bets = get_race_bets(race_number)
+    conflicts = apply_draft_conflicts(race_number)
+    if conflicts:
+        st.warning(f"⚠️ {len(conflicts)} bet(s) were changed by another operator or device - showing their values: " +
+                   ", ".join(list(conflicts)[:5]) + ("..." if len(conflicts) > 5 else ""))
+    
+    # Rebuild the grid only when bulk entry changed the bets or the bettors changed
+    rev = st.session_state.get(f"bet_editor_rev_{race_number}", 0)
+    editor_key = f"bet_editor_{race_number}_{rev}"
+    base_key = f"bet_editor_base_{race_number}"
+    base_df = st.session_state.get(base_key)
+    grid_cached = (base_df is not None and base_df.attrs.get("editor_key") == editor_key and
+                   base_df["Bettor"].tolist() == bettor_names)
+    metrics.count_cache("bet_grid", grid_cached)
+    if not grid_cached:
+        base_df = pd.DataFrame({
+            "Bettor": bettor_names,
+            "Horse": [bets.get(name, '') for name in bettor_names]
+        })
+        base_df.attrs["editor_key"] = editor_key
+        st.session_state[base_key] = base_df
+        st.session_state[f"bet_editor_touched_{race_number}"] = set()
+    
+    # One widget for every bettor; edits arrive as a diff in the on_change callback
+    st.data_editor(
+        base_df,
+        key=editor_key,
+        on_change=apply_bet_grid_edits,
+        args=(race_number, editor_key),
+        use_container_width=True,
+        hide_index=True,
+        num_rows="fixed",
+        disabled=["Bettor"],
+        height=min(35 * len(bettor_names) + 38, 600),
+        column_config={
+            "Bettor": st.column_config.TextColumn("Bettor", width="medium"),
+            "Horse": st.column_config.TextColumn("Horse #", help="Horse number for this bettor", width="small")
+        }
+    )
+    
+    # Validate every bet in one vectorized pass
+    bet_series = pd.Series(bets, dtype=object).reindex(bettor_names).fillna('')
+    filled_mask = bet_series != ''
+    invalid_mask = filled_mask & ~bet_series.isin(horse_numbers)
+    invalid_bets = [f"{bettor}: Horse #{horse}" for bettor, horse in bet_series[invalid_mask].items()]
+    
+    # Show validation errors
+    if invalid_bets:
+        st.error(f"Invalid horse numbers for {len(invalid_bets)} bet(s):")
+        for error in invalid_bets[:5]:  # Show first 5 errors
+            st.write(f"• {error}")
+    
+    # Progress indicator
+    all_bettor_bets = bet_series.to_dict()
+    filled_bets = int(filled_mask.sum())
+    st.progress(min(filled_bets / len(bettor_names), 1.0))
+    st.caption(f"Bets entered: {filled_bets}/{len(bettor_names)}")
+    
+    st.markdown("---")
+    
+    if partition is not None:
+        partition_completion_controls(race_number, partition, filled_bets == len(bettor_names) and not invalid_bets)
+        return
+    
+    # Race positions are owned by the results fragment - read them fresh
+    first_place, second_place, third_place, invalid_horses = get_race_positions(race_number, horse_numbers)
+    
+    # Results preview and submission
+    all_positions_filled = first_place and second_place and third_place
+    all_bets_filled = bool(filled_mask.all())
+    unique_positions = len(set([first_place, second_place, third_place])) == 3 if all_positions_filled else False
+    valid_horses_positions = not invalid_horses
+    valid_horses_bets = not invalid_bets
+    
+    # Check if all validations pass
+    can_submit = (all_positions_filled and all_bets_filled and unique_positions and 
+                 valid_horses_positions and valid_horses_bets)
+    
+    # Quick validation summary
+    validation_status = []
+    if not all_positions_filled:
+        validation_status.append("❌ Race positions incomplete")
+    else:
+        validation_status.append("✅ Race positions filled")
+        
+    if not all_bets_filled:
+        validation_status.append(f"❌ Bets missing ({filled_bets}/{len(bettor_names)})")
+    else:
+        validation_status.append("✅ All bets entered")
+        
+    if all_positions_filled and not unique_positions:
+        validation_status.append("❌ Duplicate positions")
+    elif all_positions_filled:
+        validation_status.append("✅ Unique positions")
+        
+    # Show validation status
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        for status in validation_status:
+            st.write(status)
+        if all_positions_filled and unique_positions and valid_horses_positions and valid_horses_bets:
+            display_results_preview(race_number, first_place, second_place, third_place, all_bettor_bets)
+    
+    with col2:
+        if st.button("✅ Submit Results", type="primary", disabled=not can_submit):
+            # Bets saved since the last autosave (another operator, the bet API) are reviewed first
+            db.flush_draft_bets(force=True)
+            if db.pull_draft_changes(race_number) or st.session_state.get('draft_conflicts', {}).get(race_number):
+                st.rerun()
+            
+            # Submit race results using database
+            success = db.submit_race_results(
+                race_number,
+                first_place,
+                second_place,
+                third_place,
+                all_bettor_bets
+            )
+            
+            if success:
+                # Clear all input fields for this race
+                for key in [f"first_{race_number}", f"second_{race_number}", f"third_{race_number}",
+                            f"results_ready_{race_number}"]:
+                    if key in st.session_state:
+                        del st.session_state[key]
+                clear_race_bets(race_number)
+                
+                st.success("Race results submitted successfully!")
+                st.balloons()
+                st.rerun()
+            else:
+                st.error("Failed to submit race results. Please try again.")
+    
+    # Export current bets for backup
+    if filled_bets > 0:
+        with st.expander("📤 Export Current Bets", expanded=False):
+            export_format = st.radio("Export format:", ["Text", "CSV"], horizontal=True)
+            
+            if export_format == "Text":
+                bet_text = '\n'.join([f"{bettor}:{bet}" for bettor, bet in all_bettor_bets.items() if bet])
+                st.download_button(
+                    label="Download Bet List",
+                    data=bet_text,
+                    file_name=f"race_{race_number}_bets.txt",
+                    mime="text/plain"
+                )
+            else:
+                import pandas as pd
+                bet_df = pd.DataFrame([{"name": bettor, "horse": bet} for bettor, bet in all_bettor_bets.items() if bet])
+                csv = bet_df.to_csv(index=False)
+                st.download_button(
+                    label="Download CSV",
+                    data=csv,
+                    file_name=f"race_{race_number}_bets.csv",
+                    mime="text/csv"
+                )
+
+def operator_partition_picker(race_number: int, partitions: dict) -> str:
+    """Let this operator pick (and claim) the partition they are entering."""
+    st.markdown("#### 👥 Multi-Operator Entry")
+    if 'operator_name' not in st.session_state:
+        st.session_state.operator_name = st.session_state.get('username') or 'admin'
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.text_input("Your operator name", key="operator_name")
+    with col2:
+        my_partition = st.selectbox(
+            "Your partition",
+            list(partitions),
+            key="operator_partition",
+            format_func=lambda p: f"{partition_label(p, partitions[p])} ({len(partitions[p])} bettors)"
+        )
+    
+    claim = (race_number, my_partition, st.session_state.operator_name)
+    if st.session_state.get('claimed_partition') != claim:
+        if db.claim_partition(race_number, my_partition):
+            st.session_state.claimed_partition = claim
+    return my_partition
+
+def partition_completion_controls(race_number: int, partition: str, ready: bool):
+    """Mark this operator's partition complete, or reopen it."""
+    status = db.get_partition_status(race_number).get(partition, {})
+    
+    if status.get('is_completed'):
+        st.success(f"✅ {partition} marked complete by {status['operator']}")
+        if st.button("↩️ Reopen Partition"):
+            if not db.set_partition_complete(race_number, partition, False, status['version']):
+                st.warning("This partition was changed by another operator - please check again.")
+            st.rerun()
+    else:
+        if not ready:
+            st.write("❌ Enter a valid bet for every bettor in this partition to mark it complete")
+        if st.button("✅ Mark Partition Complete", type="primary", disabled=not ready):
+            db.flush_draft_bets(force=True)
+            if st.session_state.get('draft_conflicts', {}).get(race_number):
+                st.rerun()  # Review the other operator's changes first
+            if db.set_partition_complete(race_number, partition, True, status.get('version', 0)):
+                st.success(f"{partition} marked complete!")
+            else:
+                st.warning("This partition was changed by another operator - please check again.")
+            st.rerun()
+
+@st.fragment(run_every=PARTITION_PROGRESS_SECONDS)
+@profiling.profiled("partition_progress")
+def partition_progress(race_number: int, partitions: dict, horse_numbers: list):
+    """Live combined progress of all operators, and the race submission."""
+    import pandas as pd
+    
+    st.subheader("📡 Combined Progress")
+    
+    saved_bets = db.get_saved_draft_bets(race_number)
+    status = db.get_partition_status(race_number)
+    
+    progress_rows = []
+    total_filled = 0
+    for partition, members in partitions.items():
+        filled = sum(1 for name in members if name in saved_bets)
+        total_filled += filled
+        partition_status = status.get(partition)
+        if partition_status is None:
+            state = "⏳ Unclaimed"
+        elif partition_status['is_completed']:
+            state = "✅ Complete"
+        else:
+            state = "✏️ In progress"
+        progress_rows.append({
+            "Partition": partition_label(partition, members),
+            "Operator": partition_status['operator'] if partition_status else "",
+            "Bets": f"{filled}/{len(members)}",
+            "Status": state
+        })
+    
+    total_bettors = sum(len(members) for members in partitions.values())
+    st.progress(min(total_filled / total_bettors, 1.0) if total_bettors else 0.0)
+    st.caption(f"Bets saved by all operators: {total_filled}/{total_bettors}")
+    st.dataframe(pd.DataFrame(progress_rows), use_container_width=True, hide_index=True)
+    
+    # Submit once every partition is in
+    all_partitions_complete = all(status.get(p, {}).get('is_completed') for p in partitions)
+    invalid_saved = [name for name, horse in saved_bets.items() if horse not in horse_numbers]
+    results_ready = st.session_state.get(f"results_ready_{race_number}", False)
+    
+    validation_status = [
+        "✅ Race positions filled" if results_ready else "❌ Race positions incomplete or invalid",
+        "✅ All partitions complete" if all_partitions_complete else "❌ Waiting for partitions",
+    ]
+    if invalid_saved:
+        validation_status.append(f"❌ {len(invalid_saved)} saved bet(s) have invalid horse numbers")
+    
+    can_submit = results_ready and all_partitions_complete and not invalid_saved
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        for line in validation_status:
+            st.write(line)
+        if results_ready and not invalid_saved:
+            display_results_preview(race_number, *get_race_positions(race_number, horse_numbers)[:3], saved_bets)
+    with col2:
+        if st.button("✅ Submit Results", type="primary", disabled=not can_submit, key="submit_partitioned"):
+            first_place, second_place, third_place, _ = get_race_positions(race_number, horse_numbers)
+            
+            # Submit the bets every operator saved to the draft
+            success = db.submit_race_results(race_number, first_place, second_place, third_place, {})
+            if success:
+                for key in [f"first_{race_number}", f"second_{race_number}", f"third_{race_number}",
+                            f"results_ready_{race_number}"]:
+                    if key in st.session_state:
+                        del st.session_state[key]
+                clear_race_bets(race_number)
+                
+                st.success("Race results submitted successfully!")
+                st.balloons()
+                st.rerun()
+            else:
+                st.error("Failed to submit race results - another operator may have submitted this race already.")
+
+
 # Check authentication and route to appropriate page
 if st.session_state.user_role == "viewer":
     # Show public scoreboard only
+    metrics.touch_session("viewer")
     show_user_scoreboard()
+    profiling.checkpoint("page")
+    profiling.finish_rerun("Public scoreboard")
     st.stop()
 elif not st.session_state.authenticated:
     # Show login page
     login_page()
+    profiling.checkpoint("page")
+    profiling.finish_rerun("Login")
     st.stop()
 
 # From here on, user is authenticated as admin
+metrics.touch_session("admin")
 # Prompt for horse entry if setup not complete
 if not st.session_state.setup_complete:
     st.title("🏇 Derby Betting System - Setup Horses")
@@ -572,6 +1349,7 @@ if st.session_state.setup_complete and not st.session_state.bettors_setup_comple
     st.title("🏇 Derby Betting System - Setup Bettors")
     st.markdown("---")
     st.info("Great! Horses are set up. Now let's add the bettors for this event.")
+    bettor_names = st.session_state.bet_matrix.bettor_names
     
     # Bettor count selection
     if st.session_state.target_bettor_count == 0:
@@ -582,8 +1360,8 @@ if st.session_state.setup_complete and not st.session_state.bettors_setup_comple
             st.rerun()
         st.stop()
     
-    st.subheader(f"Step 2: Add Bettors ({len(st.session_state.bettors)}/{st.session_state.target_bettor_count})")
-    st.progress(min(len(st.session_state.bettors) / st.session_state.target_bettor_count, 1.0))
+    st.subheader(f"Step 2: Add Bettors ({len(bettor_names)}/{st.session_state.target_bettor_count})")
+    st.progress(min(len(bettor_names) / st.session_state.target_bettor_count, 1.0))
     
     # Add bettor form
     col1, col2 = st.columns([3, 1])
@@ -593,7 +1371,7 @@ if st.session_state.setup_complete and not st.session_state.bettors_setup_comple
         if st.button("Add Bettor", key="main_setup_add_bettor"):
             if not bettor_name:
                 st.error("Bettor name is required.")
-            elif bettor_name in [b['name'] for b in st.session_state.bettors]:
+            elif bettor_name in bettor_names:
                 st.error("Bettor already exists.")
             else:
                 success = db.add_bettor(bettor_name)
@@ -603,20 +1381,20 @@ if st.session_state.setup_complete and not st.session_state.bettors_setup_comple
                 else:
                     st.error("Failed to add bettor. They may already exist.")
     
-    if st.session_state.bettors:
+    if bettor_names:
         st.markdown("### Current Bettors:")
-        for b in st.session_state.bettors:
-            st.write(f"• {b['name']}")
+        for name in bettor_names:
+            st.write(f"• {name}")
         
         st.markdown("---")
         
         # Only show Done button if target count is reached
-        if len(st.session_state.bettors) >= st.session_state.target_bettor_count:
+        if len(bettor_names) >= st.session_state.target_bettor_count:
             if st.button("✅ Done Adding Bettors - Proceed to Dashboard"):
                 db.complete_bettor_setup()
                 st.rerun()
         else:
-            remaining = st.session_state.target_bettor_count - len(st.session_state.bettors)
+            remaining = st.session_state.target_bettor_count - len(bettor_names)
             st.warning(f"Please add {remaining} more bettor(s) to reach your target of {st.session_state.target_bettor_count}.")
         
         if st.button("🔄 Reset Bettors"):
@@ -646,9 +1424,12 @@ page = st.sidebar.selectbox(
     "Choose a page:",
     ["🏠 Dashboard", "🐎 Horse Management", "👥 Manage Bettors", "🏁 Race Management", "📊 Scoreboard", "⚙️ Settings"]
 )
+profiling.checkpoint("sidebar")
 
 if page == "🏠 Dashboard":
     st.header("Dashboard")
+    matrix = st.session_state.bet_matrix
+    bettor_count = len(matrix.bettor_names)
     
     # Key metrics in mobile-friendly layout
     col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
@@ -657,16 +1438,15 @@ if page == "🏠 Dashboard":
         st.metric("Horses", len(st.session_state.horses))
     
     with col2:
-        st.metric("Bettors", len(st.session_state.bettors))
+        st.metric("Bettors", bettor_count)
     
     with col3:
         completed_races = len([r for r in st.session_state.races if 'results' in r])
         st.metric("Races Done", f"{completed_races}/{st.session_state.total_races}")
     
     with col4:
-        if st.session_state.bettors:
-            leader_score = max(st.session_state.scores.values()) if st.session_state.scores else 0
-            st.metric("Top Score", leader_score)
+        if bettor_count:
+            st.metric("Top Score", int(matrix.totals().max()))
         else:
             st.metric("Top Score", 0)
     
@@ -696,7 +1476,7 @@ if page == "🏠 Dashboard":
     st.subheader("Quick Actions")
     
     # Mobile-friendly button layout
-    if len(st.session_state.bettors) > 20:
+    if bettor_count > 20:
         # Large scale - show management-focused actions
         col1, col2 = st.columns(2)
         
@@ -744,27 +1524,29 @@ if page == "🏠 Dashboard":
                         st.write(f"**Race {race['race_number']}**")
                         st.caption(f"🥇 #{race['results']['first']} | 🥈 #{race['results']['second']} | 🥉 #{race['results']['third']}")
                     with col2:
-                        # Show how many bettors got points
-                        bettor_bets = race['results']['bettor_bets']
-                        winners = sum(1 for bet in bettor_bets.values() if bet in [race['results']['first'], race['results']['second'], race['results']['third']])
-                        st.metric("Winners", f"{winners}/{len(bettor_bets)}")
+                        # Show how many bettors picked a placed horse
+                        race_index = matrix.race_index(race['race_number'])
+                        picks = matrix.picks[:, race_index]
+                        podium = matrix.podium[race_index]
+                        winners = int(np.isin(picks, podium[podium != NO_BET]).sum())
+                        st.metric("Winners", f"{winners}/{int((picks != NO_BET).sum())}")
     else:
         st.info("No races completed yet.")
     
     # System status for large-scale events
-    if len(st.session_state.bettors) >= 20:
+    if bettor_count >= 20:
         st.markdown("---")
         st.subheader("📈 System Status")
         
         col1, col2 = st.columns(2)
         with col1:
             st.success("✅ Large-scale event mode active")
-            st.info(f"Managing {len(st.session_state.bettors)} bettors efficiently")
+            st.info(f"Managing {bettor_count} bettors efficiently")
         
         with col2:
             if completed_races > 0:
-                avg_bet_completion = sum(len(r['results']['bettor_bets']) for r in st.session_state.races if 'results' in r) / completed_races
-                st.metric("Avg Participation", f"{avg_bet_completion:.0f}/{len(st.session_state.bettors)}")
+                avg_bet_completion = (matrix.picks[:, matrix.completed] != NO_BET).sum() / completed_races
+                st.metric("Avg Participation", f"{avg_bet_completion:.0f}/{bettor_count}")
             else:
                 st.metric("System Scale", "Enterprise Ready")
 
@@ -811,6 +1593,9 @@ elif page == "🐎 Horse Management":
         st.info("No horses added yet.")
 
 elif page == "👥 Manage Bettors":
+    matrix = st.session_state.bet_matrix
+    bettor_names = matrix.bettor_names
+    
     # Check if we need bettor setup first
     if not st.session_state.bettors_setup_complete:
         st.title("🏇 Derby Betting System - Setup Bettors")
@@ -826,11 +1611,11 @@ elif page == "👥 Manage Bettors":
                 st.rerun()
             st.stop()
         
-        st.subheader(f"Step 2: Add Bettors ({len(st.session_state.bettors)}/{st.session_state.target_bettor_count})")
-        st.progress(min(len(st.session_state.bettors) / st.session_state.target_bettor_count, 1.0))
+        st.subheader(f"Step 2: Add Bettors ({len(bettor_names)}/{st.session_state.target_bettor_count})")
+        st.progress(min(len(bettor_names) / st.session_state.target_bettor_count, 1.0))
         
         # Bulk import section
-        with st.expander("📋 Bulk Import Bettors", expanded=len(st.session_state.bettors) == 0):
+        with st.expander("📋 Bulk Import Bettors", expanded=not bettor_names):
             st.write("**Option 1: Paste Names (One per line)**")
             bulk_names = st.text_area(
                 "Enter bettor names (one per line):",
@@ -844,7 +1629,7 @@ elif page == "👥 Manage Bettors":
                 if st.button("📥 Import Names", type="primary"):
                     if bulk_names.strip():
                         names = [name.strip() for name in bulk_names.strip().split('\n') if name.strip()]
-                        existing_names = [b['name'] for b in st.session_state.bettors]
+                        existing_names = set(bettor_names)
                         
                         added_count = 0
                         errors = []
@@ -896,7 +1681,7 @@ elif page == "👥 Manage Bettors":
                         st.write(f"Found {len(names)} names in file")
                         
                         if st.button("📥 Import from CSV"):
-                            existing_names = [b['name'] for b in st.session_state.bettors]
+                            existing_names = set(bettor_names)
                             added_count = 0
                             
                             for name in names:
@@ -926,7 +1711,7 @@ elif page == "👥 Manage Bettors":
             if st.button("Add Bettor", key="setup_add_bettor"):
                 if not bettor_name:
                     st.error("Bettor name is required.")
-                elif bettor_name in [b['name'] for b in st.session_state.bettors]:
+                elif bettor_name in bettor_names:
                     st.error("Bettor already exists.")
                 else:
                     success = db.add_bettor(bettor_name)
@@ -937,18 +1722,18 @@ elif page == "👥 Manage Bettors":
                         st.error("Failed to add bettor.")
         
         # Current bettors display
-        if st.session_state.bettors:
+        if bettor_names:
             st.markdown("---")
             st.markdown("### Current Bettors:")
             
             # Search functionality
             search_term = st.text_input("🔍 Search bettors:", key="bettor_search")
             
-            # Filter bettors
-            filtered_bettors = st.session_state.bettors
+            # Filter bettors (as matrix rows)
+            filtered_bettors = list(range(len(bettor_names)))
             if search_term:
-                filtered_bettors = [b for b in st.session_state.bettors 
-                                  if search_term.lower() in b['name'].lower()]
+                filtered_bettors = [row for row in filtered_bettors
+                                  if search_term.lower() in bettor_names[row].lower()]
             
             # Pagination
             bettors_per_page = 20
@@ -968,25 +1753,26 @@ elif page == "👥 Manage Bettors":
             cols_per_row = 4
             for i in range(0, len(page_bettors), cols_per_row):
                 cols = st.columns(cols_per_row)
-                for j, bettor in enumerate(page_bettors[i:i+cols_per_row]):
+                for j, row in enumerate(page_bettors[i:i+cols_per_row]):
+                    name = bettor_names[row]
                     with cols[j]:
-                        st.write(f"**{bettor['name']}**")
-                        if st.button(f"❌", key=f"remove_setup_{bettor['name']}", 
-                                   help=f"Remove {bettor['name']}"):
-                            success = db.remove_bettor(bettor['name'])
+                        st.write(f"**{name}**")
+                        if st.button(f"❌", key=f"remove_setup_{name}", 
+                                   help=f"Remove {name}"):
+                            success = db.remove_bettor(name)
                             if success:
                                 st.rerun()
             
             st.markdown("---")
             
             # Completion status
-            if len(st.session_state.bettors) >= st.session_state.target_bettor_count:
-                st.success(f"✅ Target reached! {len(st.session_state.bettors)} bettors added.")
+            if len(bettor_names) >= st.session_state.target_bettor_count:
+                st.success(f"✅ Target reached! {len(bettor_names)} bettors added.")
                 if st.button("✅ Done Adding Bettors - Proceed to Racing", type="primary"):
                     db.complete_bettor_setup()
                     st.rerun()
             else:
-                remaining = st.session_state.target_bettor_count - len(st.session_state.bettors)
+                remaining = st.session_state.target_bettor_count - len(bettor_names)
                 st.info(f"📝 {remaining} more bettor(s) needed to reach target of {st.session_state.target_bettor_count}")
             
             # Management actions
@@ -1003,7 +1789,7 @@ elif page == "👥 Manage Bettors":
             with col2:
                 # Export current bettors
                 if st.button("📤 Export Bettors List"):
-                    bettor_list = '\n'.join([b['name'] for b in st.session_state.bettors])
+                    bettor_list = '\n'.join(bettor_names)
                     st.download_button(
                         label="Download Names",
                         data=bettor_list,
@@ -1016,7 +1802,7 @@ elif page == "👥 Manage Bettors":
     st.header("Manage Bettors")
     
     # Statistics
-    total_bettors = len(st.session_state.bettors)
+    total_bettors = len(bettor_names)
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Total Bettors", total_bettors)
@@ -1042,7 +1828,7 @@ elif page == "👥 Manage Bettors":
             if st.button("Add All", key="bulk_add_btn"):
                 if bulk_add_names.strip():
                     names = [name.strip() for name in bulk_add_names.strip().split('\n') if name.strip()]
-                    existing_names = [b['name'] for b in st.session_state.bettors]
+                    existing_names = set(bettor_names)
                     added_count = 0
                     
                     for name in names:
@@ -1060,12 +1846,12 @@ elif page == "👥 Manage Bettors":
         with col2:
             st.subheader("📤 Export Options")
             if st.button("📋 Copy All Names"):
-                bettor_list = '\n'.join([b['name'] for b in st.session_state.bettors])
+                bettor_list = '\n'.join(bettor_names)
                 st.code(bettor_list, language=None)
             
             if st.button("📊 Download CSV"):
                 import pandas as pd
-                df = pd.DataFrame(st.session_state.bettors)
+                df = pd.DataFrame({"name": bettor_names})
                 csv = df.to_csv(index=False)
                 st.download_button(
                     label="Download Bettors CSV",
@@ -1083,11 +1869,12 @@ elif page == "👥 Manage Bettors":
     with col2:
         show_all = st.checkbox("Show all", value=True, key="show_all_bettors")
     
-    # Filter bettors
-    filtered_bettors = st.session_state.bettors
+    # Filter bettors (as matrix rows)
+    filtered_bettors = list(range(len(bettor_names)))
     if search_term:
-        filtered_bettors = [b for b in st.session_state.bettors 
-                          if search_term.lower() in b['name'].lower()]
+        filtered_bettors = [row for row in filtered_bettors
+                          if search_term.lower() in bettor_names[row].lower()]
+    totals = matrix.totals()
     
     # Pagination for large lists
     bettors_per_page = 25 if show_all else 10
@@ -1123,14 +1910,14 @@ elif page == "👥 Manage Bettors":
                 new_bettor_name = st.text_input("Bettor Name", key="new_bettor_main")
             with col2:
                 if st.button("Add", key="add_new_main"):
-                    if new_bettor_name and new_bettor_name not in [b['name'] for b in st.session_state.bettors]:
+                    if new_bettor_name and new_bettor_name not in bettor_names:
                         success = db.add_bettor(new_bettor_name)
                         if success:
                             st.success(f"Added: {new_bettor_name}")
                             st.rerun()
                         else:
                             st.error("Failed to add bettor")
-                    elif new_bettor_name in [b['name'] for b in st.session_state.bettors]:
+                    elif new_bettor_name in bettor_names:
                         st.error("Bettor already exists!")
                     else:
                         st.error("Please enter a name!")
@@ -1140,45 +1927,36 @@ elif page == "👥 Manage Bettors":
         
         # Table view for better handling of large lists
         if total_filtered > 15:
-            # Create a dataframe for better display
-            bettor_data = []
-            for i, bettor in enumerate(page_bettors):
-                bettor_data.append({
-                    "Name": bettor['name'],
-                    "Score": st.session_state.scores.get(bettor['name'], 0),
-                    "Actions": f"remove_{bettor['name']}"
-                })
-            
             # Display as table
-            for i, bettor in enumerate(page_bettors):
+            for row in page_bettors:
+                name = bettor_names[row]
                 col1, col2, col3 = st.columns([4, 1, 1])
                 with col1:
-                    st.write(f"**{bettor['name']}**")
+                    st.write(f"**{name}**")
                 with col2:
-                    score = st.session_state.scores.get(bettor['name'], 0)
-                    st.write(f"Score: {score}")
+                    st.write(f"Score: {totals[row]}")
                 with col3:
-                    if st.button("❌", key=f"remove_main_{bettor['name']}", 
-                               help=f"Remove {bettor['name']}"):
-                        success = db.remove_bettor(bettor['name'])
+                    if st.button("❌", key=f"remove_main_{name}", 
+                               help=f"Remove {name}"):
+                        success = db.remove_bettor(name)
                         if success:
-                            st.success(f"Removed: {bettor['name']}")
+                            st.success(f"Removed: {name}")
                             st.rerun()
                         else:
-                            st.error(f"Failed to remove: {bettor['name']}")
+                            st.error(f"Failed to remove: {name}")
         else:
             # Grid view for smaller lists
             cols_per_row = 3
             for i in range(0, len(page_bettors), cols_per_row):
                 cols = st.columns(cols_per_row)
-                for j, bettor in enumerate(page_bettors[i:i+cols_per_row]):
+                for j, row in enumerate(page_bettors[i:i+cols_per_row]):
                     if j < len(cols):
+                        name = bettor_names[row]
                         with cols[j]:
-                            st.write(f"**{bettor['name']}**")
-                            score = st.session_state.scores.get(bettor['name'], 0)
-                            st.write(f"Score: {score} pts")
-                            if st.button("Remove", key=f"remove_grid_{bettor['name']}"):
-                                success = db.remove_bettor(bettor['name'])
+                            st.write(f"**{name}**")
+                            st.write(f"Score: {totals[row]} pts")
+                            if st.button("Remove", key=f"remove_grid_{name}"):
+                                success = db.remove_bettor(name)
                                 if success:
                                     st.rerun()
                                 else:
@@ -1186,8 +1964,9 @@ elif page == "👥 Manage Bettors":
 
 elif page == "🏁 Race Management":
     st.header("Race Management")
+    matrix = st.session_state.bet_matrix
     
-    if not st.session_state.bettors:
+    if not matrix.bettor_names:
         st.warning("Please add some bettors first before managing races!")
         st.stop()
     
@@ -1199,7 +1978,7 @@ elif page == "🏁 Race Management":
         completed_races = len([r for r in st.session_state.races if 'results' in r])
         st.metric("Completed Races", f"{completed_races}/{st.session_state.total_races}")
     with col3:
-        st.metric("Total Bettors", len(st.session_state.bettors))
+        st.metric("Total Bettors", len(matrix.bettor_names))
     
     st.subheader(f"Race {st.session_state.current_race}")
     
@@ -1217,45 +1996,39 @@ elif page == "🏁 Race Management":
         st.subheader("Race Results:")
         
         col1, col2, col3 = st.columns(3)
+        matrix = st.session_state.bet_matrix
+        place_points = matrix.scoring.race_points(matrix.race_index(st.session_state.current_race))
         
         with col1:
-            st.info(f"🥇 **1st Place**\n\nHorse #{current_race_data['results']['first']}\n\n*3 points*")
+            st.info(f"🥇 **1st Place**\n\nHorse #{current_race_data['results']['first']}\n\n*{place_points[0]} points*")
         with col2:
-            st.info(f"🥈 **2nd Place**\n\nHorse #{current_race_data['results']['second']}\n\n*2 points*")
+            st.info(f"🥈 **2nd Place**\n\nHorse #{current_race_data['results']['second']}\n\n*{place_points[1]} points*")
         with col3:
-            st.info(f"🥉 **3rd Place**\n\nHorse #{current_race_data['results']['third']}\n\n*1 point*")
+            st.info(f"🥉 **3rd Place**\n\nHorse #{current_race_data['results']['third']}\n\n*{place_points[2]} points*")
+        for combo in matrix.rules['combos']:
+            if combo['races'][-1] == st.session_state.current_race:
+                st.caption(f"🎯 {combo['name']}: +{combo['bonus']} points for picking the winner of races "
+                           f"{', '.join(map(str, combo['races']))}")
         
         # Show betting results summary
         with st.expander("📊 Betting Results Summary", expanded=False):
-            bettor_bets = current_race_data['results']['bettor_bets']
-            
-            # Group bettors by their bets
-            horse_bets = {}
-            for bettor, horse in bettor_bets.items():
-                if horse not in horse_bets:
-                    horse_bets[horse] = []
-                horse_bets[horse].append(bettor)
+            race_idx = matrix.race_index(st.session_state.current_race)
+            race_picks = matrix.picks[:, race_idx]
+            horse_index = {horse_num: i for i, horse_num in enumerate(matrix.horse_numbers)}
+            finish_labels = {"1st": "🥇 1st", "2nd": "🥈 2nd", "3rd": "🥉 3rd"}
             
-            # Display grouped results
-            for horse_num in sorted(horse_bets.keys(), key=lambda x: int(x) if x.isdigit() else float('inf')):
-                bettors_on_horse = horse_bets[horse_num]
-                points = 0
-                position = ""
-                
-                if horse_num == current_race_data['results']['first']:
-                    points = 3
-                    position = "🥇 1st"
-                elif horse_num == current_race_data['results']['second']:
-                    points = 2
-                    position = "🥈 2nd"
-                elif horse_num == current_race_data['results']['third']:
-                    points = 1
-                    position = "🥉 3rd"
+            # Horses with bets, most popular first, from the race analytics
+            for row in race_analytics(matrix).horse_rows(race_idx):
+                if not row['Bets']:
+                    continue
+                horse_num = row['Horse']
+                bettors_on_horse = [matrix.bettor_names[b] for b in np.flatnonzero(race_picks == horse_index[horse_num]).tolist()]
+                popularity = f"{row['Bets']} bets ({row['Share %']}%), pool payout {row['Payout']}x"
                 
-                if points > 0:
-                    st.success(f"**Horse #{horse_num}** ({position}) - {points} points each")
+                if row['Points Each'] > 0:
+                    st.success(f"**Horse #{horse_num}** ({finish_labels[row['Finish']]}) - {row['Points Each']} points each · {popularity}")
                 else:
-                    st.write(f"**Horse #{horse_num}** - 0 points")
+                    st.write(f"**Horse #{horse_num}** - 0 points · {popularity}")
                 
                 # Show bettors in columns
                 if len(bettors_on_horse) > 6:
@@ -1281,50 +2054,23 @@ elif page == "🏁 Race Management":
         horse_numbers = st.session_state.horses
         
         # Race results entry
-        st.subheader("Enter Race Results")
-        st.write("Enter the winning horse numbers for each position:")
-        
-        # Initialize race results for this race
-        first_key = f"first_{st.session_state.current_race}"
-        second_key = f"second_{st.session_state.current_race}"
-        third_key = f"third_{st.session_state.current_race}"
-        
-        # Initialize keys if they don't exist
-        if first_key not in st.session_state:
-            st.session_state[first_key] = ''
-        if second_key not in st.session_state:
-            st.session_state[second_key] = ''
-        if third_key not in st.session_state:
-            st.session_state[third_key] = ''
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.text_input("1st Place Horse #", key=first_key)
-        with col2:
-            st.text_input("2nd Place Horse #", key=second_key)
-        with col3:
-            st.text_input("3rd Place Horse #", key=third_key)
-        
-        # Get current values from session state
-        first_place = st.session_state[first_key]
-        second_place = st.session_state[second_key]
-        third_place = st.session_state[third_key]
-        
-        # Validation for race positions
-        invalid_horses = []
-        for position, horse_num in [("1st", first_place), ("2nd", second_place), ("3rd", third_place)]:
-            if horse_num and horse_num not in horse_numbers:
-                invalid_horses.append(f"{position} place: Horse #{horse_num}")
-        
-        if invalid_horses:
-            st.error(f"Invalid horse numbers entered: {', '.join(invalid_horses)}")
+        race_results_entry(st.session_state.current_race, horse_numbers)
         
         st.markdown("---")
         
         # Bettor bets entry - Enhanced for large numbers
         st.subheader("Enter Bettor Bets")
         
-        bettor_names = [b['name'] for b in st.session_state.bettors]
+        bettor_names = matrix.bettor_names
+        
+        # With multi-operator entry, this session only enters its own partition
+        my_partition = None
+        partitions = {}
+        if db.get_partition_config()['mode'] != 'none':
+            partitions = db.get_partitions()
+            my_partition = operator_partition_picker(st.session_state.current_race, partitions)
+            bettor_names = partitions[my_partition]
+        
         total_bettors = len(bettor_names)
         
         # Show available horses for reference
@@ -1341,9 +2087,7 @@ elif page == "🏁 Race Management":
                     quick_horse = st.selectbox("Select horse for all bettors:", [""] + horse_numbers, key="quick_fill_horse")
                 with col2:
                     if st.button("Fill All") and quick_horse:
-                        for bettor in bettor_names:
-                            bet_key = f"bet_{bettor}_{st.session_state.current_race}"
-                            st.session_state[bet_key] = quick_horse
+                        set_race_bets(st.session_state.current_race, {bettor: quick_horse for bettor in bettor_names})
                         st.success(f"Set all bettors to Horse #{quick_horse}")
                         st.rerun()
             
@@ -1357,32 +2101,8 @@ elif page == "🏁 Race Management":
                 )
                 
                 if st.button("📥 Import Bets") and bulk_bets.strip():
-                    imported_count = 0
-                    errors = []
-                    
-                    for line in bulk_bets.strip().split('\n'):
-                        if ':' in line:
-                            try:
-                                name, horse = line.split(':', 1)
-                                name = name.strip()
-                                horse = horse.strip()
-                                
-                                if name in bettor_names and horse in horse_numbers:
-                                    bet_key = f"bet_{name}_{st.session_state.current_race}"
-                                    st.session_state[bet_key] = horse
-                                    imported_count += 1
-                                else:
-                                    errors.append(f"Invalid: {line}")
-                            except:
-                                errors.append(f"Format error: {line}")
-                    
-                    if imported_count > 0:
-                        st.success(f"Imported {imported_count} bets!")
+                    if import_bets(st.session_state.current_race, parse_paste_bets(bulk_bets), bettor_names, horse_numbers):
                         st.rerun()
-                    if errors:
-                        st.warning(f"Errors with {len(errors)} entries")
-                        for error in errors[:3]:
-                            st.caption(f"• {error}")
             
             with tab3:
                 st.write("**Upload CSV with columns: 'name', 'horse'**")
@@ -1390,217 +2110,31 @@ elif page == "🏁 Race Management":
                 if bet_file is not None:
                     try:
                         import pandas as pd
-                        df = pd.read_csv(bet_file)
-                        
-                        # Find name and horse columns
-                        name_col = next((col for col in df.columns if 'name' in col.lower()), df.columns[0])
-                        horse_col = next((col for col in df.columns if 'horse' in col.lower()), df.columns[1] if len(df.columns) > 1 else df.columns[0])
+                        df = pd.read_csv(bet_file, dtype=str)
+                        parsed_bets = parse_csv_bets(df)
                         
-                        st.write(f"Found {len(df)} entries using columns: {name_col}, {horse_col}")
+                        st.write(f"Found {len(df)} entries")
                         
                         if st.button("📥 Import from CSV"):
-                            imported_count = 0
-                            for _, row in df.iterrows():
-                                name = str(row[name_col]).strip()
-                                horse = str(row[horse_col]).strip()
-                                
-                                if name in bettor_names and horse in horse_numbers:
-                                    bet_key = f"bet_{name}_{st.session_state.current_race}"
-                                    st.session_state[bet_key] = horse
-                                    imported_count += 1
-                            
-                            if imported_count > 0:
-                                st.success(f"Imported {imported_count} bets from CSV!")
+                            if import_bets(st.session_state.current_race, parsed_bets, bettor_names, horse_numbers):
                                 st.rerun()
                     except Exception as e:
                         st.error(f"Error reading CSV: {str(e)}")
-        
-        st.markdown("---")
-        
-        # Individual bet entry with search and pagination
-        st.write("**Individual Bet Entry:**")
-        
-        # Search functionality
-        search_bettor = st.text_input("🔍 Search bettors:", key="race_bettor_search")
-        
-        # Filter bettors
-        if search_bettor:
-            filtered_bettors = [name for name in bettor_names if search_bettor.lower() in name.lower()]
-        else:
-            filtered_bettors = bettor_names
-        
-        # Pagination
-        bets_per_page = 15
-        total_filtered = len(filtered_bettors)
-        
-        if total_filtered > bets_per_page:
-            total_pages = (total_filtered - 1) // bets_per_page + 1
-            page_num = st.selectbox(
-                "Page", 
-                range(1, total_pages + 1), 
-                key="race_bet_page",
-                format_func=lambda x: f"Page {x} of {total_pages}"
-            ) - 1
             
-            start_idx = page_num * bets_per_page
-            end_idx = min(start_idx + bets_per_page, total_filtered)
-            page_bettors = filtered_bettors[start_idx:end_idx]
-            st.caption(f"Showing {start_idx + 1}-{end_idx} of {total_filtered} bettors")
-        else:
-            page_bettors = filtered_bettors
-        
-        # Initialize session state for ALL bettors first (not just current page)
-        for bettor in bettor_names:
-            bet_key = f"bet_{bettor}_{st.session_state.current_race}"
-            if bet_key not in st.session_state:
-                st.session_state[bet_key] = ''
-        
-        # Track validation for current page only
-        invalid_bets = []
-        
-        # Display bets in grid format (3 columns)
-        cols_per_row = 3
-        for i in range(0, len(page_bettors), cols_per_row):
-            cols = st.columns(cols_per_row)
-            for j, bettor in enumerate(page_bettors[i:i+cols_per_row]):
-                if j < len(cols):
-                    with cols[j]:
-                        bet_key = f"bet_{bettor}_{st.session_state.current_race}"
-                        
-                        # Show bettor name and input
-                        st.write(f"**{bettor}**")
-                        
-                        # Use a unique key that includes page info to avoid conflicts
-                        page_key = f"page_input_{bet_key}_{hash(str(page_bettors))}"
-                        
-                        # Get current value from session state
-                        current_value = st.session_state.get(bet_key, '')
-                        
-                        # Create the input widget
-                        entered_bet = st.text_input(
-                            "Horse #:", 
-                            value=current_value,
-                            key=page_key,
-                            placeholder="e.g. 3",
-                            label_visibility="collapsed"
-                        )
-                        
-                        # Update session state if value changed
-                        if entered_bet != current_value:
-                            st.session_state[bet_key] = entered_bet
-                        
-                        # Use the session state value for validation (always current)
-                        bet_value = st.session_state.get(bet_key, '')
-                        
-                        # Validate bet
-                        if bet_value and bet_value not in horse_numbers:
-                            invalid_bets.append(f"{bettor}: Horse #{bet_value}")
-                            st.error("❌ Invalid")
-                        elif bet_value:
-                            st.success("✅ Valid")
-        
-        # Show validation errors
-        if invalid_bets:
-            st.error(f"Invalid horse numbers for bets:")
-            for error in invalid_bets[:5]:  # Show first 5 errors
-                st.write(f"• {error}")
-        
-        # Progress indicator - check all bettors, not just current page
-        all_bettor_bets = {}
-        for bettor in bettor_names:
-            bet_key = f"bet_{bettor}_{st.session_state.current_race}"
-            all_bettor_bets[bettor] = st.session_state.get(bet_key, '')
-        
-        filled_bets = sum(1 for bet in all_bettor_bets.values() if bet.strip())
-        st.progress(min(filled_bets / len(bettor_names), 1.0))
-        st.caption(f"Bets entered: {filled_bets}/{len(bettor_names)}")
+            show_bet_import_report(st.session_state.current_race)
         
         st.markdown("---")
         
-        # Results preview and submission
-        all_positions_filled = first_place and second_place and third_place
-        all_bets_filled = all(all_bettor_bets.get(b, '') for b in bettor_names)
-        unique_positions = len(set([first_place, second_place, third_place])) == 3 if all_positions_filled else False
-        valid_horses_positions = not invalid_horses
-        valid_horses_bets = not invalid_bets
-        
-        # Check if all validations pass
-        can_submit = (all_positions_filled and all_bets_filled and unique_positions and 
-                     valid_horses_positions and valid_horses_bets)
-        
-        # Quick validation summary
-        validation_status = []
-        if not all_positions_filled:
-            validation_status.append("❌ Race positions incomplete")
-        else:
-            validation_status.append("✅ Race positions filled")
-            
-        if not all_bets_filled:
-            validation_status.append(f"❌ Bets missing ({filled_bets}/{len(bettor_names)})")
-        else:
-            validation_status.append("✅ All bets entered")
-            
-        if all_positions_filled and not unique_positions:
-            validation_status.append("❌ Duplicate positions")
-        elif all_positions_filled:
-            validation_status.append("✅ Unique positions")
-            
-        # Show validation status
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            for status in validation_status:
-                st.write(status)
+        bet_entry_grid(st.session_state.current_race, bettor_names, horse_numbers, partition=my_partition)
+        draft_autosave()
         
-        with col2:
-            if st.button("✅ Submit Results", type="primary", disabled=not can_submit):
-                # Submit race results using database
-                success = db.submit_race_results(
-                    st.session_state.current_race,
-                    first_place,
-                    second_place,
-                    third_place,
-                    all_bettor_bets
-                )
-                
-                if success:
-                    # Clear all input fields for this race
-                    for key in [first_key, second_key, third_key]:
-                        if key in st.session_state:
-                            del st.session_state[key]
-                    for bettor in bettor_names:
-                        bet_key = f"bet_{bettor}_{st.session_state.current_race}"
-                        if bet_key in st.session_state:
-                            del st.session_state[bet_key]
-                    
-                    st.success("Race results submitted successfully!")
-                    st.balloons()
-                    st.rerun()
-                else:
-                    st.error("Failed to submit race results. Please try again.")
-        
-        # Export current bets for backup
-        if filled_bets > 0:
-            with st.expander("📤 Export Current Bets", expanded=False):
-                export_format = st.radio("Export format:", ["Text", "CSV"], horizontal=True)
-                
-                if export_format == "Text":
-                    bet_text = '\n'.join([f"{bettor}:{bet}" for bettor, bet in all_bettor_bets.items() if bet])
-                    st.download_button(
-                        label="Download Bet List",
-                        data=bet_text,
-                        file_name=f"race_{st.session_state.current_race}_bets.txt",
-                        mime="text/plain"
-                    )
-                else:
-                    import pandas as pd
-                    bet_df = pd.DataFrame([{"name": bettor, "horse": bet} for bettor, bet in all_bettor_bets.items() if bet])
-                    csv = bet_df.to_csv(index=False)
-                    st.download_button(
-                        label="Download CSV",
-                        data=csv,
-                        file_name=f"race_{st.session_state.current_race}_bets.csv",
-                        mime="text/csv"
-                    )
+        if my_partition is not None:
+            st.markdown("---")
+            partition_progress(st.session_state.current_race, partitions, horse_numbers)
+    
+    st.markdown("---")
+    display_result_correction()
+    display_horse_popularity()
 
 elif page == "📊 Scoreboard":
     st.header("Scoreboard")
@@ -1653,6 +2187,177 @@ elif page == "⚙️ Settings":
     
     st.markdown("---")
     
+    # Scoring rules
+    st.subheader("🎯 Scoring Rules")
+    scoring_rules = db.db.get_scoring_rules()
+    for line in describe_rules(scoring_rules):
+        st.caption(line)
+    
+    format_options = list(PRESET_RULES) + ["Custom"]
+    current_format = next((name for name, preset in PRESET_RULES.items()
+                           if preset['place_points'] == scoring_rules['place_points']), "Custom")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        points_format = st.selectbox("Points format", format_options,
+                                     index=format_options.index(current_format), key="points_format")
+    with col2:
+        if points_format == "Custom":
+            point_cols = st.columns(3)
+            place_points = [
+                point_cols[place].number_input(label, min_value=0, max_value=100,
+                                               value=scoring_rules['place_points'][place], step=1)
+                for place, label in enumerate(["1st place", "2nd place", "3rd place"])
+            ]
+        else:
+            place_points = PRESET_RULES[points_format]['place_points']
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        bonus_races = st.multiselect(
+            "Bonus races",
+            list(range(1, st.session_state.total_races + 1)),
+            default=[race for race in scoring_rules['race_multipliers'] if race <= st.session_state.total_races],
+            help="Every point in these races is multiplied",
+            key="bonus_races"
+        )
+    with col2:
+        bonus_multiplier = st.number_input("Bonus multiplier", min_value=2, max_value=10,
+                                           value=max(scoring_rules['race_multipliers'].values(), default=2), step=1)
+    
+    combo_text = st.text_area(
+        "Combos (Format: Name:Races:Bonus)",
+        value='\n'.join(f"{combo['name']}:{','.join(map(str, combo['races']))}:{combo['bonus']}"
+                        for combo in scoring_rules['combos']),
+        placeholder="Daily Double:9,10:5\nPick 3:4,5,6:10",
+        help="Bettors who pick the winner of every race in a combo get its bonus after the last of them",
+        key="scoring_combos"
+    )
+    
+    if st.button("Save Scoring Rules"):
+        try:
+            combos = []
+            for line in combo_text.strip().split('\n'):
+                if line.strip():
+                    name, races, bonus = line.rsplit(':', 2)
+                    combos.append({"name": name.strip(), "races": [int(race) for race in races.split(',')],
+                                   "bonus": int(bonus)})
+        except ValueError:
+            st.error("Each combo needs a name, comma-separated race numbers and a bonus, e.g. Daily Double:9,10:5")
+        else:
+            new_rules = {
+                "place_points": place_points,
+                "race_multipliers": {race: bonus_multiplier for race in bonus_races},
+                "combos": combos
+            }
+            if db.set_scoring_rules(new_rules):
+                st.success("Scoring rules saved and every race rescored!")
+                st.rerun()
+            else:
+                st.error("Invalid scoring rules")
+    
+    st.markdown("---")
+    
+    # Multi-operator entry
+    st.subheader("👥 Multi-Operator Bet Entry")
+    st.write("Split the bettor list so several organizers can enter the current race's bets at the same time.")
+    
+    partition_config = db.get_partition_config()
+    mode_options = list(PARTITION_MODES)
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        partition_mode = st.selectbox(
+            "Split bettors",
+            mode_options,
+            index=mode_options.index(partition_config['mode']),
+            format_func=lambda m: PARTITION_MODES[m],
+            key="partition_mode"
+        )
+    with col2:
+        partition_count = partition_config['count']
+        partition_page_size = partition_config['page_size']
+        if partition_mode == "name_range":
+            partition_count = st.number_input("Number of operators", min_value=2, max_value=20,
+                                              value=max(2, partition_count), step=1)
+        elif partition_mode == "page":
+            partition_page_size = st.number_input("Bettors per page", min_value=10, max_value=5000,
+                                                  value=partition_page_size, step=10)
+    
+    if partition_mode == "explicit":
+        current_assignments = db.get_bettor_partitions()
+        assignment_text = st.text_area(
+            "Assignments (Format: Bettor Name:Operator or Group)",
+            value='\n'.join(f"{name}:{group}" for name, group in current_assignments.items()),
+            placeholder="John Smith:Table A\nJane Doe:Table B\n...",
+            help="Bettors without an assignment go to an 'Unassigned' partition",
+            key="partition_assignments"
+        )
+    
+    if st.button("Save Operator Split"):
+        if partition_mode == "explicit":
+            assignments = {}
+            for line in assignment_text.strip().split('\n'):
+                if ':' in line:
+                    name, group = line.rsplit(':', 1)
+                    assignments[name.strip()] = group.strip()
+            db.set_bettor_partitions(assignments)
+        db.set_partition_config(partition_mode, int(partition_count), int(partition_page_size))
+        st.success(f"Operator split saved: {PARTITION_MODES[partition_mode]}")
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # SQLite performance profile
+    st.subheader("🗄️ Database Performance")
+    profile_names = list(PERFORMANCE_PROFILES)
+    env_profile = os.environ.get("DERBY_SQLITE_PROFILE")
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        sqlite_profile = st.selectbox(
+            "SQLite performance profile",
+            profile_names,
+            index=profile_names.index(db.db.performance_profile),
+            format_func=lambda name: f"{name} - {PERFORMANCE_PROFILES[name]['description']}",
+            disabled=bool(env_profile),
+            key="sqlite_profile"
+        )
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)  # Add spacing
+        if st.button("Apply Profile", disabled=bool(env_profile)):
+            if db.set_sqlite_profile(sqlite_profile):
+                st.success(f"Using the {sqlite_profile} profile")
+            else:
+                st.error("Failed to switch profile.")
+    if env_profile:
+        st.caption(f"Set by DERBY_SQLITE_PROFILE={env_profile}")
+    profile_settings = PERFORMANCE_PROFILES[db.db.performance_profile]
+    st.caption(f"Journal mode {db.db.get_journal_mode().upper()} · synchronous {profile_settings['synchronous']} · "
+               f"cache {abs(profile_settings['cache_size']) // 1000} MB · mmap {profile_settings['mmap_size'] // (1024 * 1024)} MB · "
+               f"temp store {profile_settings['temp_store']} · busy timeout {profile_settings['busy_timeout_ms'] // 1000}s")
+    
+    storage_modes = list(BET_STORAGE_MODES)
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        bet_storage = st.selectbox(
+            "Bet storage",
+            storage_modes,
+            index=storage_modes.index(db.db.bet_storage),
+            format_func=lambda mode: {"rows": "rows - one row per bet",
+                                      "packed": "packed - one blob per race, for 100k+ bettors"}[mode],
+            key="bet_storage"
+        )
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)  # Add spacing
+        if st.button("Convert Bets"):
+            if db.set_bet_storage(bet_storage):
+                st.success(f"Bets are stored as {bet_storage}")
+            else:
+                st.error("Failed to convert bets.")
+    storage_stats = db.db.get_bet_storage_stats()
+    st.caption(f"{storage_stats['bet_rows']:,} bet rows · {storage_stats['packed_races']} packed races "
+               f"({storage_stats['packed_bytes'] / 1024:,.0f} KB)")
+    
+    st.markdown("---")
+    
     st.subheader("Data Management")
     
     col1, col2, col3 = st.columns(3)
@@ -1697,6 +2402,121 @@ elif page == "⚙️ Settings":
     
     st.markdown("---")
     
+    # Rerun profiling
+    st.subheader("⏱️ Performance Profiling")
+    st.write("Time the sections of every rerun and every database call to see where a slow page spends its time.")
+    
+    profiling_enabled = st.toggle("Profile reruns", value=profiling.is_enabled(), key="profiling_enabled")
+    if profiling_enabled != profiling.is_enabled():
+        db.set_profiling_enabled(profiling_enabled)
+        st.rerun()
+    
+    profile_records = profiling.get_history()
+    if profile_records:
+        rerun_count = st.slider("Reruns to analyze", min_value=1, max_value=len(profile_records),
+                                value=min(20, len(profile_records)), key="profiling_rerun_count")
+        recent = profile_records[-rerun_count:]
+        
+        st.write("**Recent reruns:**")
+        st.dataframe(
+            pd.DataFrame([{
+                'Started': r['started_at'],
+                'Page': r['label'],
+                'Total (ms)': round(r['total_ms'], 1),
+                'DB calls': sum(s['calls'] for name, s in r['sections'].items() if name.startswith('db.')),
+                'DB (ms)': round(sum(s['ms'] for name, s in r['sections'].items() if name.startswith('db.')), 1),
+                'Queries': r['sections'].get('sql', {}).get('calls', 0)
+            } for r in reversed(recent)]),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        st.write("**Breakdown by section:**")
+        st.caption("Sections overlap: functions and database calls are also counted in the page section that ran them.")
+        breakdown = pd.DataFrame(profiling.summarize(recent))
+        breakdown = breakdown.rename(columns={
+            'section': 'Section', 'calls': 'Calls', 'reruns': 'Reruns',
+            'ms': 'Total (ms)', 'ms_per_rerun': 'Per rerun (ms)'
+        })[['Section', 'Calls', 'Reruns', 'Total (ms)', 'Per rerun (ms)']]
+        st.dataframe(breakdown.round(1), use_container_width=True, hide_index=True)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button(
+                label="📥 Download Profile (JSON)",
+                data=json.dumps(profiling.export_profiles(rerun_count), indent=2),
+                file_name=f"derby_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json"
+            )
+        with col2:
+            if st.button("💾 Save Profile on Server"):
+                dump_path = os.path.join(os.path.dirname(os.path.abspath(db.db.db_path)),
+                                         f"derby_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+                if profiling.dump_profiles(dump_path, rerun_count):
+                    st.success(f"Saved to {dump_path}")
+                else:
+                    st.error("Failed to save the profile.")
+        with col3:
+            if st.button("🗑️ Clear Profile History"):
+                profiling.clear_history()
+                st.rerun()
+    elif profiling.is_enabled():
+        st.info("No reruns recorded yet - use the app and come back here.")
+    
+    # SQL tracing
+    st.write("**🔎 SQL Query Tracing**")
+    st.caption("Record every statement the database runs, grouped by the method that issued it. "
+               "With profiling on, the Queries column above counts statements per rerun.")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        trace_enabled = st.toggle("Trace SQL queries", value=query_trace.is_enabled(), key="query_trace_enabled")
+    with col2:
+        slow_query_ms = st.number_input("Slow query threshold (ms)", min_value=1.0, max_value=10000.0,
+                                        value=query_trace.get_slow_query_ms(), step=10.0, key="slow_query_ms")
+    if trace_enabled != query_trace.is_enabled() or slow_query_ms != query_trace.get_slow_query_ms():
+        db.set_query_tracing(trace_enabled, slow_query_ms)
+        st.rerun()
+    
+    method_stats = query_trace.get_method_stats()
+    if method_stats:
+        st.write("**Queries by method:**")
+        st.dataframe(
+            pd.DataFrame(method_stats).rename(columns={
+                'method': 'Method', 'queries': 'Queries', 'sqlite_statements': 'SQLite statements',
+                'total_ms': 'Total (ms)', 'rows': 'Rows'
+            })[['Method', 'Queries', 'SQLite statements', 'Total (ms)', 'Rows']].round(1),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        with st.expander("Slowest statements"):
+            statement_stats = pd.DataFrame(query_trace.get_statement_stats()[:50])
+            statement_stats['mean_ms'] = statement_stats['total_ms'] / statement_stats['calls']
+            st.dataframe(
+                statement_stats.rename(columns={
+                    'method': 'Method', 'statement': 'Statement', 'calls': 'Calls', 'total_ms': 'Total (ms)',
+                    'mean_ms': 'Mean (ms)', 'max_ms': 'Max (ms)', 'rows': 'Rows'
+                })[['Method', 'Statement', 'Calls', 'Total (ms)', 'Mean (ms)', 'Max (ms)', 'Rows']].round(2),
+                use_container_width=True,
+                hide_index=True
+            )
+        
+        slow_queries = query_trace.get_recent_slow_queries()
+        with st.expander(f"Slow queries ({len(slow_queries)})"):
+            st.caption(f"Also appended to {os.path.abspath(query_trace.get_slow_query_log())}")
+            if slow_queries:
+                st.dataframe(pd.DataFrame(slow_queries), use_container_width=True, hide_index=True)
+            else:
+                st.write(f"No statements slower than {query_trace.get_slow_query_ms():g} ms yet.")
+        
+        if st.button("🗑️ Reset Query Statistics"):
+            query_trace.reset_stats()
+            st.rerun()
+    elif query_trace.is_enabled():
+        st.info("No queries traced yet.")
+    
+    st.markdown("---")
+    
     st.subheader("System Information")
     stats = db.get_stats()
     
@@ -1712,7 +2532,7 @@ elif page == "⚙️ Settings":
     with col2:
         st.write(f"**Target Horse Count:** {st.session_state.target_horse_count}")
         st.write(f"**Target Bettor Count:** {st.session_state.target_bettor_count}")
-        st.write(f"**Database:** derby_betting.db")
+        st.write(f"**Database:** {db.db.db_path}")
         
         # System scale indicator
         if stats['total_bettors'] >= 40:
@@ -1783,6 +2603,9 @@ elif page == "⚙️ Settings":
     if stats['total_bettors'] >= 40:
         st.success("🎉 **Ready for large-scale derby events!**")
 
+profiling.checkpoint("page")
+
 # Footer
 st.markdown("---")
-st.markdown("🏇 Derby Betting System - Built with Streamlit + Database") 
\ No newline at end of file
+st.markdown("🏇 Derby Betting System - Built with Streamlit + Database")
+profiling.finish_rerun(page) 
\ No newline at end of file
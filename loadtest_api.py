@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Load test for the bet submission API (bet_api.py).
+
+Many asyncio clients, each on one kept-alive connection, post bets for the
+current race at the same time, the way phones and tablets would on event
+night. Bettors are split between the clients, so the last bet each client
+sent for a bettor is the one that must be stored. Every request carries an
+Idempotency-Key, and a share of them are sent twice to check that retries
+get the first answer back.
+
+By default a synthetic event is generated and the API is started in this
+process. The stored bets are then checked against what was sent:
+
+    python loadtest_api.py --bettors 5000 --clients 32 --batch 1 --rounds 3
+
+Pass --url to load an API that is already running instead (no stored bet
+check). Request latency percentiles and throughput are printed and written
+as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import bet_api
+from database import DerbyDatabase
+from synthetic_event import generate_event
+from write_queue import BetWriteQueue
+
+class ApiClient:
+    """One kept-alive HTTP/1.1 connection to the API."""
+
+    def __init__(self, host: str, port: int, token: Optional[str]):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, payload: Optional[Dict] = None,
+                      key: Optional[str] = None) -> Tuple[int, Dict]:
+        """Send one request and read its JSON response, reconnecting if the server closed the connection."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(body)}",
+                   "Content-Type: application/json"]
+        if key:
+            headers.append(f"Idempotency-Key: {key}")
+        if self.token:
+            headers.append(f"Authorization: Bearer {self.token}")
+        self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+        length, keep_alive = 0, True
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == "content-length":
+                length = int(value)
+            elif name.strip().lower() == "connection":
+                keep_alive = value.strip().lower() != "close"
+        response = json.loads(await self.reader.readexactly(length)) if length else {}
+        if not keep_alive:
+            self.close()
+        return status, response
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+async def run_client(client: ApiClient, race: int, bettors: List[str], horses: List[str],
+                     args, seed: int) -> Tuple[List[float], Dict[str, str], List[str], Dict[str, int]]:
+    """Post every round of bets for this client's bettors; returns latencies, last bets, errors and counts."""
+    rng = random.Random(seed)
+    latencies, errors = [], []
+    counts = {'requests': 0, 'bets': 0, 'retries': 0}
+    expected: Dict[str, str] = {}
+    for _ in range(args.rounds):
+        for start in range(0, len(bettors), args.batch):
+            bets = [{"bettor": name, "horse": rng.choice(horses)} for name in bettors[start:start + args.batch]]
+            payload = {"race": race, "bets": bets} if args.batch > 1 else {"race": race, **bets[0]}
+            key = uuid.uuid4().hex
+            sent = time.perf_counter()
+            try:
+                status, response = await client.request("POST", "/bets", payload, key)
+                latencies.append(time.perf_counter() - sent)
+                counts['requests'] += 1
+                if status != 200 or response.get('rejected'):
+                    errors.append(f"HTTP {status}: {response}")
+                    continue
+                counts['bets'] += response['accepted']
+                expected.update((bet["bettor"], bet["horse"]) for bet in bets)
+
+                if rng.random() < args.retry_rate:
+                    # A phone that lost the response sends the same request again
+                    retry_status, retry_response = await client.request("POST", "/bets", payload, key)
+                    counts['retries'] += 1
+                    if (retry_status, retry_response) != (status, response):
+                        errors.append(f"Retry answered differently: HTTP {retry_status}: {retry_response}")
+            except (ConnectionError, OSError, ValueError) as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                client.close()
+    client.close()
+    return latencies, expected, errors, counts
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+async def run_load(host: str, port: int, args) -> Tuple[int, float, List[float], Dict[str, str], List[str], Dict[str, int]]:
+    """Run every client at once against the API."""
+    probe = ApiClient(host, port, args.token)
+    status, race_info = await probe.request("GET", "/race")
+    probe.close()
+    if status != 200:
+        raise RuntimeError(f"GET /race failed with HTTP {status}: {race_info}")
+    race, horses = race_info['race'], race_info['horses']
+    names = args.bettor_names
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        run_client(ApiClient(host, port, args.token), race, names[i::args.clients], horses, args, args.seed + i)
+        for i in range(args.clients)
+    ])
+    wall_time = time.perf_counter() - start
+
+    latencies, expected, errors = [], {}, []
+    counts = {'requests': 0, 'bets': 0, 'retries': 0}
+    for client_latencies, client_expected, client_errors, client_counts in results:
+        latencies.extend(client_latencies)
+        expected.update(client_expected)
+        errors.extend(client_errors)
+        for name, count in client_counts.items():
+            counts[name] += count
+    return race, wall_time, latencies, expected, errors, counts
+
+def main():
+    """Run the bet API load test."""
+    parser = argparse.ArgumentParser(description="Derby Betting System bet API load test")
+    parser.add_argument("--url", help="Load a running API (e.g. http://127.0.0.1:8765) instead of a generated event")
+    parser.add_argument("--token", default=os.environ.get("DERBY_API_TOKEN"))
+    parser.add_argument("--bettors", type=int, default=5000, help="Bettors in the generated event")
+    parser.add_argument("--horses", type=int, default=12)
+    parser.add_argument("--completed-races", type=int, default=3)
+    parser.add_argument("--target", choices=bet_api.API_TARGETS, default=bet_api.DEFAULT_API_TARGET)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent connections")
+    parser.add_argument("--batch", type=int, default=1, help="Bets per request (1 sends single bets)")
+    parser.add_argument("--rounds", type=int, default=3, help="Bets per bettor, each replacing the last")
+    parser.add_argument("--retry-rate", type=float, default=0.05, help="Share of requests sent twice with the same key")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="loadtest_api_results.json")
+    args = parser.parse_args()
+
+    print("🏇 Derby Betting System - Bet API Load Test")
+    print("=" * 50)
+
+    workdir, db, writes = None, None, None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+        # Bettor names come from the API's own database
+        args.bettor_names = [b['name'] for b in DerbyDatabase().get_all_bettors()]
+    else:
+        workdir = tempfile.mkdtemp(prefix="derby_loadtest_api_")
+        db = DerbyDatabase(os.path.join(workdir, "derby_betting.db"))
+        generate_event(db, horses=args.horses, bettors=args.bettors, races=args.completed_races + 1,
+                       completed_races=args.completed_races, seed=args.seed)
+        args.bettor_names = [b['name'] for b in db.get_all_bettors()]
+        draft = args.target == "draft"
+        writes = BetWriteQueue(db, draft=draft, operator=bet_api.API_OPERATOR if draft else None)
+        url = urlparse(bet_api.start_in_thread(db, writes, "127.0.0.1", 0, args.token))
+        host, port = url.hostname, url.port
+        print(f"Event: {args.bettors} bettors, {args.horses} horses, writing to {args.target}")
+    print(f"Clients: {args.clients}, {args.batch} bet(s) per request, {args.rounds} round(s)\n")
+
+    try:
+        race, wall_time, latencies, expected, errors, counts = asyncio.run(run_load(host, port, args))
+        if db is not None:
+            stored = db.get_draft_bets(race) if args.target == "draft" else db.get_race_bets(race)
+            wrong = [name for name, horse in expected.items() if stored.get(name) != horse]
+            if wrong or len(stored) != len(expected):
+                errors.append(f"Stored bets differ from the last bets sent for {len(wrong)} bettor(s); "
+                              f"{len(stored)} stored, {len(expected)} expected")
+            print(f"Stored bets checked: {len(stored)} bettors in race {race}, "
+                  f"{writes.batches} commits for {writes.written} writes")
+    finally:
+        if writes is not None:
+            writes.close()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    del args.bettor_names
+    summary = {
+        'requests': counts['requests'],
+        'bets': counts['bets'],
+        'retries': counts['retries'],
+        'requests_per_second': counts['requests'] / wall_time,
+        'bets_per_second': counts['bets'] / wall_time,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p90_ms': percentile(latencies, 90) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'max_ms': max(latencies) * 1000 if latencies else None
+    }
+    print(f"{counts['requests']} requests ({counts['retries']} retried) in {wall_time:.2f}s: "
+          f"{summary['requests_per_second']:.0f} requests/s, {summary['bets_per_second']:.0f} bets/s")
+    if latencies:
+        print(f"Latency p50 {summary['p50_ms']:.1f}ms, p90 {summary['p90_ms']:.1f}ms, "
+              f"p99 {summary['p99_ms']:.1f}ms, max {summary['max_ms']:.1f}ms")
+
+    if errors:
+        print(f"\n⚠️  {len(errors)} error(s):")
+        for error in errors[:10]:
+            print(f"   • {error}")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'parameters': vars(args),
+            'wall_seconds': wall_time,
+            'summary': summary,
+            'errors': errors
+        }, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+    return not errors
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
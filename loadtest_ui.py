@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Headless UI load test for the Derby Betting System.
+
+Drives derby_betting_system.py through its real flows with Streamlit's
+AppTest, from many simulated sessions at once (one process each), against a
+shared synthetic event database:
+
+- viewers: public scoreboard, name search, refresh
+- admins: login, scoreboard, race management, pasted bet entry, race
+  results entry and submission (then on to the next race)
+
+Every rerun is timed and the SQLite statements it issued are counted.
+Per-step latency percentiles and queries per rerun are printed and written
+as JSON:
+
+    python loadtest_ui.py --bettors 500 --viewers 8 --admins 2 --iterations 3
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from streamlit.testing.v1 import AppTest
+
+from database import DerbyDatabase
+from synthetic_event import generate_event, generate_race_bets
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "derby_betting_system.py")
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "derby2024"
+
+class QueryCounter:
+    """Counts SQLite statements issued through DerbyDatabase connections.
+
+    Each simulated session runs in its own process, so the count belongs to
+    that session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def install(self):
+        """Start counting statements on every new DerbyDatabase connection.
+
+        The count shares the connection's trace callback with query tracing
+        and metrics rather than replacing theirs.
+        """
+        DerbyDatabase.statement_listeners.append(self._count_statement)
+
+    def _count_statement(self, _statement):
+        # Reruns execute on AppTest's script thread
+        with self._lock:
+            self.count += 1
+
+class SimulatedSession:
+    """One browser session driving the app, recording every rerun."""
+
+    def __init__(self, role: str, index: int, timeout: float):
+        self.role = role
+        self.index = index
+        self.counter = QueryCounter()
+        self.counter.install()
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.samples = []
+        self.errors = []
+
+    def step(self, name: str, action):
+        """Run one interaction (which reruns the script) and record it."""
+        queries_before = self.counter.count
+        start = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            self.errors.append(f"{self.role}#{self.index} {name}: {e}")
+            return False
+        elapsed = time.perf_counter() - start
+        self.samples.append({
+            'role': self.role,
+            'step': name,
+            'seconds': elapsed,
+            'queries': self.counter.count - queries_before
+        })
+        if self.app.exception:
+            self.errors.append(f"{self.role}#{self.index} {name}: {self.app.exception[0].message}")
+            return False
+        return True
+
+    def button(self, label: str):
+        """Find a button by its label."""
+        return next(b for b in self.app.button if b.label == label)
+
+def run_viewer(session: SimulatedSession, iterations: int, bettor_names: List[str], seed: int):
+    """Public viewer: open the scoreboard, search for names, refresh."""
+    app = session.app
+    rng = random.Random(seed)
+    session.step("open_app", app.run)
+    session.step("viewer_scoreboard", lambda: session.button("📊 View Scoreboard").click().run())
+    for _ in range(iterations):
+        name = rng.choice(bettor_names)
+        session.step("viewer_search", lambda: app.text_input(key="simple_search").input(name).run())
+        session.step("viewer_refresh", lambda: session.button("🔄 Refresh Scoreboard").click().run())
+
+def run_admin(session: SimulatedSession, iterations: int, horses: int, bettor_count: int, seed: int):
+    """Organizer: log in, check the scoreboard, enter bets and results, submit."""
+    app = session.app
+    session.step("open_app", app.run)
+
+    def login():
+        app.text_input[0].input(ADMIN_USERNAME)
+        app.text_input[1].input(ADMIN_PASSWORD)
+        session.button("🔑 Login").click().run()
+
+    if not session.step("login", login):
+        return
+
+    for iteration in range(iterations):
+        session.step("admin_scoreboard", lambda: app.sidebar.selectbox[0].select("📊 Scoreboard").run())
+        session.step("race_management", lambda: app.sidebar.selectbox[0].select("🏁 Race Management").run())
+
+        # Another admin may have finished this race already
+        if any(b.label == "🏁 Next Race" for b in app.button):
+            session.step("next_race", lambda: session.button("🏁 Next Race").click().run())
+            continue
+        if not any(b.label == "✅ Submit Results" for b in app.button):
+            continue  # All races done
+
+        race_number = app.session_state['current_race']
+        bets = generate_race_bets(bettor_count, horses, seed=seed + iteration)
+        paste_text = '\n'.join(f"{name}:{horse}" for name, horse in bets.items())
+
+        def enter_bets():
+            app.text_area(key="bulk_bet_input").input(paste_text)
+            session.button("📥 Import Bets").click().run()
+
+        session.step("bet_entry", enter_bets)
+        for position, horse in [("first", "1"), ("second", "2"), ("third", "3")]:
+            key = f"{position}_{race_number}"
+            session.step("results_entry", lambda: app.text_input(key=key).input(horse).run())
+
+        submit = session.button("✅ Submit Results")
+        if not submit.disabled:
+            session.step("submit_race", lambda: submit.click().run())
+
+def run_session(role: str, index: int, args, bettor_names: List[str]) -> Tuple[List[Dict], List[str]]:
+    """Run one simulated session to completion in a worker process.
+
+    AppTest installs a process-wide mock runtime for every run, so sessions
+    cannot share a process.
+    """
+    session = SimulatedSession(role, index, args.timeout)
+    if role == "viewer":
+        run_viewer(session, args.iterations, bettor_names, args.seed + index)
+    else:
+        run_admin(session, args.iterations, args.horses, args.bettors, args.seed + 1000 * index)
+    return session.samples, session.errors
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+def summarize(samples: List[Dict]) -> List[Dict]:
+    """Latency percentiles and queries per rerun for each step."""
+    by_step = defaultdict(list)
+    for sample in samples:
+        by_step[(sample['role'], sample['step'])].append(sample)
+
+    summary = []
+    for (role, step), step_samples in by_step.items():
+        seconds = [s['seconds'] for s in step_samples]
+        queries = [s['queries'] for s in step_samples]
+        summary.append({
+            'role': role,
+            'step': step,
+            'reruns': len(step_samples),
+            'p50_ms': percentile(seconds, 50) * 1000,
+            'p90_ms': percentile(seconds, 90) * 1000,
+            'p95_ms': percentile(seconds, 95) * 1000,
+            'p99_ms': percentile(seconds, 99) * 1000,
+            'max_ms': max(seconds) * 1000,
+            'queries_per_rerun': sum(queries) / len(queries)
+        })
+    return summary
+
+def main():
+    """Run the UI load test."""
+    parser = argparse.ArgumentParser(description="Derby Betting System headless UI load test")
+    parser.add_argument("--bettors", type=int, default=500)
+    parser.add_argument("--horses", type=int, default=12)
+    parser.add_argument("--completed-races", type=int, default=3)
+    parser.add_argument("--viewers", type=int, default=8, help="Concurrent public scoreboard sessions")
+    parser.add_argument("--admins", type=int, default=2, help="Concurrent organizer sessions")
+    parser.add_argument("--iterations", type=int, default=3, help="Flow repetitions per session")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per rerun")
+    parser.add_argument("--output", default="loadtest_results.json")
+    args = parser.parse_args()
+
+    print("🏇 Derby Betting System - UI Load Test")
+    print("=" * 50)
+
+    workdir = tempfile.mkdtemp(prefix="derby_loadtest_")
+    db_path = os.path.join(workdir, "derby_betting.db")
+    os.environ["DERBY_DB_PATH"] = db_path
+    generate_event(DerbyDatabase(db_path), horses=args.horses, bettors=args.bettors,
+                   races=args.completed_races + args.iterations + 1,
+                   completed_races=args.completed_races, seed=args.seed)
+    bettor_names = [b['name'] for b in DerbyDatabase(db_path).get_all_bettors()]
+    print(f"Event: {args.bettors} bettors, {args.horses} horses, {args.completed_races} completed races")
+    print(f"Sessions: {args.viewers} viewers, {args.admins} admins, {args.iterations} iterations each\n")
+
+    roles = [("viewer", i) for i in range(args.viewers)] + [("admin", i) for i in range(args.admins)]
+    samples, errors = [], []
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=len(roles)) as pool:
+            futures = [pool.submit(run_session, role, index, args, bettor_names) for role, index in roles]
+            for future in futures:
+                session_samples, session_errors = future.result()
+                samples.extend(session_samples)
+                errors.extend(session_errors)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    wall_time = time.perf_counter() - start
+
+    summary = summarize(samples)
+
+    print(f"{'role':<7} {'step':<18} {'reruns':>6} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+    for row in summary:
+        print(f"{row['role']:<7} {row['step']:<18} {row['reruns']:>6} "
+              f"{row['p50_ms']:>7.0f}ms {row['p90_ms']:>7.0f}ms {row['p95_ms']:>7.0f}ms "
+              f"{row['p99_ms']:>7.0f}ms {row['queries_per_rerun']:>8.1f}")
+    print(f"\n{len(samples)} reruns in {wall_time:.1f}s ({len(samples) / wall_time:.1f} reruns/s)")
+
+    if errors:
+        print(f"\n⚠️  {len(errors)} error(s):")
+        for error in errors[:10]:
+            print(f"   • {error}")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'parameters': vars(args),
+            'wall_seconds': wall_time,
+            'summary': summary,
+            'errors': errors
+        }, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+    return not errors
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
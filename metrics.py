@@ -0,0 +1,266 @@
+"""
+Prometheus-style metrics for the Derby Betting System.
+
+Counters and histograms are kept in memory and rendered in the Prometheus
+text format only when scraped:
+
+- reruns per page and rerun latency
+- DerbyDatabase calls, time and SQL statements per method
+- cache hits and misses
+- active sessions by role (seen within ACTIVE_SESSION_SECONDS)
+- race submission latency
+- background precompute time, by whether the data had changed
+
+Metrics are off unless an exporter is configured. DERBY_METRICS_PORT serves
+them at http://127.0.0.1:<port>/metrics (DERBY_METRICS_HOST changes the
+address); DERBY_METRICS_FILE writes them to a textfile-collector file every
+DERBY_METRICS_INTERVAL seconds (default 15). When off, every hook returns
+after a single flag check.
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+ACTIVE_SESSION_SECONDS = 300
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_port = os.environ.get("DERBY_METRICS_PORT")
+_textfile = os.environ.get("DERBY_METRICS_FILE")
+_enabled = bool(_port or _textfile)
+
+_lock = threading.Lock()
+_exporter_started = False
+# Streamlit runs each session's script on its own thread
+_local = threading.local()
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, label_values: Tuple = (), amount: float = 1.0):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with _lock:
+            values = sorted(self.values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+class Histogram:
+    """Cumulative histogram with labels."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, label_values: Tuple = ()):
+        with _lock:
+            # Bucket counts, then sum, then count
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            values = sorted((label_values, list(series)) for label_values, series in self.values.items())
+        for label_values, series in values:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (f'{bound:g}',))} {count:g}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + ('+Inf',))} {series[-1]:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {series[-1]:g}")
+        return lines
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+RERUNS = Counter("derby_reruns_total", "Completed script reruns by page.", ("page",))
+RERUN_SECONDS = Histogram("derby_rerun_seconds", "Script rerun latency by page.", ("page",))
+DB_CALLS = Counter("derby_db_calls_total", "DerbyDatabase method calls.", ("method",))
+DB_SECONDS = Counter("derby_db_seconds_total", "Time spent in DerbyDatabase methods.", ("method",))
+DB_QUERIES = Counter("derby_db_queries_total", "SQL statements run by SQLite, by issuing method.", ("method",))
+CACHE_REQUESTS = Counter("derby_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+RACE_SUBMISSION_SECONDS = Histogram("derby_race_submission_seconds",
+                                    "Race result submission latency by outcome.", ("outcome",))
+PRECOMPUTE_SECONDS = Histogram("derby_precompute_seconds",
+                               "Background rebuild time by whether the bet matrix changed.", ("result",))
+
+_sessions: Dict[str, Tuple[str, float]] = {}
+
+def is_enabled() -> bool:
+    """Whether metrics are being collected."""
+    return _enabled
+
+def observe_rerun(page: str, seconds: float):
+    """Count a completed rerun of `page`."""
+    if not _enabled:
+        return
+    RERUNS.inc((page,))
+    RERUN_SECONDS.observe(seconds, (page,))
+
+def observe_race_submission(seconds: float, success: bool):
+    """Record how long a race submission took."""
+    if not _enabled:
+        return
+    RACE_SUBMISSION_SECONDS.observe(seconds, ("success" if success else "failure",))
+
+def observe_precompute(seconds: float, changed: bool):
+    """Record a background rebuild of the derived scoreboard data."""
+    if not _enabled:
+        return
+    PRECOMPUTE_SECONDS.observe(seconds, ("rebuilt" if changed else "unchanged",))
+
+def count_cache(cache: str, hit: bool):
+    """Count a cache lookup."""
+    if not _enabled:
+        return
+    CACHE_REQUESTS.inc((cache, "hit" if hit else "miss"))
+
+def touch_session(role: str):
+    """Mark the running Streamlit session as active in `role`."""
+    if not _enabled:
+        return
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return
+    with _lock:
+        _sessions[ctx.session_id] = (role, time.time())
+
+def count_query(_statement: str = ""):
+    """SQLite trace callback: count a statement against the running method."""
+    DB_QUERIES.inc((getattr(_local, 'method', None) or "(outside DerbyDatabase)",))
+
+def instrument_methods(exclude: tuple = ()):
+    """Class decorator counting calls and time of every public method."""
+    def decorator(cls):
+        for attr, func in list(vars(cls).items()):
+            if attr.startswith('_') or attr in exclude or not inspect.isfunction(func):
+                continue
+            setattr(cls, attr, _instrumented_method(func, attr))
+        return cls
+    return decorator
+
+def _instrumented_method(func, name: str):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        outer = getattr(_local, 'method', None)
+        _local.method = name
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.method = outer
+            DB_CALLS.inc((name,))
+            DB_SECONDS.inc((name,), time.perf_counter() - start)
+    return wrapper
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    now = time.time()
+    with _lock:
+        for session_id, (_, seen) in list(_sessions.items()):
+            if now - seen > ACTIVE_SESSION_SECONDS:
+                del _sessions[session_id]
+        active = {}
+        for role, _ in _sessions.values():
+            active[role] = active.get(role, 0) + 1
+
+    lines = []
+    for metric in (RERUNS, RERUN_SECONDS, DB_CALLS, DB_SECONDS, DB_QUERIES, CACHE_REQUESTS, RACE_SUBMISSION_SECONDS,
+                   PRECOMPUTE_SECONDS):
+        lines.extend(metric.render())
+    lines.append(f"# HELP derby_active_sessions Sessions with a rerun in the last {ACTIVE_SESSION_SECONDS} seconds, by role.")
+    lines.append("# TYPE derby_active_sessions gauge")
+    for role in sorted(set(active) | {"viewer", "admin"}):
+        lines.append(f'derby_active_sessions{{role="{role}"}} {active.get(role, 0)}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the Streamlit console
+
+def write_textfile(path: str) -> bool:
+    """Write the metrics to `path` atomically, for the node exporter's textfile collector."""
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(render())
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"Error writing metrics file: {e}")
+        return False
+
+def _textfile_loop(path: str, interval: float):
+    while True:
+        write_textfile(path)
+        time.sleep(interval)
+
+def start_exporter() -> Optional[str]:
+    """Start the configured exporter once per process; returns where metrics are published."""
+    global _exporter_started
+    if not _enabled:
+        return None
+    with _lock:
+        if _exporter_started:
+            return None
+        _exporter_started = True
+
+    if _port:
+        host = os.environ.get("DERBY_METRICS_HOST", "127.0.0.1")
+        try:
+            server = ThreadingHTTPServer((host, int(_port)), _MetricsHandler)
+        except OSError as e:
+            print(f"Error starting metrics endpoint: {e}")
+            return None
+        threading.Thread(target=server.serve_forever, name="derby-metrics", daemon=True).start()
+        return f"http://{host}:{_port}/metrics"
+
+    interval = float(os.environ.get("DERBY_METRICS_INTERVAL", "15"))
+    threading.Thread(target=_textfile_loop, args=(_textfile, interval),
+                     name="derby-metrics", daemon=True).start()
+    return _textfile
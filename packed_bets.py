@@ -0,0 +1,46 @@
+"""
+Packed per-race bet storage for very large events.
+
+In packed mode a race's bets are a single BLOB instead of a row per bet: a
+little-endian uint16 array indexed by bettor id, holding the id of the horse
+each bettor picked (NO_HORSE for no bet). 100k bettors take 200 KB per race
+rather than 100k rows plus their index entries.
+
+Blobs are read with np.frombuffer, which wraps the bytes SQLite returned
+without copying them, and written from a memoryview of the array.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+BET_STORAGE_MODES = ("rows", "packed")
+DEFAULT_BET_STORAGE = "rows"
+NO_HORSE = 0
+HORSE_DTYPE = np.dtype('<u2')
+
+def unpack(blob: bytes) -> np.ndarray:
+    """Horse id per bettor id, as a read-only view of the blob."""
+    return np.frombuffer(blob, dtype=HORSE_DTYPE)
+
+def pack(bets: Iterable[Tuple[int, int]], blob: Optional[bytes] = None) -> memoryview:
+    """Pack (bettor_id, horse_id) pairs over the bets already in `blob`.
+
+    A horse id of NO_HORSE clears the bettor's bet.
+    """
+    pairs = np.array(list(bets), dtype=np.int64).reshape(-1, 2)
+    existing = unpack(blob) if blob else np.zeros(0, dtype=HORSE_DTYPE)
+    if len(pairs) and pairs[:, 1].max() > np.iinfo(HORSE_DTYPE).max:
+        raise ValueError("Horse id too large for packed bet storage")
+
+    size = max(len(existing), int(pairs[:, 0].max()) + 1 if len(pairs) else 0)
+    horses = np.zeros(size, dtype=HORSE_DTYPE)
+    horses[:len(existing)] = existing
+    horses[pairs[:, 0]] = pairs[:, 1]
+    return memoryview(horses)
+
+def bet_pairs(blob: bytes) -> List[Tuple[int, int]]:
+    """The (bettor_id, horse_id) pairs in a blob, in bettor id order."""
+    horses = unpack(blob)
+    bettors = np.flatnonzero(horses != NO_HORSE)
+    return list(zip(bettors.tolist(), horses[bettors].tolist()))
@@ -0,0 +1,72 @@
+"""
+Bettor partitioning for multi-operator bet entry.
+
+Splits the bettor list into named partitions so several organizers can enter
+the same race's bets at once, each working through their own share.
+"""
+
+from typing import Dict, List, Optional
+
+PARTITION_MODES = {
+    "none": "Single operator",
+    "name_range": "By name range",
+    "page": "By page",
+    "explicit": "Explicit assignment"
+}
+
+UNASSIGNED_PARTITION = "Unassigned"
+NAME_RANGE_PARTITION = "Range {}"
+
+def partition_by_name_range(names: List[str], count: int) -> Dict[str, List[str]]:
+    """Split alphabetically sorted names into `count` contiguous ranges.
+
+    Ranges are keyed by position ("Range 1", ...), not by the names at their
+    ends, so claims and completion survive bettors being added mid-race.
+    """
+    sorted_names = sorted(names, key=str.casefold)
+    count = max(1, min(count, len(sorted_names)))
+    size, extra = divmod(len(sorted_names), count)
+
+    partitions = {}
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        chunk = sorted_names[start:end]
+        if chunk:
+            partitions[NAME_RANGE_PARTITION.format(i + 1)] = chunk
+        start = end
+    return partitions
+
+def partition_by_page(names: List[str], page_size: int) -> Dict[str, List[str]]:
+    """Split names into pages of `page_size` in their display order."""
+    page_size = max(1, page_size)
+    return {
+        f"Page {i // page_size + 1}": names[i:i + page_size]
+        for i in range(0, len(names), page_size)
+    }
+
+def partition_explicit(names: List[str], assignments: Dict[str, str]) -> Dict[str, List[str]]:
+    """Group names by their assigned partition; anyone unassigned gets their own group."""
+    partitions = {}
+    for name in names:
+        partitions.setdefault(assignments.get(name) or UNASSIGNED_PARTITION, []).append(name)
+    return dict(sorted(partitions.items(), key=lambda item: item[0] == UNASSIGNED_PARTITION))
+
+def partition_label(partition: str, members: List[str]) -> str:
+    """Display name of a partition; name ranges show the names they span."""
+    if members and partition.startswith(NAME_RANGE_PARTITION.format("")):
+        return f"{partition}: {members[0]} – {members[-1]}"
+    return partition
+
+def build_partitions(names: List[str], mode: str, count: int = 2, page_size: int = 100,
+                     assignments: Optional[Dict[str, str]] = None) -> Dict[str, List[str]]:
+    """Build the partitions for the configured mode ("none" gives one partition)."""
+    if not names:
+        return {}
+    if mode == "name_range":
+        return partition_by_name_range(names, count)
+    if mode == "page":
+        return partition_by_page(names, page_size)
+    if mode == "explicit":
+        return partition_explicit(names, assignments or {})
+    return {"All bettors": list(names)}
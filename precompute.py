@@ -0,0 +1,149 @@
+"""
+Background precompute of everything pages derive from the bet matrix.
+
+One daemon thread per server rebuilds the bet matrix after committed writes
+and warms what pages read from it: the standings, race analytics, bettor
+stats and title race outlook. It writes the public scoreboard snapshot, then
+publishes the new matrix with a single reference swap, so a rerun sees all
+of the old artifacts or all of the new ones.
+
+Writes are noticed two ways. notify() wakes the worker at once after a write
+from this process, and PRAGMA data_version on the worker's own connection,
+checked every POLL_SECONDS, catches commits from any other connection or
+process. Each rebuild records the data_version it read. Writes that land
+while a rebuild runs are all picked up by the next one, so a burst of writes
+costs at most two rebuilds however long it is. Commits that leave the matrix
+unchanged, such as draft bets or settings, only move the published version.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import metrics
+from bet_matrix import BetMatrix, Standings, StandingsHistory, load_bet_matrix
+from bettor_stats import bettor_stats
+from clinch import matrix_outlook
+from race_analytics import race_analytics
+from scoreboard_snapshot import write_snapshot
+
+POLL_SECONDS = 1.0
+WAIT_SECONDS = 30.0
+
+class Precomputed:
+    """One published rebuild and the data_version it was read at."""
+
+    def __init__(self, data_version: int, matrix: BetMatrix, standings: Standings, built_at: float):
+        self.data_version = data_version
+        self.matrix = matrix
+        self.standings = standings
+        self.built_at = built_at
+
+class PrecomputeWorker:
+    """Rebuilds derived data ahead of demand and hands out the latest build."""
+
+    def __init__(self, db, standings_history: StandingsHistory, snapshot_path: str):
+        self.db = db
+        self.standings_history = standings_history
+        self.snapshot_path = snapshot_path
+        self.published: Optional[Precomputed] = None
+        self.rebuilds = 0
+        self._wake = threading.Event()
+        self._published = threading.Condition()
+        self._build_lock = threading.Lock()
+        self._conn_lock = threading.Lock()
+        self._conn = None
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the worker thread once; it builds straight away."""
+        if self._thread is None:
+            self._wake.set()
+            self._thread = threading.Thread(target=self._run, name="derby-precompute", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wake the worker after a committed write."""
+        self._wake.set()
+
+    def data_version(self) -> int:
+        """SQLite's count of commits by other connections, as seen by the worker's connection."""
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db.db_path, check_same_thread=False)
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        """Close the worker's connection, e.g. before leaving WAL mode or swapping the file.
+
+        data_version only compares within one connection, so the next call
+        reopens it and rebuilds from scratch.
+        """
+        with self._build_lock, self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            with self._published:
+                self.published = None
+
+    def current(self, timeout: float = WAIT_SECONDS) -> Optional[Precomputed]:
+        """The build that includes every write committed so far.
+
+        Waits up to `timeout` for the worker, or builds in the calling thread
+        when the worker is not running. None if the worker did not catch up.
+        """
+        version = self.data_version()
+        if not self.running:
+            return self.rebuild()
+        with self._published:
+            if not self._is_current(version):
+                self._wake.set()
+                self._published.wait_for(lambda: self._is_current(version), timeout)
+            return self.published if self._is_current(version) else None
+
+    def _is_current(self, version: int) -> bool:
+        return self.published is not None and self.published.data_version >= version
+
+    def rebuild(self) -> Precomputed:
+        """Rebuild from the database and publish, unless another thread already covered this version."""
+        with self._build_lock:
+            # Read the version first: a write landing during the load is then rebuilt again
+            version = self.data_version()
+            published = self.published
+            if published is not None and published.data_version >= version:
+                return published
+
+            start = time.perf_counter()
+            matrix = load_bet_matrix(self.db)
+            changed = published is None or not matrix.same_data(published.matrix)
+            if changed:
+                standings = self.standings_history.update(matrix)
+                race_analytics(matrix)
+                bettor_stats(matrix)
+                matrix_outlook(matrix)
+                write_snapshot(self.snapshot_path, matrix, standings)
+                built = Precomputed(version, matrix, standings, time.time())
+            else:
+                built = Precomputed(version, published.matrix, published.standings, published.built_at)
+            metrics.observe_precompute(time.perf_counter() - start, changed)
+
+            with self._published:
+                self.published = built
+                self.rebuilds += changed
+                self._published.notify_all()
+            return built
+
+    def _run(self):
+        while True:
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+            try:
+                if self.published is None or self.data_version() > self.published.data_version:
+                    self.rebuild()
+            except Exception as e:
+                print(f"Error precomputing scoreboard data: {e}")
@@ -0,0 +1,206 @@
+"""
+Opt-in rerun profiling for the Derby Betting System.
+
+Each script rerun (or fragment rerun) gets a record of how long its sections
+took: laps between checkpoints in derby_betting_system.py, profiled functions
+and every DerbyDatabase method. The last PROFILE_HISTORY records are kept in
+memory for the Settings page and can be dumped to JSON.
+
+Profiling is off unless DERBY_PROFILING=1 is set or it is switched on from
+the Settings page. When off, every hook returns after a single flag check.
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import metrics
+
+PROFILE_HISTORY = 100
+
+_enabled = os.environ.get("DERBY_PROFILING", "").lower() in ("1", "true", "yes")
+_history = deque(maxlen=PROFILE_HISTORY)
+_history_lock = threading.Lock()
+# Streamlit runs each session's script on its own thread
+_local = threading.local()
+
+def is_enabled() -> bool:
+    """Whether reruns are being profiled."""
+    return _enabled
+
+def set_enabled(enabled: bool):
+    """Switch profiling on or off for the whole server process."""
+    global _enabled
+    _enabled = enabled
+    if not enabled:
+        _local.rerun = None
+
+def start_rerun(label: str):
+    """Open a new rerun record on this thread, replacing any unfinished one.
+
+    Full script reruns also feed the rerun metrics when those are enabled.
+    """
+    _local.metrics_start = time.perf_counter() if metrics.is_enabled() else None
+    _open_record(label)
+
+def _open_record(label: str):
+    if not _enabled:
+        _local.rerun = None
+        return
+    now = time.perf_counter()
+    _local.rerun = {
+        'label': label,
+        'started_at': datetime.now().isoformat(timespec='milliseconds'),
+        'start': now,
+        'lap': now,
+        'sections': {}
+    }
+
+def finish_rerun(label: Optional[str] = None):
+    """Close this thread's rerun record and add it to the history."""
+    metrics_start = getattr(_local, 'metrics_start', None)
+    if metrics_start is not None:
+        _local.metrics_start = None
+        metrics.observe_rerun(label or "unknown", time.perf_counter() - metrics_start)
+    _close_record(label)
+
+def _close_record(label: Optional[str] = None):
+    rerun = getattr(_local, 'rerun', None)
+    _local.rerun = None
+    if rerun is None:
+        return
+    record = {
+        'label': label or rerun['label'],
+        'started_at': rerun['started_at'],
+        'total_ms': (time.perf_counter() - rerun['start']) * 1000,
+        'sections': rerun['sections']
+    }
+    with _history_lock:
+        _history.append(record)
+
+def _record(rerun: Dict, name: str, seconds: float):
+    section = rerun['sections'].setdefault(name, {'calls': 0, 'ms': 0.0})
+    section['calls'] += 1
+    section['ms'] += seconds * 1000
+
+def record(name: str, seconds: float):
+    """Add time to section `name` of this thread's rerun, if one is being profiled."""
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is not None:
+        _record(rerun, name, seconds)
+
+def checkpoint(name: str):
+    """Record the time since the previous checkpoint (or the rerun start) as `name`."""
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is None:
+        return
+    now = time.perf_counter()
+    _record(rerun, name, now - rerun['lap'])
+    rerun['lap'] = now
+
+@contextmanager
+def timed(name: str):
+    """Time a block as section `name` of the current rerun."""
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(rerun, name, time.perf_counter() - start)
+
+def profiled(name: str):
+    """Time a function as a section of the current rerun.
+
+    Called outside a rerun, e.g. when a fragment reruns on its own, the call
+    becomes a rerun record of its own.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            if getattr(_local, 'rerun', None) is None:
+                _open_record(f"fragment: {name}")
+                try:
+                    with timed(name):
+                        return func(*args, **kwargs)
+                finally:
+                    _close_record()
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def profile_methods(prefix: str, exclude: tuple = ()):
+    """Class decorator timing every public method as section `prefix.method`."""
+    def decorator(cls):
+        for attr, func in list(vars(cls).items()):
+            if attr.startswith('_') or attr in exclude or not inspect.isfunction(func):
+                continue
+            setattr(cls, attr, _timed_method(func, f"{prefix}.{attr}"))
+        return cls
+    return decorator
+
+def _timed_method(func, name: str):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        rerun = getattr(_local, 'rerun', None) if _enabled else None
+        if rerun is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(rerun, name, time.perf_counter() - start)
+    return wrapper
+
+def get_history(limit: Optional[int] = None) -> List[Dict]:
+    """The most recent rerun records, oldest first."""
+    with _history_lock:
+        records = list(_history)
+    return records[-limit:] if limit else records
+
+def clear_history():
+    """Forget all recorded reruns."""
+    with _history_lock:
+        _history.clear()
+
+def summarize(records: List[Dict]) -> List[Dict]:
+    """Per-section totals across rerun records, slowest first."""
+    totals = {}
+    for record in records:
+        for name, section in record['sections'].items():
+            total = totals.setdefault(name, {'section': name, 'calls': 0, 'ms': 0.0, 'reruns': 0})
+            total['calls'] += section['calls']
+            total['ms'] += section['ms']
+            total['reruns'] += 1
+    for total in totals.values():
+        total['ms_per_rerun'] = total['ms'] / len(records)
+    return sorted(totals.values(), key=lambda t: t['ms'], reverse=True)
+
+def export_profiles(limit: Optional[int] = None) -> Dict:
+    """The recorded reruns in the JSON dump format."""
+    return {
+        'exported_at': datetime.now().isoformat(),
+        'reruns': get_history(limit)
+    }
+
+def dump_profiles(path: str, limit: Optional[int] = None) -> bool:
+    """Write the recorded reruns to a JSON file for offline analysis."""
+    try:
+        with open(path, 'w') as f:
+            json.dump(export_profiles(limit), f, indent=2)
+        return True
+    except Exception as e:
+        print(f"Error writing profile dump: {e}")
+        return False
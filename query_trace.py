@@ -0,0 +1,309 @@
+"""
+SQL statement tracing and slow-query log for DerbyDatabase.
+
+With tracing on, DerbyDatabase connections are TracedConnections: every
+execute records its statement, parameter count, duration (including fetching
+the rows) and rows returned or changed, along with the public DerbyDatabase
+method that issued it. SQLite's trace callback counts the statements SQLite
+actually ran, including implicit BEGINs.
+
+Statements slower than the threshold are appended as JSON lines to the slow
+query log. Statement totals are kept in memory for the Settings page, and
+while rerun profiling is on each rerun records its query count and time.
+
+Tracing is off unless DERBY_QUERY_TRACE=1 is set or it is switched on from
+the Settings page. DERBY_SLOW_QUERY_MS (default 50) sets the threshold and
+DERBY_SLOW_QUERY_LOG (default slow_queries.log) the log file.
+"""
+
+import functools
+import inspect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import metrics
+import profiling
+
+RECENT_SLOW_QUERIES = 100
+
+_enabled = os.environ.get("DERBY_QUERY_TRACE", "").lower() in ("1", "true", "yes")
+_slow_query_ms = float(os.environ.get("DERBY_SLOW_QUERY_MS", "50"))
+_slow_query_log = os.environ.get("DERBY_SLOW_QUERY_LOG", "slow_queries.log")
+
+_lock = threading.Lock()
+_statements = {}
+_sqlite_statements = defaultdict(int)
+_recent_slow = deque(maxlen=RECENT_SLOW_QUERIES)
+# Streamlit runs each session's script on its own thread
+_local = threading.local()
+
+def is_enabled() -> bool:
+    """Whether new connections are traced."""
+    return _enabled
+
+def set_enabled(enabled: bool):
+    """Switch tracing on or off for connections opened from now on."""
+    global _enabled
+    _enabled = enabled
+
+def get_slow_query_ms() -> float:
+    """Duration above which a statement goes to the slow query log."""
+    return _slow_query_ms
+
+def set_slow_query_ms(threshold_ms: float):
+    """Change the slow query threshold."""
+    global _slow_query_ms
+    _slow_query_ms = threshold_ms
+
+def get_slow_query_log() -> str:
+    """Path of the slow query log."""
+    return _slow_query_log
+
+def connection_factory():
+    """Connection class for sqlite3.connect(factory=...)."""
+    return TracedConnection if _enabled else sqlite3.Connection
+
+def current_method() -> str:
+    """The DerbyDatabase method running on this thread."""
+    return getattr(_local, 'method', None) or "(outside DerbyDatabase)"
+
+def track_methods(exclude: tuple = ()):
+    """Class decorator attributing statements to the public method that issued them."""
+    def decorator(cls):
+        for attr, func in list(vars(cls).items()):
+            if attr.startswith('_') or attr in exclude or not inspect.isfunction(func):
+                continue
+            setattr(cls, attr, _tracked_method(func, attr))
+        return cls
+    return decorator
+
+def _tracked_method(func, name: str):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        outer = getattr(_local, 'method', None)
+        _local.method = name
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.method = outer
+    return wrapper
+
+def _normalize(statement: str) -> str:
+    return re.sub(r'\s+', ' ', statement).strip()
+
+def record_query(statement: str, params: int, seconds: float, rows: int, method: Optional[str] = None):
+    """Add one finished statement to the totals, the rerun profile and the slow log."""
+    method = method or current_method()
+    statement = _normalize(statement)
+    ms = seconds * 1000
+
+    with _lock:
+        stats = _statements.get((method, statement))
+        if stats is None:
+            stats = _statements[(method, statement)] = {
+                'method': method, 'statement': statement, 'calls': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0
+            }
+        stats['calls'] += 1
+        stats['total_ms'] += ms
+        stats['max_ms'] = max(stats['max_ms'], ms)
+        stats['rows'] += rows
+
+    profiling.record("sql", seconds)
+
+    if ms >= _slow_query_ms:
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='milliseconds'),
+            'method': method,
+            'duration_ms': round(ms, 3),
+            'params': params,
+            'rows': rows,
+            'statement': statement
+        }
+        with _lock:
+            _recent_slow.append(entry)
+            try:
+                with open(_slow_query_log, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except Exception as e:
+                print(f"Error writing slow query log: {e}")
+
+def count_sqlite_statement(statement: str):
+    """Trace callback: count what SQLite ran against the issuing method."""
+    method = current_method()
+    with _lock:
+        _sqlite_statements[method] += 1
+    if metrics.is_enabled():
+        metrics.count_query()
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times each statement from execute until its rows are read."""
+
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._started(sql, len(parameters), time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._started(sql, len(seq_of_parameters), time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._started(sql_script, 0, time.perf_counter() - start)
+
+    def _started(self, sql: str, params: int, seconds: float):
+        self._pending = {'statement': sql, 'params': params, 'seconds': seconds,
+                         'rows': 0, 'method': current_method()}
+        if self.description is None:
+            # Nothing to fetch: the statement is done
+            self._pending['rows'] = max(self.rowcount, 0)
+            self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            record_query(pending['statement'], pending['params'], pending['seconds'],
+                         pending['rows'], pending['method'])
+
+    def _fetched(self, rows: int, seconds: float, done: bool):
+        if self._pending is not None:
+            self._pending['rows'] += rows
+            self._pending['seconds'] += seconds
+            if done:
+                self._finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(row is not None, time.perf_counter() - start, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), time.perf_counter() - start, not rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), time.perf_counter() - start, True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(0, time.perf_counter() - start, True)
+            raise
+        self._fetched(1, time.perf_counter() - start, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose statements, commits and rollbacks are recorded."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(count_sqlite_statement)
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        self._timed("COMMIT", super().commit)
+
+    def rollback(self):
+        self._timed("ROLLBACK", super().rollback)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The context manager commits or rolls back without calling commit()
+        if not self.in_transaction:
+            return super().__exit__(exc_type, exc_value, traceback)
+        start = time.perf_counter()
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            record_query("ROLLBACK" if exc_type else "COMMIT", 0, time.perf_counter() - start, 0)
+
+    def _timed(self, statement: str, func):
+        if not self.in_transaction:
+            return func()
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            record_query(statement, 0, time.perf_counter() - start, 0)
+
+def get_statement_stats() -> List[Dict]:
+    """Totals per method and statement, slowest first."""
+    with _lock:
+        stats = [dict(s) for s in _statements.values()]
+    return sorted(stats, key=lambda s: s['total_ms'], reverse=True)
+
+def get_method_stats() -> List[Dict]:
+    """Totals per DerbyDatabase method, slowest first."""
+    with _lock:
+        sqlite_counts = dict(_sqlite_statements)
+    methods = {}
+    for stats in get_statement_stats():
+        method = methods.setdefault(stats['method'], {
+            'method': stats['method'], 'queries': 0, 'total_ms': 0.0, 'rows': 0,
+            'sqlite_statements': sqlite_counts.get(stats['method'], 0)
+        })
+        method['queries'] += stats['calls']
+        method['total_ms'] += stats['total_ms']
+        method['rows'] += stats['rows']
+    return sorted(methods.values(), key=lambda m: m['total_ms'], reverse=True)
+
+def get_recent_slow_queries() -> List[Dict]:
+    """The latest slow queries, newest first."""
+    with _lock:
+        return list(reversed(_recent_slow))
+
+def reset_stats():
+    """Forget all statement totals and recent slow queries."""
+    with _lock:
+        _statements.clear()
+        _sqlite_statements.clear()
+        _recent_slow.clear()
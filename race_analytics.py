@@ -0,0 +1,105 @@
+"""
+Horse popularity and pool analytics for every race at once.
+
+All counts come from one bincount over the bet matrix: each pick becomes
+race * (horses + 1) + horse, with NO_BET in the extra last column. From
+the counts follow each horse's share of the field and its parimutuel
+payout: the units a winning one-unit stake would return if every bettor in
+the race staked one unit into a single win pool with no takeout. For
+completed races the points the race paid are also pooled, shown as what
+each backer of the winner would get if those points were split among them.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from bet_matrix import BetMatrix
+from scoring_rules import NO_BET, PLACES
+
+PLACE_LABELS = ("1st", "2nd", "3rd")
+
+class RaceAnalytics:
+    """Per race (rows) and horse (columns) bet counts, shares, payouts and points."""
+
+    def __init__(self, race_numbers: np.ndarray, horse_numbers: List[str], completed: np.ndarray,
+                 counts: np.ndarray, no_bets: np.ndarray, placings: np.ndarray, points_each: np.ndarray,
+                 scorers: np.ndarray, points_paid: np.ndarray):
+        self.race_numbers = race_numbers
+        self.horse_numbers = horse_numbers
+        self.completed = completed
+        self.counts = counts
+        self.no_bets = no_bets
+        # 1, 2 or 3 for placed horses, 0 otherwise
+        self.placings = placings
+        self.points_each = points_each
+        self.scorers = scorers
+        self.points_paid = points_paid
+        self.field = counts.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.shares = np.where(self.field[:, None] > 0, counts / self.field[:, None], 0.0)
+            self.payouts = np.where(counts > 0, self.field[:, None] / counts, np.nan)
+
+    def race_rows(self) -> List[Dict]:
+        """One summary row per race that has bets or results."""
+        rows = []
+        for race in np.flatnonzero((self.field > 0) | self.completed).tolist():
+            favorite = int(np.argmax(self.counts[race]))
+            winner = np.flatnonzero(self.placings[race] == 1)
+            winner = int(winner[0]) if len(winner) else None
+            backers = int(self.counts[race, winner]) if winner is not None else 0
+            rows.append({
+                "Race": int(self.race_numbers[race]),
+                "Bets": int(self.field[race]),
+                "No Bet": int(self.no_bets[race]),
+                "Favorite": self.horse_numbers[favorite] if self.field[race] else "",
+                "Favorite %": round(100 * float(self.shares[race, favorite]), 1),
+                "Winner": self.horse_numbers[winner] if winner is not None else "",
+                "Winner %": round(100 * float(self.shares[race, winner]), 1) if winner is not None else None,
+                "Win Payout": round(float(self.payouts[race, winner]), 2) if backers else None,
+                "Scorers": int(self.scorers[race]),
+                "Points Paid": int(self.points_paid[race]),
+                "Pooled Points per Winner": round(float(self.points_paid[race]) / backers, 2) if backers else None
+            })
+        return rows
+
+    def horse_rows(self, race_index: int) -> List[Dict]:
+        """One row per horse that was bet on or placed in a race, most popular first."""
+        horses = np.flatnonzero((self.counts[race_index] > 0) | (self.placings[race_index] > 0))
+        horses = horses[np.argsort(-self.counts[race_index, horses], kind='stable')]
+        return [{
+            "Race": int(self.race_numbers[race_index]),
+            "Horse": self.horse_numbers[horse],
+            "Bets": int(self.counts[race_index, horse]),
+            "Share %": round(100 * float(self.shares[race_index, horse]), 1),
+            "Payout": round(float(self.payouts[race_index, horse]), 2) if self.counts[race_index, horse] else None,
+            "Finish": PLACE_LABELS[self.placings[race_index, horse] - 1] if self.placings[race_index, horse] else "",
+            "Points Each": int(self.points_each[race_index, horse])
+        } for horse in horses.tolist()]
+
+    def all_horse_rows(self) -> List[Dict]:
+        """Horse rows for every race, race by race."""
+        return [row for race in range(len(self.race_numbers)) for row in self.horse_rows(race)]
+
+def compute_race_analytics(matrix: BetMatrix) -> RaceAnalytics:
+    """Aggregate every race's bets in one pass over the bet matrix."""
+    races = len(matrix.race_numbers)
+    horses = len(matrix.horse_numbers)
+    columns = np.where(matrix.picks == NO_BET, horses, matrix.picks).astype(np.int64)
+    cells = np.bincount((columns + np.arange(races) * (horses + 1)).ravel(), minlength=races * (horses + 1))
+    cells = cells.reshape(races, horses + 1)
+
+    placings = np.zeros((races, horses), dtype=np.int8)
+    for place in range(PLACES):
+        placed = np.flatnonzero(matrix.podium[:, place] != NO_BET)
+        placings[placed, matrix.podium[placed, place]] = place + 1
+
+    # Points each bettor on a horse earns; combo bonuses are in points_paid only
+    points_each = matrix.points_table()[:, :horses]
+    points = matrix.points()
+    return RaceAnalytics(matrix.race_numbers, matrix.horse_numbers, matrix.completed, cells[:, :horses],
+                         cells[:, horses], placings, points_each, (points > 0).sum(axis=0), points.sum(axis=0))
+
+def race_analytics(matrix: BetMatrix) -> RaceAnalytics:
+    """Race analytics for a bet matrix, computed once per matrix."""
+    return matrix.cached("race_analytics", compute_race_analytics)
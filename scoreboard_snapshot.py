@@ -0,0 +1,220 @@
+"""
+Memory-mapped scoreboard snapshots for the public scoreboard.
+
+After each race the standings are written to a binary file, and public
+scoreboard sessions map it instead of querying SQLite. Every session in a
+process shares one mapping, every process shares the page cache, and the
+numbers are read in place rather than deserialized.
+
+Layout (little-endian, each section starts on an 8-byte boundary):
+
+    header     HEADER, padded to HEADER_SIZE bytes
+    totals     int32[bettors]          total points, bettors in name order
+    ranks      int32[bettors]          1-based rank of each bettor
+    order      int32[bettors]          bettor indexes from first place to last
+    movement   int32[bettors]          places gained since the previous race
+    max_totals int32[bettors]          highest total each bettor can still reach
+    points     int16[bettors, races]   points per bettor and race
+    completed  uint8[races]            1 if the race has results
+    stats      int32[bettors, 6]       bettor stats, columns as bettor_stats.STAT_COLUMNS
+    favorites  int32[bettors]          index of each bettor's most picked horse, -1 if none
+    horse_ends uint32[horses]          end offset of each horse number in horse_names
+    horse_names UTF-8                  horse numbers in display order, concatenated
+    name_ends  uint32[bettors]         end offset of each name in names
+    names      UTF-8                   bettor names, concatenated
+
+Snapshots are replaced atomically. The header carries a version that goes
+up with every write: the write time in nanoseconds, or one more than the
+version on disk if the clock is behind it. Every server process has its own
+precompute worker writing the same file, so the version has to stay unique
+across writers. Readers also check the file's inode, which each replace
+changes, and remap when either differs.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from bettor_stats import STAT_COLUMNS, BettorStats, bettor_stats
+from clinch import max_totals
+
+MAGIC = b"DRBYSNAP"
+FORMAT_VERSION = 4
+# magic, format version, snapshot version, created at, bettors, races, total races, completed races,
+# horses, horse name bytes
+HEADER = struct.Struct("<8sIQdIIIIII")
+HEADER_SIZE = 64
+
+_readers: Dict[str, "SnapshotReader"] = {}
+_readers_lock = threading.Lock()
+
+def default_snapshot_path(db_path: str) -> str:
+    """Snapshot file for a database: $DERBY_SNAPSHOT_PATH, else next to the database."""
+    return os.environ.get("DERBY_SNAPSHOT_PATH") or f"{db_path}.scoreboard"
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _layout(bettors: int, races: int, horses: int, horse_bytes: int) -> Dict[str, int]:
+    """Byte offset of each section."""
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, size in (("totals", 4 * bettors), ("ranks", 4 * bettors), ("order", 4 * bettors),
+                       ("movement", 4 * bettors), ("max_totals", 4 * bettors), ("points", 2 * bettors * races),
+                       ("completed", races), ("stats", 4 * len(STAT_COLUMNS) * bettors), ("favorites", 4 * bettors),
+                       ("horse_ends", 4 * horses), ("horse_names", horse_bytes), ("name_ends", 4 * bettors),
+                       ("names", 0)):
+        offsets[name] = offset
+        offset = _align(offset + size)
+    return offsets
+
+def read_version(path: str) -> int:
+    """Version in a snapshot's header, or 0 if there is no valid snapshot."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return 0
+    if len(header) < HEADER.size:
+        return 0
+    magic, format_version, version = HEADER.unpack(header)[:3]
+    return version if magic == MAGIC and format_version == FORMAT_VERSION else 0
+
+def write_snapshot(path: str, matrix, standings=None) -> int:
+    """Write a BetMatrix's standings to `path` and return the new version.
+    
+    Rank movement comes from `standings` (a bet_matrix.Standings), if given.
+    """
+    # Unique across processes writing the same file, and never lower than what is on disk
+    version = max(read_version(path) + 1, time.time_ns())
+    bettors, races = matrix.picks.shape
+    totals = matrix.totals().astype('<i4')
+    order = matrix.ranking().astype('<i4')
+    ranks = np.empty(bettors, dtype='<i4')
+    ranks[order] = np.arange(1, bettors + 1, dtype='<i4')
+    encoded = [name.encode('utf-8') for name in matrix.bettor_names]
+    name_ends = np.cumsum([len(name) for name in encoded], dtype=np.int64).astype('<u4')
+    horse_names = [number.encode('utf-8') for number in matrix.horse_numbers]
+    horse_ends = np.cumsum([len(number) for number in horse_names], dtype=np.int64).astype('<u4')
+    horse_bytes = b"".join(horse_names)
+    stats = bettor_stats(matrix)
+
+    offsets = _layout(bettors, races, len(horse_names), len(horse_bytes))
+    movement = standings.movement() if standings is not None else np.zeros(bettors)
+    sections = {
+        "totals": totals, "ranks": ranks, "order": order, "movement": movement.astype('<i4'),
+        "max_totals": max_totals(matrix).astype('<i4'),
+        "points": matrix.points().astype('<i2'),
+        "completed": matrix.completed.astype(np.uint8),
+        "stats": stats.counts.astype('<i4'),
+        "favorites": stats.favorites.astype('<i4'),
+        "horse_ends": horse_ends,
+        "name_ends": name_ends
+    }
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, version, time.time(), bettors, races,
+                         matrix.total_races, int(matrix.completed.sum()), len(horse_names), len(horse_bytes))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for name, array in sections.items():
+            f.seek(offsets[name])
+            f.write(array.tobytes())
+        f.seek(offsets["horse_names"])
+        f.write(horse_bytes)
+        f.seek(offsets["names"])
+        f.write(b"".join(encoded))
+        f.truncate()  # Extends the file when every section is empty
+    # Readers holding the old file keep a consistent mapping of it
+    os.replace(tmp_path, path)
+    return version
+
+class Snapshot:
+    """One mapped snapshot. Its arrays are read-only views of the file."""
+
+    def __init__(self, mapped: mmap.mmap, inode: int = 0):
+        self.inode = inode
+        magic, format_version, self.version, self.created_at, bettors, races, \
+            self.total_races, self.completed_races, horses, horse_bytes = HEADER.unpack_from(mapped)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError("Not a scoreboard snapshot")
+        self.bettor_count = bettors
+        self.race_count = races
+
+        offsets = _layout(bettors, races, horses, horse_bytes)
+        self.totals = np.frombuffer(mapped, '<i4', bettors, offsets["totals"])
+        self.ranks = np.frombuffer(mapped, '<i4', bettors, offsets["ranks"])
+        self.order = np.frombuffer(mapped, '<i4', bettors, offsets["order"])
+        self.movement = np.frombuffer(mapped, '<i4', bettors, offsets["movement"])
+        self.max_totals = np.frombuffer(mapped, '<i4', bettors, offsets["max_totals"])
+        self.points = np.frombuffer(mapped, '<i2', bettors * races, offsets["points"]).reshape(bettors, races)
+        self.completed = np.frombuffer(mapped, np.uint8, races, offsets["completed"]).astype(bool)
+        self.stats = np.frombuffer(mapped, '<i4', bettors * len(STAT_COLUMNS), offsets["stats"]).reshape(bettors, -1)
+        self.favorites = np.frombuffer(mapped, '<i4', bettors, offsets["favorites"])
+        horse_ends = np.frombuffer(mapped, '<u4', horses, offsets["horse_ends"]).tolist()
+        horse_names = mapped[offsets["horse_names"]:offsets["horse_names"] + horse_bytes]
+        self.horse_numbers = [horse_names[start:end].decode('utf-8') for start, end in zip([0] + horse_ends[:-1], horse_ends)]
+        self._name_ends = np.frombuffer(mapped, '<u4', bettors, offsets["name_ends"])
+        self._names_offset = offsets["names"]
+        self._mmap = mapped
+        self._names = None
+
+    def name(self, bettor: int) -> str:
+        """One bettor's name, decoded from the mapping."""
+        start = int(self._name_ends[bettor - 1]) if bettor else 0
+        end = int(self._name_ends[bettor])
+        return self._mmap[self._names_offset + start:self._names_offset + end].decode('utf-8')
+
+    def names(self) -> List[str]:
+        """Every bettor name in name order, decoded once per snapshot."""
+        if self._names is None:
+            ends = self._name_ends.tolist()
+            blob = self._mmap[self._names_offset:self._names_offset + (ends[-1] if ends else 0)]
+            self._names = [blob[start:end].decode('utf-8') for start, end in zip([0] + ends[:-1], ends)]
+        return self._names
+
+    def bettor_stats(self) -> BettorStats:
+        """Every bettor's stats, read from the mapping."""
+        return BettorStats(self.names(), self.horse_numbers, self.stats, self.favorites,
+                           self.totals, self.completed_races)
+
+class SnapshotReader:
+    """Follows the latest snapshot at a path."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Optional[Snapshot]:
+        """Map the snapshot at the path if its file or header version changed, and return the current one."""
+        current = self.snapshot
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            inode = 0
+        if (inode, read_version(self.path)) == ((current.inode, current.version) if current else (0, 0)):
+            return current
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    inode = os.fstat(f.fileno()).st_ino
+                # Sessions still rendering the old snapshot keep their own reference to it
+                self.snapshot = Snapshot(mapped, inode)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Error reading scoreboard snapshot: {e}")
+            return self.snapshot
+
+def get_snapshot(path: str) -> Optional[Snapshot]:
+    """The latest snapshot at `path`, shared by every session in the process; None if there is none."""
+    with _readers_lock:
+        reader = _readers.get(path)
+        if reader is None:
+            reader = _readers[path] = SnapshotReader(path)
+    return reader.refresh()
@@ -0,0 +1,152 @@
+"""
+Scoring rules for the Derby Betting System.
+
+A rule set is declared once and stored as JSON in the scoring_rules setting:
+
+    {
+        "place_points": [3, 2, 1],
+        "race_multipliers": {"10": 2},
+        "combos": [{"name": "Daily Double", "races": [9, 10], "bonus": 5}]
+    }
+
+place_points are the points for picking the 1st, 2nd and 3rd place horse.
+A race multiplier scales every point of that race, so bonus races count
+double. A combo pays its bonus to every bettor who picked the winner of all
+of its races, and is credited to the last of them once they all have results.
+
+compile_rules() turns a rule set into lookup tables for an event: the points
+each place is worth in each race, and the race columns of each combo. Every
+view scores through CompiledRules.score(), which is one table lookup for all
+bets plus one comparison per combo.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+NO_BET = -1
+PLACES = 3
+PLACE_FIELDS = ("first", "second", "third")
+PRESET_RULES = {
+    "3-2-1": {"place_points": [3, 2, 1]},
+    "5-3-1": {"place_points": [5, 3, 1]},
+}
+DEFAULT_RULES = "3-2-1"
+
+def normalize_rules(rules: Optional[Dict]) -> Dict:
+    """Validate a rule set and fill in its defaults; raises ValueError if it is invalid."""
+    rules = rules or PRESET_RULES[DEFAULT_RULES]
+    place_points = [int(points) for points in rules.get("place_points", PRESET_RULES[DEFAULT_RULES]["place_points"])]
+    if not 1 <= len(place_points) <= PLACES or min(place_points) < 0:
+        raise ValueError(f"place_points needs 1 to {PLACES} non-negative values")
+    place_points += [0] * (PLACES - len(place_points))
+
+    race_multipliers = {}
+    for race, multiplier in rules.get("race_multipliers", {}).items():
+        race, multiplier = int(race), int(multiplier)
+        if race < 1 or multiplier < 1:
+            raise ValueError(f"Race {race} needs a race number and multiplier of at least 1")
+        if multiplier != 1:
+            race_multipliers[race] = multiplier
+
+    combos = []
+    for combo in rules.get("combos", []):
+        races = sorted({int(race) for race in combo.get("races", [])})
+        bonus = int(combo.get("bonus", 0))
+        if len(races) < 2 or races[0] < 1 or bonus < 1:
+            raise ValueError("A combo needs at least two races and a bonus of at least 1")
+        combos.append({"name": str(combo.get("name") or f"Races {', '.join(map(str, races))}"),
+                       "races": races, "bonus": bonus})
+
+    return {"place_points": place_points, "race_multipliers": race_multipliers, "combos": combos}
+
+def parse_rules(text: str) -> Dict:
+    """Rule set from its JSON setting; the default rules if the setting is empty."""
+    if not text:
+        return normalize_rules(None)
+    try:
+        return normalize_rules(json.loads(text))
+    except (TypeError, AttributeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid scoring rules: {e}")
+
+def rules_to_json(rules: Dict) -> str:
+    """Canonical JSON for a rule set, so equal rules compare equal."""
+    rules = normalize_rules(rules)
+    rules["race_multipliers"] = {str(race): multiplier for race, multiplier in sorted(rules["race_multipliers"].items())}
+    return json.dumps(rules, sort_keys=True)
+
+def preset_name(rules: Dict) -> Optional[str]:
+    """Name of the preset a rule set matches, if any."""
+    key = rules_to_json(rules)
+    for name, preset in PRESET_RULES.items():
+        if rules_to_json(preset) == key:
+            return name
+    return None
+
+def describe_rules(rules: Dict) -> List[str]:
+    """One line per rule, for display."""
+    rules = normalize_rules(rules)
+    first, second, third = rules["place_points"]
+    lines = [f"1st place {first}, 2nd place {second}, 3rd place {third} points"]
+    for race, multiplier in sorted(rules["race_multipliers"].items()):
+        lines.append(f"Race {race}: points x{multiplier}")
+    for combo in rules["combos"]:
+        lines.append(f"{combo['name']}: +{combo['bonus']} for picking the winner of races "
+                     f"{', '.join(map(str, combo['races']))}")
+    return lines
+
+class CompiledRules:
+    """A rule set as lookup tables for races 1 to race_count."""
+
+    def __init__(self, place_points: np.ndarray, combos: List[Tuple[np.ndarray, int]], key: str):
+        self.place_points = place_points
+        self.combos = combos
+        self.key = key
+
+    def race_points(self, race_index: int) -> List[int]:
+        """Points for picking the 1st, 2nd and 3rd place horse in a race."""
+        return self.place_points[race_index].tolist()
+
+    def points_table(self, podium: np.ndarray, horse_count: int, races: Optional[np.ndarray] = None) -> np.ndarray:
+        """Points for picking each horse in each race (or only `races`); the last column is for NO_BET."""
+        races = np.arange(podium.shape[0]) if races is None else np.asarray(races)
+        table = np.zeros((len(races), horse_count + 1), dtype=np.int32)
+        for place in range(PLACES):
+            rows = np.flatnonzero(podium[races, place] != NO_BET)
+            table[rows, podium[races[rows], place]] = self.place_points[races[rows], place]
+        return table
+
+    def score(self, picks: np.ndarray, podium: np.ndarray, horse_count: int,
+              races: Optional[np.ndarray] = None) -> np.ndarray:
+        """Points per bettor (rows) and race (columns) for picks against a podium.
+
+        With `races`, only those race columns are scored, in that order.
+        """
+        races = np.arange(podium.shape[0]) if races is None else np.asarray(races)
+        # NO_BET picks index the table's last column, which is always 0
+        points = self.points_table(podium, horse_count, races)[np.arange(len(races)), picks[:, races]]
+        for combo_races, bonus in self.combos:
+            column = np.flatnonzero(races == combo_races[-1])
+            winners = podium[combo_races, 0]
+            if len(column) and (winners != NO_BET).all():
+                hits = (picks[:, combo_races] == winners).all(axis=1)
+                points[:, column[0]] += bonus * hits
+        return points
+
+    def affected_races(self, race_index: int) -> np.ndarray:
+        """Race columns whose points depend on one race: itself and where its combos pay out."""
+        races = [race_index] + [int(combo_races[-1]) for combo_races, _ in self.combos if race_index in combo_races]
+        return np.unique(races)
+
+def compile_rules(rules: Dict, race_count: int) -> CompiledRules:
+    """Compile a rule set into lookup tables for an event with race_count races."""
+    rules = normalize_rules(rules)
+    place_points = np.tile(np.array(rules["place_points"], dtype=np.int32), (race_count, 1))
+    for race, multiplier in rules["race_multipliers"].items():
+        if race <= race_count:
+            place_points[race - 1] *= multiplier
+    # Combos with a race past the end of the event can never pay out
+    combos = [(np.array(combo["races"], dtype=np.int64) - 1, combo["bonus"])
+              for combo in rules["combos"] if combo["races"][-1] <= race_count]
+    return CompiledRules(place_points, combos, rules_to_json(rules))
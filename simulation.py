@@ -0,0 +1,174 @@
+"""
+Monte Carlo simulation of the final standings.
+
+Each simulation draws a podium for every remaining race and scores it
+against the bettors' picks with the event's compiled scoring rules. Podiums
+are drawn without replacement from the horses' odds, uniform or in
+proportion to how many bettors picked each horse, by adding Gumbel noise to
+the log odds and keeping the top three. That draws a whole chunk of
+simulations with one sort, and scoring a race is one row lookup per bettor
+in a table of points per horse and simulation. Bettors who have not bet on a remaining race
+yet get a pick drawn from the same odds in every simulation.
+
+Simulations run in chunks of roughly CHUNK_CELLS bettor-simulations, each
+seeded from its own child of the caller's seed. Results depend only on the
+seed and the number of simulations, whether the chunks run in this process
+or across a ProcessPoolExecutor.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from clinch import remaining_races
+from scoring_rules import NO_BET, PLACES
+
+ODDS_MODES = ("uniform", "popularity")
+CHUNK_CELLS = 2_000_000
+TOP_PLACES = 10
+
+class SimulationProblem:
+    """What every chunk needs: current totals and the remaining races' picks, odds and points."""
+
+    def __init__(self, totals: np.ndarray, picks: np.ndarray, odds: np.ndarray, place_points: np.ndarray,
+                 combos: List[Tuple[np.ndarray, np.ndarray, int]]):
+        self.totals = totals
+        self.picks = picks.astype(np.intp)
+        self.odds = odds
+        self.place_points = place_points
+        # (bettors who won every finished race of the combo, its remaining race columns, bonus)
+        self.combos = combos
+
+class SimulationResult:
+    """Finish probabilities per bettor in name order."""
+
+    def __init__(self, simulations: int, odds: str, seed: int, win: np.ndarray, podium: np.ndarray,
+                 top_ten: np.ndarray, expected_totals: np.ndarray):
+        self.simulations = simulations
+        self.odds = odds
+        self.seed = seed
+        self.win = win
+        self.podium = podium
+        self.top_ten = top_ten
+        self.expected_totals = expected_totals
+
+def horse_odds(matrix, races: np.ndarray, mode: str) -> np.ndarray:
+    """Chance of each horse winning each race, as a (races, horses) array."""
+    if mode not in ODDS_MODES:
+        raise ValueError(f"Unknown odds mode: {mode}")
+    horses = len(matrix.horse_numbers)
+    if mode == "uniform":
+        return np.full((len(races), horses), 1 / horses)
+
+    # Every horse keeps a chance; races nobody has bet on yet use the whole event's picks
+    placed = matrix.picks[matrix.picks != NO_BET]
+    pooled = np.bincount(placed, minlength=horses) + 1
+    odds = np.empty((len(races), horses))
+    for row, race in enumerate(races.tolist()):
+        picks = matrix.picks[:, race]
+        picks = picks[picks != NO_BET]
+        odds[row] = np.bincount(picks, minlength=horses) + 1 if len(picks) else pooled
+    return odds / odds.sum(axis=1, keepdims=True)
+
+def build_problem(matrix, mode: str = "uniform") -> SimulationProblem:
+    """Everything the simulation needs from a bet matrix."""
+    races = remaining_races(matrix)
+    combos = []
+    for combo_races, bonus in matrix.scoring.combos:
+        open_races = combo_races[~matrix.completed[combo_races]]
+        if len(open_races) and np.isin(open_races, races).all():
+            done = combo_races[matrix.completed[combo_races]]
+            alive = (matrix.picks[:, done] == matrix.podium[done, 0]).all(axis=1)
+            combos.append((alive, np.searchsorted(races, open_races), bonus))
+    return SimulationProblem(matrix.totals().astype(np.int64), matrix.picks[:, races],
+                             horse_odds(matrix, races, mode), matrix.scoring.place_points[races], combos)
+
+def simulate_chunk(problem: SimulationProblem, seed: np.random.SeedSequence, count: int) -> Tuple[np.ndarray, ...]:
+    """Run `count` simulations; return win, podium and top-ten counts and summed totals per bettor."""
+    rng = np.random.default_rng(seed)
+    bettors = len(problem.totals)
+    races, horses = problem.odds.shape
+    places = min(PLACES, horses)
+
+    # Podiums for every simulation and race: the top of the log odds plus Gumbel noise
+    keys = np.log(problem.odds) + rng.gumbel(size=(count, races, horses))
+    podiums = np.argsort(-keys, axis=2)[:, :, :places]
+    simulations = np.arange(count)
+
+    # Arrays are bettors by simulations, so scoring a race copies whole rows
+    totals = np.tile(problem.totals.astype(np.int32)[:, None], (1, count))
+    combo_columns = {int(column) for _, columns, _ in problem.combos for column in columns}
+    won = {}
+    for race in range(races):
+        # Points for each horse in each simulation; NO_BET picks index the last row, which stays 0
+        table = np.zeros((horses + 1, count), dtype=np.int32)
+        table[podiums[:, race].T, simulations] = problem.place_points[race, :places, None]
+        picks = problem.picks[:, race]
+        totals += table[picks]
+
+        # A missing pick lands on each placed horse with that horse's odds
+        missing = np.flatnonzero(picks == NO_BET)
+        draws = rng.random((len(missing), count), dtype=np.float32)
+        bounds = np.cumsum(problem.odds[race][podiums[:, race]], axis=1, dtype=np.float32)
+        place = np.zeros(draws.shape, dtype=np.uint8)
+        for bound in bounds.T:
+            place += draws >= bound
+        totals[missing] += np.append(problem.place_points[race, :places], 0).astype(np.int32)[place]
+
+        if race in combo_columns:
+            won[race] = picks[:, None] == podiums[:, race, 0]
+            won[race][missing] = place == 0
+    for alive, columns, bonus in problem.combos:
+        hits = np.broadcast_to(alive[:, None], (bettors, count))
+        for column in columns.tolist():
+            hits = hits & won[column]
+        totals += bonus * hits
+
+    # Top places of each simulation, ties by name as on the scoreboard
+    keys = totals.T.astype(np.int64) * bettors + np.arange(bettors - 1, -1, -1)
+    top = min(TOP_PLACES, bettors)
+    leaders = np.argpartition(-keys, top - 1, axis=1)[:, :top]
+    leaders = np.take_along_axis(leaders, np.argsort(-np.take_along_axis(keys, leaders, axis=1), axis=1), axis=1)
+    return (np.bincount(leaders[:, 0], minlength=bettors),
+            np.bincount(leaders[:, :3].ravel(), minlength=bettors),
+            np.bincount(leaders.ravel(), minlength=bettors),
+            totals.sum(axis=1, dtype=np.int64))
+
+_worker_problem: Optional[SimulationProblem] = None
+
+def _init_worker(problem: SimulationProblem):
+    global _worker_problem
+    _worker_problem = problem
+
+def _run_worker_chunk(seed: np.random.SeedSequence, count: int) -> Tuple[np.ndarray, ...]:
+    return simulate_chunk(_worker_problem, seed, count)
+
+def simulate_standings(matrix, simulations: int = 10000, odds: str = "uniform", seed: int = 0,
+                       workers: Optional[int] = None) -> SimulationResult:
+    """Win, podium and top-ten probabilities after the remaining races.
+
+    Chunks run across `workers` processes (default: one per CPU) when there
+    is more than one chunk.
+    """
+    if simulations < 1:
+        raise ValueError("Simulation needs at least one run")
+    problem = build_problem(matrix, odds)
+    bettors = len(problem.totals)
+    if not bettors or not problem.odds.shape[1]:
+        raise ValueError("Simulation needs bettors and horses")
+
+    chunk_size = max(1, min(simulations, CHUNK_CELLS // bettors))
+    counts = [chunk_size] * (simulations // chunk_size) + ([simulations % chunk_size] if simulations % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    workers = min(workers or os.cpu_count() or 1, len(counts))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(problem,)) as pool:
+            results = list(pool.map(_run_worker_chunk, seeds, counts))
+    else:
+        results = [simulate_chunk(problem, chunk_seed, count) for chunk_seed, count in zip(seeds, counts)]
+
+    win, podium, top_ten, totals = (np.sum(column, axis=0) for column in zip(*results))
+    return SimulationResult(simulations, odds, seed, win / simulations, podium / simulations,
+                            top_ten / simulations, totals / simulations)
@@ -0,0 +1,111 @@
+"""
+Deterministic synthetic derby events for benchmarks and load tests.
+
+generate_event() fills a DerbyDatabase with horses, bettors, completed races
+and their bets. The same arguments and seed always produce the same event, so
+timings from different runs are comparable.
+"""
+
+import random
+from typing import Dict, List, Optional
+from database import DerbyDatabase
+
+BET_DISTRIBUTIONS = ("uniform", "favorites")
+
+FIRST_NAMES = ["Alex", "Blake", "Casey", "Devon", "Emery", "Finley", "Gray", "Harper",
+               "Indy", "Jordan", "Kai", "Logan", "Morgan", "Noel", "Oakley", "Parker",
+               "Quinn", "Reese", "Sage", "Taylor"]
+LAST_NAMES = ["Adams", "Brooks", "Carter", "Diaz", "Ellis", "Foster", "Garcia", "Hayes",
+              "Irwin", "Jensen", "Khan", "Lopez", "Miller", "Nguyen", "Owens", "Patel",
+              "Reyes", "Smith", "Turner", "Walsh"]
+
+def bettor_names(count: int) -> List[str]:
+    """Unique, deterministic bettor names."""
+    names = []
+    for i in range(count):
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        names.append(f"{first} {last} {i + 1:06d}")
+    return names
+
+def horse_weights(horse_count: int, distribution: str) -> List[float]:
+    """Relative popularity of each horse for the given bet distribution."""
+    if distribution == "favorites":
+        # Zipf-like: horse 1 is the favorite, popularity falls off with number
+        return [1.0 / (i + 1) for i in range(horse_count)]
+    return [1.0] * horse_count
+
+def generate_event(db: DerbyDatabase, horses: int = 12, bettors: int = 100, races: int = 10,
+                   completed_races: Optional[int] = None, distribution: str = "uniform",
+                   seed: int = 42) -> Dict:
+    """Populate an empty database with a synthetic event and return its shape.
+
+    By default every race but the last is completed, so the event is ready for
+    the final race's results to be submitted.
+    """
+    if distribution not in BET_DISTRIBUTIONS:
+        raise ValueError(f"Unknown bet distribution: {distribution}")
+    if completed_races is None:
+        completed_races = max(races - 1, 0)
+
+    rng = random.Random(seed)
+    horse_numbers = [str(i) for i in range(1, horses + 1)]
+    weights = horse_weights(horses, distribution)
+    names = bettor_names(bettors)
+
+    db.add_horses_bulk(horse_numbers)
+    with db.get_connection() as conn:
+        horse_ids = dict(conn.execute("SELECT number, id FROM horses").fetchall())
+        conn.executemany("INSERT INTO bettors (name) VALUES (?)", [(name,) for name in names])
+        bettor_ids = [row[0] for row in conn.execute("SELECT id FROM bettors ORDER BY id")]
+
+        for race_number in range(1, completed_races + 1):
+            # Finishing order follows the same popularity as the bets
+            podium = []
+            while len(podium) < 3:
+                horse = horse_ids[rng.choices(horse_numbers, weights)[0]]
+                if horse not in podium:
+                    podium.append(horse)
+
+            cursor = conn.execute("""
+                INSERT INTO races (race_number, first_horse_id, second_horse_id,
+                                   third_horse_id, completed_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (race_number, *podium))
+            race_id = cursor.lastrowid
+
+            picks = rng.choices(horse_numbers, weights, k=bettors)
+            conn.executemany(
+                "INSERT INTO bets (bettor_id, race_id, horse_id) VALUES (?, ?, ?)",
+                zip(bettor_ids, [race_id] * bettors, [horse_ids[horse] for horse in picks])
+            )
+        conn.commit()
+
+    settings = {
+        'setup_complete': 'True',
+        'auto_setup_done': 'True',
+        'target_horse_count': str(horses),
+        'bettors_setup_complete': 'True',
+        'target_bettor_count': str(bettors),
+        'total_races': str(races),
+        'current_race': str(min(completed_races + 1, races))
+    }
+    for key, value in settings.items():
+        db.set_setting(key, value)
+
+    return {
+        'horses': horses,
+        'bettors': bettors,
+        'races': races,
+        'completed_races': completed_races,
+        'distribution': distribution,
+        'seed': seed
+    }
+
+def generate_race_bets(bettor_count: int, horses: int, distribution: str = "uniform",
+                       seed: int = 42) -> Dict[str, str]:
+    """Deterministic bets for one race, keyed by bettor name."""
+    rng = random.Random(seed)
+    horse_numbers = [str(i) for i in range(1, horses + 1)]
+    picks = rng.choices(horse_numbers, horse_weights(horses, distribution), k=bettor_count)
+    return dict(zip(bettor_names(bettor_count), picks))
@@ -0,0 +1,61 @@
+"""Tests for the bet submission API's error responses."""
+
+import asyncio
+import json
+import os
+from urllib.parse import urlparse
+
+import pytest
+
+import bet_api
+from database import DerbyDatabase
+from loadtest_api import ApiClient
+from synthetic_event import generate_event
+from write_queue import BetWriteQueue
+
+@pytest.fixture
+def event(tmp_path):
+    db = DerbyDatabase(os.path.join(tmp_path, "derby_betting.db"))
+    generate_event(db, horses=6, bettors=10, races=3, completed_races=1)
+    writes = BetWriteQueue(db, draft=True, operator=bet_api.API_OPERATOR)
+    url = urlparse(bet_api.start_in_thread(db, writes, "127.0.0.1", 0))
+    yield db, writes, url.hostname, url.port
+    writes.close()
+
+def test_failed_write_is_answered_with_503(event, monkeypatch):
+    db, _, host, port = event
+    bettor = db.get_all_bettors()[0]['name']
+    monkeypatch.setattr(db, "write_bet_batch", lambda bets, draft=False, operator=None: None)
+
+    async def post():
+        client = ApiClient(host, port, None)
+        try:
+            unkeyed = await client.request("POST", "/bets", {"bettor": bettor, "horse": "2"})
+            keyed = await client.request("POST", "/bets", {"bettor": bettor, "horse": "2"}, key="retry-me")
+            monkeypatch.undo()
+            # The failed keyed request was not remembered, so its retry writes the bet
+            retried = await client.request("POST", "/bets", {"bettor": bettor, "horse": "2"}, key="retry-me")
+            return unkeyed, keyed, retried
+        finally:
+            client.close()
+
+    unkeyed, keyed, retried = asyncio.run(post())
+    assert unkeyed[0] == 503 and "could not be committed" in unkeyed[1]["error"]
+    assert keyed[0] == 503
+    assert retried == (200, {"race": 2, "accepted": 1, "rejected": []})
+    assert db.get_draft_bets(2) == {bettor: "2"}
+
+def test_malformed_content_length_is_answered_with_400(event):
+    _, _, host, port = event
+
+    async def post():
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"POST /bets HTTP/1.1\r\nHost: x\r\nContent-Length: lots\r\n\r\n")
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    head, _, body = asyncio.run(post()).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 400")
+    assert json.loads(body) == {"error": "Malformed Content-Length"}
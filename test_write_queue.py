@@ -0,0 +1,27 @@
+"""Tests for the group-commit bet write queue."""
+
+import os
+
+import pytest
+
+from database import DerbyDatabase
+from synthetic_event import generate_event
+from write_queue import BetWriteQueue
+
+@pytest.fixture
+def db(tmp_path):
+    db = DerbyDatabase(os.path.join(tmp_path, "derby_betting.db"))
+    generate_event(db, horses=6, bettors=10, races=3, completed_races=1)
+    return db
+
+def test_submit_after_close_fails_at_once(db):
+    bettor = db.get_all_bettors()[0]['name']
+    writes = BetWriteQueue(db, draft=True)
+    assert writes.submit(2, bettor, "3").result(timeout=5) is True
+    writes.close()
+
+    future = writes.submit(2, bettor, "4")
+    with pytest.raises(RuntimeError, match="closed"):
+        future.result(timeout=1)
+    writes.close()  # Closing twice is harmless
+    assert db.get_draft_bets(2) == {bettor: "3"}
@@ -0,0 +1,129 @@
+"""
+Group commit for bet writes arriving from many producers at once.
+
+Operators, kiosks and the API hand bets to a BetWriteQueue from any thread
+and get a Future back. A single writer thread takes the first queued bet,
+gathers more until WRITE_BATCH_SIZE bets are in hand or WRITE_FLUSH_SECONDS
+have passed, and writes them all in one transaction with
+DerbyDatabase.write_bet_batch. Every future in the batch resolves once that
+transaction has committed: to True, or to a ValueError for a bet that was
+rejected (an unknown bettor or horse, or a race that already has results).
+If the transaction fails, every future in it gets the error.
+
+On SQLite the commit, with its fsync, costs far more than the rows it
+writes, so one commit per batch instead of per bet is what sustains
+thousands of writes per second. The queue holds at most WRITE_QUEUE_LIMIT
+bets; beyond that submit() blocks until the writer catches up.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+WRITE_BATCH_SIZE = 1000
+WRITE_FLUSH_SECONDS = 0.005
+WRITE_QUEUE_LIMIT = 100_000
+
+class BetWriteQueue:
+    """Bet upserts from any thread, committed in batches by one writer thread."""
+
+    def __init__(self, db, draft: bool = False, operator: Optional[str] = None,
+                 batch_size: int = WRITE_BATCH_SIZE, flush_seconds: float = WRITE_FLUSH_SECONDS,
+                 on_commit: Optional[Callable[[], None]] = None):
+        self.db = db
+        self.draft = draft
+        self.operator = operator
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        # Called after every committed batch, e.g. to wake the precompute worker
+        self.on_commit = on_commit
+        self.batches = 0
+        self.written = 0
+        self.closed = False
+        self._closing = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(WRITE_QUEUE_LIMIT)
+        self._thread = threading.Thread(target=self._run, name="derby-bet-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, race_number: int, bettor_name: str, horse_number: str) -> Future:
+        """Queue one bet; an empty horse number clears it. The future resolves on commit.
+
+        Once the queue is closed the future already holds a RuntimeError.
+        """
+        future = Future()
+        with self._closing:
+            if not self.closed:
+                self._queue.put((race_number, bettor_name, horse_number, future))
+                return future
+        future.set_exception(RuntimeError("Bet write queue is closed"))
+        return future
+
+    def submit_many(self, race_number: int, bettor_bets: Dict[str, str]) -> List[Future]:
+        """Queue a bet per bettor for one race, in order."""
+        return [self.submit(race_number, name, horse) for name, horse in bettor_bets.items()]
+
+    def flush(self):
+        """Wait until every bet queued so far has been committed or rejected."""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued, then stop the writer thread."""
+        with self._closing:
+            if self.closed:
+                return
+            self.closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _take_batch(self) -> List:
+        """Block for the first bet, then gather more until the batch is full or the flush time is up."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, bets: List):
+        # Bets cancelled while queued are dropped; the rest can no longer be cancelled
+        bets = [bet for bet in bets if bet[3].set_running_or_notify_cancel()]
+        if not bets:
+            return
+        errors = self.db.write_bet_batch([bet[:3] for bet in bets], self.draft, self.operator)
+        if errors is None:
+            for bet in bets:
+                bet[3].set_exception(RuntimeError("Bet batch could not be committed"))
+            return
+
+        self.batches += 1
+        self.written += errors.count(None)
+        for bet, error in zip(bets, errors):
+            if error is None:
+                bet[3].set_result(True)
+            else:
+                bet[3].set_exception(ValueError(error))
+        if self.on_commit is not None:
+            self.on_commit()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            closing = batch[-1] is None
+            bets = batch[:-1] if closing else batch
+            try:
+                self._write(bets)
+            except Exception as e:
+                print(f"Error in bet writer: {e}")
+                for bet in bets:
+                    if not bet[3].done():
+                        bet[3].set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if closing:
+                return